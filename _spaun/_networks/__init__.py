@@ -9,3 +9,5 @@ from .normalize import VectorNormalize
 from .func_replicator import DifferenceFunctionEvaluator
 from .func_replicator import convert_func_2_diff_func
 from .detect_change import DetectChange
+from .thresh_block import ThresholdEnsembleBlock
+from .assoc_mem_stacked import StackedAssociativeMemory
@@ -115,17 +115,7 @@ class AssociativeMemory(nengo.Network):
             self.elem_utilities = nengo.Node(
                 size_in=self.n_items, label="element utilities")
 
-            self.am_ensembles = []
-            label_prefix = "" if label is None else label + "_"
-
-            for i in range(self.n_items):
-                e = nengo.Ensemble(n_neurons, 1, label=label_prefix + str(i))
-                self.am_ensembles.append(e)
-
-                # Connect input and output nodes
-                nengo.Connection(self.bias_node, e, transform=-threshold[i])
-                nengo.Connection(self.elem_input[i], e, synapse=None)
-                nengo.Connection(e, self.elem_utilities[i], synapse=None)
+            self.make_am_ensembles(n_neurons, threshold, label)
 
             if inhibitable:
                 # Input node for inhibitory gating signal (if enabled)
@@ -140,6 +130,24 @@ class AssociativeMemory(nengo.Network):
         self.add_input_mapping("input", input_vectors, input_scales)
         self.add_output_mapping("output", output_vectors)
 
+    def make_am_ensembles(self, n_neurons, threshold, label=None):
+        """Creates the associative memory item ensembles.
+
+        Creates one ensemble for each item, and connects it to the element
+        input and element utilities nodes.
+        """
+        self.am_ensembles = []
+        label_prefix = "" if label is None else label + "_"
+
+        for i in range(self.n_items):
+            e = nengo.Ensemble(n_neurons, 1, label=label_prefix + str(i))
+            self.am_ensembles.append(e)
+
+            # Connect input and output nodes
+            nengo.Connection(self.bias_node, e, transform=-threshold[i])
+            nengo.Connection(self.elem_input[i], e, synapse=None)
+            nengo.Connection(e, self.elem_utilities[i], synapse=None)
+
     @staticmethod
     def linear_func(x_shift=0.0, x_scale=1.0):
         """Returns a linear mapping function.
@@ -380,6 +388,24 @@ class AssociativeMemory(nengo.Network):
         utility = nengo.Node(size_in=self.n_items, label=utility_node_name)
         setattr(self, utility_node_name, utility)
 
+        self.connect_output_mapping(output, utility, output_vectors,
+                                    utility_map_funcs)
+
+    def connect_output_mapping(self, output, utility, output_vectors,
+                               utility_map_funcs):
+        """Connects the item ensembles to an output and utilities node.
+
+        Parameters
+        ----------
+        output: nengo.Node
+            Output node (the output vectors are produced on this node).
+        utility: nengo.Node
+            Output utilities node.
+        output_vectors: array_like
+            The list of vectors to be produced for each match.
+        utility_map_funcs: list of functions
+            The utility mapping function of each item ensemble.
+        """
         for i, am_ens in enumerate(self.am_ensembles):
             nengo.Connection(am_ens, output, synapse=None,
                              transform=output_vectors[i, :, None],
@@ -487,6 +513,36 @@ class AssociativeMemory(nengo.Network):
                           "with a WTA network. Additional `add_wta_network` "
                           "calls are ignored.")
 
+    def make_cleanup_ensembles(self, n_neurons, output_name, utility,
+                               inhibit_scale):
+        """Creates the double-inhibited cleanup ensembles.
+
+        Returns the node that outputs the cleaned output utilities.
+        """
+        self.bias_ens1 = EnsembleArray(
+            n_neurons, self.n_items, label=output_name + '_bias_ens1')
+        self.bias_ens2 = EnsembleArray(
+            n_neurons, self.n_items, label=output_name + '_bias_ens2')
+
+        nengo.Connection(self.bias_node, self.bias_ens1.input,
+                         transform=np.ones((self.n_items, 1)),
+                         synapse=None)
+        nengo.Connection(self.bias_node, self.bias_ens2.input,
+                         transform=np.ones((self.n_items, 1)),
+                         synapse=None)
+        nengo.Connection(utility, self.bias_ens1.input,
+                         transform=-inhibit_scale)
+        nengo.Connection(self.bias_ens1.output, self.bias_ens2.input,
+                         transform=-1.0)
+
+        # --- Make inhibitory connection if inhibit option is set
+        if self.inhibit is not None:
+            for e in self.bias_ens2.ensembles:
+                nengo.Connection(
+                    self.inhibit, e, transform=-self._inhib_scale,
+                    synapse=None)
+        return self.bias_ens2.output
+
     @with_self
     def add_cleanup_output(self, output_name='output', n_neurons=50,
                            inhibit_scale=3.5, replace_output=False):
@@ -544,45 +600,24 @@ class AssociativeMemory(nengo.Network):
         with self.cleanup_ens_config:
             # --- Set up the double inhibited ensembles, and make the
             #     appropriate connections.
-            self.bias_ens1 = EnsembleArray(
-                n_neurons, self.n_items, label=output_name + '_bias_ens1')
-            self.bias_ens2 = EnsembleArray(
-                n_neurons, self.n_items, label=output_name + '_bias_ens2')
-
             utility = getattr(self, output_utilities_name)
-
-            nengo.Connection(self.bias_node, self.bias_ens1.input,
-                             transform=np.ones((self.n_items, 1)),
-                             synapse=None)
-            nengo.Connection(self.bias_node, self.bias_ens2.input,
-                             transform=np.ones((self.n_items, 1)),
-                             synapse=None)
-            nengo.Connection(utility, self.bias_ens1.input,
-                             transform=-inhibit_scale)
-            nengo.Connection(self.bias_ens1.output, self.bias_ens2.input,
-                             transform=-1.0)
+            cleanup_utilities = self.make_cleanup_ensembles(
+                n_neurons, output_name, utility, inhibit_scale)
 
             # --- Make the output node and connect it
             output_vectors = self._output_vectors[output_name]
             cleanup_output_node = nengo.Node(size_in=output_vectors.shape[1],
                                              label=cleanup_output_name)
-            nengo.Connection(self.bias_ens2.output, cleanup_output_node,
+            nengo.Connection(cleanup_utilities, cleanup_output_node,
                              transform=output_vectors.T, synapse=None)
 
             setattr(self, cleanup_output_name, cleanup_output_node)
-            setattr(self, cleanup_utilities_name, self.bias_ens2.output)
+            setattr(self, cleanup_utilities_name, cleanup_utilities)
 
             # --- Replace the original output node (pointer) if required
             if replace_output:
                 setattr(self, output_name, cleanup_output_node)
 
-            # --- Make inhibitory connection if inhibit option is set
-            if self.inhibit is not None:
-                for e in self.bias_ens2.ensembles:
-                    nengo.Connection(
-                        self.inhibit, e, transform=-self._inhib_scale,
-                        synapse=None)
-
             # --- Connect default output vector to cleaned outputs
             #     (if available)
             default_vector_ens = getattr(self,
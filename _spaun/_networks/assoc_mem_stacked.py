@@ -0,0 +1,176 @@
+import numpy as np
+
+import nengo
+from nengo.dists import Choice, Distribution, Exponential, Uniform
+from nengo.solvers import LstsqL2
+from nengo.utils.numpy import maxint
+
+from .assoc_mem import AssociativeMemory
+
+
+class StackedEnsembles(object):
+    """A set of 1D ensembles (with [1] encoders) in one neuron population.
+
+    Each 1D ensemble is represented by its own block of neurons in a single
+    stacked population. The input of each block is connected only to that
+    block's neurons (block-diagonal encoders), and the outputs are decoded
+    with block-diagonal decoder matrices. The neuron parameters and the
+    decoders of each block are generated in the same way as for a separate
+    1D ensemble.
+
+    Parameters
+    ----------
+    n_neurons: int
+        Number of neurons in each block.
+    n_blocks: int
+        Number of blocks (1D ensembles).
+    intercepts: Distribution
+        Intercept distribution of the neurons.
+    eval_points: Distribution
+        Evaluation point distribution (of each block) used to solve for the
+        decoders.
+    n_eval_points: int, optional
+        Number of evaluation points.
+    radius: float, optional
+        Representational radius of each block.
+    bias_input: float or array_like, optional
+        Constant input to each block. Folded into the neuron biases.
+    rng: numpy.random.RandomState, optional
+        Random number generator used to generate the neuron parameters.
+    label: str, optional
+        Label of the stacked neuron population.
+    """
+
+    def __init__(self, n_neurons, n_blocks, intercepts, eval_points,
+                 n_eval_points=5000, radius=1.0, bias_input=0.0,
+                 rng=np.random, label=None):
+        self.n_neurons = n_neurons
+        self.n_blocks = n_blocks
+        self.radius = radius
+        self.rng = rng
+
+        # Neuron parameters use the defaults of the current config context
+        self.neuron_type = nengo.Config.default(nengo.Ensemble, 'neuron_type')
+        max_rates = nengo.Config.default(nengo.Ensemble, 'max_rates')
+
+        n_total = n_neurons * n_blocks
+        intercepts = intercepts.sample(n_total, rng=rng)
+        if isinstance(max_rates, Distribution):
+            max_rates = max_rates.sample(n_total, rng=rng)
+        else:
+            max_rates = max_rates * np.ones(n_total)
+        self.gain, self.bias = self.neuron_type.gain_bias(max_rates,
+                                                          intercepts)
+
+        block_inds = np.repeat(np.arange(n_blocks), n_neurons)
+        bias_input = np.ones(n_blocks) * bias_input
+        self.ensemble = nengo.Ensemble(
+            n_total, 1, encoders=Choice([[1]]), gain=self.gain,
+            bias=self.bias + self.gain * bias_input[block_inds] / radius,
+            radius=radius, neuron_type=self.neuron_type, label=label)
+
+        # Evaluation points (in the normalized range) of each block
+        self.eval_points = eval_points.sample(n_eval_points, 1, rng=rng)
+
+        # Note: The neuron gains are applied to connections into neurons
+        self.input = nengo.Node(size_in=n_blocks, label='input')
+        nengo.Connection(self.input[list(block_inds)], self.ensemble.neurons,
+                         transform=1.0 / radius, synapse=None)
+
+    @property
+    def neurons(self):
+        return self.ensemble.neurons
+
+    def decoders(self, functions=None, solver=LstsqL2()):
+        """Returns the block-diagonal decoder matrix for the given functions.
+
+        Parameters
+        ----------
+        functions: list of functions, optional
+            The function to decode from each block. Defaults to the identity
+            function for each block.
+        solver: Solver, optional
+            The solver used to solve for the decoders of each block.
+        """
+        if functions is None:
+            functions = [None] * self.n_blocks
+
+        decoders = np.zeros((self.n_blocks, self.ensemble.n_neurons))
+        for i, function in enumerate(functions):
+            block = slice(i * self.n_neurons, (i + 1) * self.n_neurons)
+
+            activities = self.neuron_type.rates(
+                self.eval_points, self.gain[block], self.bias[block])
+            targets = self.eval_points * self.radius
+            if function is not None:
+                targets = np.array([np.ravel(function(x)) for x in targets])
+            block_decoders, _ = solver(activities, targets, rng=self.rng)
+            decoders[i, block] = block_decoders[:, 0]
+        return decoders
+
+
+class StackedAssociativeMemory(AssociativeMemory):
+    """Associative memory network with stacked item populations.
+
+    Functionally equivalent to the ``AssociativeMemory`` network, but the
+    item ensembles (and the cleanup output ensembles) are each represented
+    by one stacked neuron population (see ``StackedEnsembles``), with a
+    single decoder matrix for each output mapping. The build and per-step
+    overhead scales with the total number of neurons, rather than with the
+    number of items.
+
+    Note that the ensembles must not be in direct mode.
+    """
+
+    def make_am_ensembles(self, n_neurons, threshold, label=None):
+        seed = self.seed if self.seed is not None else \
+            np.random.randint(maxint)
+        self.rng = np.random.RandomState(seed)
+
+        self.am_block = StackedEnsembles(
+            n_neurons, self.n_items, Exponential(self.exp_scale, 0.0, 1.0),
+            Uniform(0.0, 1.0), self.n_eval_points, bias_input=-threshold,
+            rng=self.rng, label=label)
+        self.am_ensembles = [self.am_block.ensemble]
+
+        nengo.Connection(self.elem_input, self.am_block.input, synapse=None)
+        nengo.Connection(self.am_block.neurons, self.elem_utilities,
+                         transform=self.am_block.decoders(), synapse=None)
+
+    def connect_output_mapping(self, output, utility, output_vectors,
+                               utility_map_funcs):
+        decoders = self.am_block.decoders(utility_map_funcs)
+        nengo.Connection(self.am_block.neurons, output,
+                         transform=np.dot(output_vectors.T, decoders),
+                         synapse=None)
+        nengo.Connection(self.am_block.neurons, utility, transform=decoders,
+                         synapse=None)
+
+    def make_cleanup_ensembles(self, n_neurons, output_name, utility,
+                               inhibit_scale):
+        self.bias_ens1 = StackedEnsembles(
+            n_neurons, self.n_items, Uniform(0.25, 1.0), Uniform(0.75, 1.1),
+            self.n_eval_points, bias_input=1.0, rng=self.rng,
+            label=output_name + '_bias_ens1')
+        self.bias_ens2 = StackedEnsembles(
+            n_neurons, self.n_items, Uniform(0.25, 1.0), Uniform(0.75, 1.1),
+            self.n_eval_points, bias_input=1.0, rng=self.rng,
+            label=output_name + '_bias_ens2')
+
+        cleanup_utilities = nengo.Node(size_in=self.n_items,
+                                       label=output_name + '_bias_ens2_output')
+
+        nengo.Connection(utility, self.bias_ens1.input,
+                         transform=-inhibit_scale)
+        nengo.Connection(self.bias_ens1.neurons, self.bias_ens2.input,
+                         transform=-self.bias_ens1.decoders())
+        nengo.Connection(self.bias_ens2.neurons, cleanup_utilities,
+                         transform=self.bias_ens2.decoders(), synapse=None)
+
+        # --- Make inhibitory connection if inhibit option is set
+        if self.inhibit is not None:
+            nengo.Connection(self.inhibit, self.bias_ens2.input,
+                             transform=-self._inhib_scale *
+                             np.ones((self.n_items, 1)),
+                             synapse=None)
+        return cleanup_utilities
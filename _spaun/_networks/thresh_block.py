@@ -0,0 +1,97 @@
+import numpy as np
+
+import nengo
+from nengo.dists import Choice, Distribution, Exponential, Uniform
+from nengo.solvers import LstsqL2
+
+
+class ThresholdEnsembleBlock(object):
+    """Population block of 1D threshold units.
+
+    Groups threshold units (see ``SpaunConfig.make_thresh_ens_net``) that
+    share the same neuron configuration into one stacked neuron population.
+    Each unit is given its own block of neurons, which receives only that
+    unit's input (block-diagonal encoders), and is decoded with that block's
+    decoders (block-diagonal decoders). The neuron parameters and decoders
+    of each unit are generated in the same way as for a separate threshold
+    ensemble, so the units behave as they would as separate ensembles, but
+    the whole block is simulated with one set of neuron operators.
+
+    Parameters
+    ----------
+    n_neurons: int
+        Number of neurons for each threshold unit.
+    threshold: float
+        Threshold (minimum intercept) of the threshold units.
+    exp_scale: float
+        Scale of the exponential intercept distribution.
+    radius: float, optional
+        Representational radius of the threshold units.
+    n_eval_points: int, optional
+        Number of evaluation points used to solve for each unit's decoders.
+    label: str, optional
+        Label of the stacked neuron population.
+    """
+
+    def __init__(self, n_neurons, threshold, exp_scale, radius=1.0,
+                 n_eval_points=5000, label=None):
+        self.n_neurons = n_neurons
+        self.threshold = threshold
+        self.exp_scale = exp_scale
+        self.radius = radius
+        self.n_eval_points = n_eval_points
+        self.label = label
+
+        self.units = []
+        self.ensemble = None
+
+    @property
+    def key(self):
+        return (self.n_neurons, self.threshold, self.exp_scale, self.radius,
+                self.n_eval_points)
+
+    def add_unit(self, input, output, function=lambda x: 1):
+        # input and output are the (1D) node slices the unit connects from /
+        # to. The function is computed on the unit's value.
+        self.units.append((input, output, function))
+
+    def build(self, neuron_type, max_rates, rng=np.random,
+              solver=LstsqL2()):
+        # Creates the stacked neuron population (and the connections to and
+        # from each unit's block of neurons) in the current network context
+        n_units = len(self.units)
+        n_total = self.n_neurons * n_units
+
+        intercepts = Exponential(scale=self.exp_scale, shift=self.threshold,
+                                 high=1).sample(n_total, rng=rng)
+        if isinstance(max_rates, Distribution):
+            max_rates = max_rates.sample(n_total, rng=rng)
+        else:
+            max_rates = max_rates * np.ones(n_total)
+        gain, bias = neuron_type.gain_bias(max_rates, intercepts)
+
+        self.ensemble = nengo.Ensemble(
+            n_total, 1, encoders=Choice([[1]]), gain=gain, bias=bias,
+            radius=self.radius, neuron_type=neuron_type, label=self.label)
+
+        # Evaluation points (in the normalized [-1, 1] range) of each unit
+        eval_points = Uniform(min(self.threshold + 0.1, 1.0),
+                              1.1).sample(self.n_eval_points, 1, rng=rng)
+
+        for i, (input, output, function) in enumerate(self.units):
+            block = slice(i * self.n_neurons, (i + 1) * self.n_neurons)
+
+            activities = neuron_type.rates(eval_points, gain[block],
+                                           bias[block])
+            targets = np.array([np.ravel(function(x * self.radius))
+                                for x in eval_points])
+            decoders, _ = solver(activities, targets, rng=rng)
+
+            # Note: The neuron gains are applied to connections into neurons
+            nengo.Connection(input, self.ensemble.neurons[block],
+                             transform=([[1.0 / self.radius]] *
+                                        self.n_neurons),
+                             synapse=None)
+            nengo.Connection(self.ensemble.neurons[block], output,
+                             transform=decoders.T, synapse=None)
+        return self.ensemble
@@ -2,3 +2,4 @@ from .nengo_anim import NengoAnim
 from .arm_anim import ArmAnim
 from .anim_utils import GeneratorFunctions
 from .anim_utils import DataFunctions
+from .anim_export import build_anim, export_anim
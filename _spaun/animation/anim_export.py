@@ -0,0 +1,297 @@
+import os
+import shutil
+import tempfile
+import subprocess
+import numpy as np
+
+from .arm_anim import ArmAnim
+from .anim_utils import DataFunctions, expand_decimated_data
+from ..probe_io import ProbeDataReader
+
+
+def build_anim(anim_config, probe_data, fig, num_steps):
+    # Creates the animation object (and the data function for each animation
+    # subplot) from the animation configuration list (see
+    # SpaunProbeConfig.add_animation). Decimated probe data is expanded to
+    # num_steps (the number of simulation timesteps) samples.
+    max_subplot_cols = anim_config[-1]['max_subplot_cols']
+
+    num_plots = len(anim_config) - 1
+    num_cols = num_plots if num_plots < max_subplot_cols else \
+        max_subplot_cols
+    num_rows = int(np.ceil(1.0 * num_plots / max_subplot_cols))
+
+    # Make the animation object
+    anim_obj = ArmAnim(None, (num_rows, num_cols), fig)
+    func_map = {}
+
+    # Loop through the animation configuration list and add each subplot
+    for i, config in enumerate(anim_config[:-1]):
+        # Subplot location
+        subplot_row = i / max_subplot_cols
+        subplot_col = i % max_subplot_cols
+
+        # Create the data object to use for the animation
+        data_func_obj = getattr(DataFunctions, config['data_func'])
+        data_func_params = {}
+        data_func_decimate = config.get('data_func_decimate', {})
+        for param_name in config['data_func_params']:
+            if isinstance(config['data_func_params'][param_name], str):
+                data_func_params[param_name] = \
+                    probe_data[config['data_func_params'][param_name]]
+                if data_func_decimate.get(param_name, 1) > 1:
+                    data_func_params[param_name] = expand_decimated_data(
+                        data_func_params[param_name],
+                        data_func_decimate[param_name], num_steps)
+            else:
+                data_func_params[param_name] = \
+                    config['data_func_params'][param_name]
+        data_func = data_func_obj(**data_func_params)
+
+        # Add the data function to the function map
+        func_map[config['key']] = data_func
+
+        # Add animation subplot to anim_obj
+        plot_type_params = dict(config['plot_type_params'])
+        plot_type_params.setdefault('key', config['key'])
+        plot_type_params.setdefault('tl_loc', (subplot_row, subplot_col))
+        getattr(anim_obj, 'add_' + config['plot_type'])(**plot_type_params)
+
+    return anim_obj, func_map
+
+
+def get_anim_figsize(anim_config):
+    max_subplot_cols = anim_config[-1]['max_subplot_cols']
+
+    num_plots = len(anim_config) - 1
+    num_cols = num_plots if num_plots < max_subplot_cols else \
+        max_subplot_cols
+    num_rows = int(np.ceil(1.0 * num_plots / max_subplot_cols))
+    return (num_cols * anim_config[-1]['subplot_width'],
+            num_rows * anim_config[-1]['subplot_height'])
+
+
+def load_anim_data(data_filename):
+    # Returns the probe data reader, animation configuration list, and time
+    # range for the given (animation) probe data file
+    probe_data = ProbeDataReader(data_filename)
+    config_data = np.load(
+        os.path.splitext(data_filename.rstrip(os.sep))[0] + '_cfg.npz')
+
+    anim_config = config_data['anim_config']
+    sim_dt = float(config_data['dt'])
+    if 'trange' in probe_data:
+        trange = np.asarray(probe_data['trange'])
+    else:
+        data_len = max([probe_data[key].shape[0]
+                        for key in probe_data.keys()])
+        trange = np.arange(0, data_len * sim_dt, sim_dt)
+    return probe_data, anim_config, trange, sim_dt
+
+
+class AnimFrameRenderer(object):
+    # Renders animation frames offline (using the Agg canvas). Subplot updates
+    # are dispatched using the <plot_type>_update(key, t, data, draw_artists)
+    # convention of the animation classes. For plot types that display a
+    # window of data (those with a 'buffer_size'), the data of the rendered
+    # frames (every frame_step timesteps) is buffered here.
+    def __init__(self, anim_obj, func_map, t_data, fig, frame_step=1,
+                 blit=True):
+        self.anim_obj = anim_obj
+        self.func_map = func_map
+        self.t_data = t_data
+        self.frame_step = frame_step
+        self.blit = blit
+
+        self.fig = fig
+        self.canvas = self.fig.canvas
+        self.background = None
+        self.artists = []
+        self.buffers = {}
+
+    def update(self, t_index):
+        draw_artists = []
+        t = self.t_data[t_index]
+
+        for key in self.func_map:
+            data = self.func_map[key](t_index)
+
+            for plot_type in self.anim_obj.subplot_data[key]:
+                subplot_data = self.anim_obj.subplot_data[key][plot_type]
+                update_func = getattr(self.anim_obj, plot_type + '_update')
+
+                if 'buffer_size' in subplot_data:
+                    if (key, plot_type) not in self.buffers:
+                        self.buffers[(key, plot_type)] = self.init_buffer(
+                            key, t_index, subplot_data['buffer_size'])
+                    buffer_t, buffer_data = self.buffers[(key, plot_type)]
+                    buffer_t.append(t)
+                    buffer_data.append(np.array(data, copy=True))
+                    while buffer_t[-1] - buffer_t[0] > \
+                            subplot_data['buffer_size']:
+                        buffer_t.pop(0)
+                        buffer_data.pop(0)
+                    update_func(key, np.array(buffer_t),
+                                np.array(buffer_data).T, draw_artists)
+                else:
+                    update_func(key, t, data, draw_artists)
+        return draw_artists
+
+    def init_buffer(self, key, t_index, buffer_size):
+        # Returns the buffer (times and data) of the frames before t_index
+        # within the buffer window, so that the first frame rendered (e.g.
+        # the first frame of a video segment) displays the same window of
+        # data as when all of the preceding frames are rendered
+        frame_inds = np.arange(t_index % self.frame_step, t_index,
+                               self.frame_step)
+        frame_inds = frame_inds[self.t_data[t_index] -
+                                self.t_data[frame_inds] <= buffer_size]
+        return ([self.t_data[ind] for ind in frame_inds],
+                [np.array(self.func_map[key](ind), copy=True)
+                 for ind in frame_inds])
+
+    def get_axes_state(self):
+        return [(ax.get_xlim(), ax.get_ylim()) for ax in self.fig.axes]
+
+    def draw_background(self):
+        # Draws the static parts of the figure. The animated artists (and the
+        # axes titles, which are updated each frame) are drawn onto this
+        # background for each frame.
+        for artist in self.artists:
+            artist.set_animated(True)
+        self.canvas.draw()
+        self.background = self.canvas.copy_from_bbox(self.fig.bbox)
+
+    def render(self, t_index):
+        axes_state = self.get_axes_state()
+        draw_artists = self.update(t_index)
+
+        if not self.blit:
+            self.canvas.draw()
+            return self.canvas.buffer_rgba()
+
+        new_artists = [artist for artist in draw_artists
+                       if artist not in self.artists]
+        if self.background is None or len(new_artists) > 0 or \
+           axes_state != self.get_axes_state():
+            # Redraw background if the axes limits have changed (or there
+            # are artists that were not animated before)
+            self.artists = self.artists + new_artists + \
+                [ax.title for ax in self.fig.axes
+                 if ax.title not in self.artists]
+            self.draw_background()
+
+        self.canvas.restore_region(self.background)
+        for artist in self.artists:
+            self.fig.draw_artist(artist)
+        return self.canvas.buffer_rgba()
+
+
+def get_encoder_cmd(encoder, out_filename, frame_size, fps):
+    # Raw RGBA frames are piped into the encoder. Frame sizes are padded to
+    # even numbers (required by the yuv420p pixel format).
+    return [encoder, '-y', '-loglevel', 'error',
+            '-f', 'rawvideo', '-pix_fmt', 'rgba',
+            '-s', '%ix%i' % frame_size, '-r', str(fps), '-i', '-',
+            '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2',
+            '-c:v', 'libx264', '-pix_fmt', 'yuv420p', out_filename]
+
+
+def render_segment(data_filename, frame_inds, frame_step, out_filename,
+                   figsize, dpi, fps, blit=True, encoder='ffmpeg'):
+    # Renders the given frames of the animation to a video segment file.
+    # Note: The subplot updates only depend on the data of the rendered
+    #       frame (and, for windowed plot types, the data of the frames in
+    #       the window, see AnimFrameRenderer.init_buffer), so the segments
+    #       can be rendered independently.
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    probe_data, anim_config, trange, _ = load_anim_data(data_filename)
+
+    fig = Figure(figsize=figsize, dpi=dpi)
+    FigureCanvasAgg(fig)
+    anim_obj, func_map = build_anim(anim_config, probe_data, fig,
+                                    trange.shape[0])
+    renderer = AnimFrameRenderer(anim_obj, func_map, trange, fig,
+                                 frame_step, blit)
+
+    frame_size = tuple(map(int, fig.bbox.size))
+    encoder_proc = subprocess.Popen(
+        get_encoder_cmd(encoder, out_filename, frame_size, fps),
+        stdin=subprocess.PIPE)
+    try:
+        for t_index in frame_inds:
+            encoder_proc.stdin.write(renderer.render(t_index))
+    finally:
+        encoder_proc.stdin.close()
+        encoder_proc.wait()
+        probe_data.close()
+
+    if encoder_proc.returncode != 0:
+        raise RuntimeError('Encoder failed to encode video segment "%s".' %
+                           out_filename)
+    return out_filename
+
+
+def _render_segment_args(args):
+    return render_segment(*args)
+
+
+def export_anim(data_filename, out_filename, processes=1, frame_step=None,
+                fps=None, dpi=100, blit=True, encoder='ffmpeg'):
+    # Renders the animation of the given (animation) probe data file to a
+    # video file (.mp4 or .gif). The frames are split into contiguous
+    # segments, which are rendered and encoded in parallel, then concatenated.
+    probe_data, anim_config, trange, sim_dt = load_anim_data(data_filename)
+    probe_data.close()
+
+    if frame_step is None:
+        data_gen_func_params = anim_config[-1]['generator_func_params']
+        frame_step = data_gen_func_params.get('t_index_step', 1)
+    if fps is None:
+        # Default to real-time (simulation time) playback
+        fps = 1.0 / (sim_dt * frame_step)
+
+    frame_inds = np.arange(0, trange.shape[0], frame_step)
+    num_segments = max(min(processes, len(frame_inds)), 1)
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        args_list = [(data_filename, segment_inds, frame_step,
+                      os.path.join(temp_dir, 'segment_%i.mp4' % i),
+                      get_anim_figsize(anim_config), dpi, fps, blit, encoder)
+                     for i, segment_inds in
+                     enumerate(np.array_split(frame_inds, num_segments))]
+
+        if num_segments > 1:
+            import multiprocessing
+
+            pool = multiprocessing.Pool(num_segments)
+            segment_filenames = pool.map(_render_segment_args, args_list,
+                                         chunksize=1)
+            pool.close()
+            pool.join()
+        else:
+            segment_filenames = map(_render_segment_args, args_list)
+
+        # Concatenate the encoded segments
+        list_filename = os.path.join(temp_dir, 'segments.txt')
+        with open(list_filename, 'w') as list_file:
+            for segment_filename in segment_filenames:
+                list_file.write("file '%s'\n" % segment_filename)
+
+        concat_cmd = [encoder, '-y', '-loglevel', 'error', '-f', 'concat',
+                      '-safe', '0', '-i', list_filename]
+        if os.path.splitext(out_filename)[1].lower() == '.gif':
+            concat_cmd += ['-filter_complex',
+                           '[0:v]split[a][b];[a]palettegen[p];' +
+                           '[b][p]paletteuse']
+        else:
+            concat_cmd += ['-c', 'copy']
+        if subprocess.call(concat_cmd + [out_filename]) != 0:
+            raise RuntimeError('Encoder failed to concatenate video segments.')
+    finally:
+        shutil.rmtree(temp_dir)
+
+    return out_filename
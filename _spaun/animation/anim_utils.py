@@ -2,6 +2,18 @@ import time
 import sys
 import numpy as np
 
+from ..probe_io import SpikeTrains
+
+
+def expand_decimated_data(data, decimate, num_steps):
+    # Expands decimated probe data (where sample k is the value at timestep
+    # (k + 1) * decimate - 1) to num_steps samples (one per timestep), by
+    # holding each sample until the next one
+    data = np.asarray(data)
+    num_samples = data.shape[0]
+    inds = (np.arange(num_steps) + 1) // decimate - 1
+    return data[np.clip(inds, 0, num_samples - 1)]
+
 
 def print_progress_bar(t, t_max, steps=10, eta_s=None):
     percent_done = min(t / t_max * 1.0, 1)
@@ -64,62 +76,8 @@ class GeneratorFunctions(object):
     #         # TODO: Pass all data to animation functions instead of bits of
     #         #       it?
 
-    # @staticmethod
-    # def run_nengo_sim_generator(sim, dt, t_stop, t_sim_step=None,
-    #                             probe_buffer_size=-1, use_data_dict=True,
-    #                             func_list=[], nengo_sim_run_opts=1):
-    #     t = 0
-    #     if t_sim_step is None:
-    #         t_sim_step = 5 * dt
-
-    #     print_progress_bar(t, t_stop)
-    #     timestamp_start = time.time()
-
-    #     probe_buffer_size = max(probe_buffer_size, t_sim_step)
-    #     num_data_indices = int(np.floor(probe_buffer_size / dt))
-
-    #     data_dict = {}
-
-    #     while t < t_stop:
-    #         step_runtime = min(t_sim_step, t_stop - t)
-    #         step_runtime = np.ceil(step_runtime / dt) * dt
-
-    #         for func in func_list:
-    #             func(t)
-
-    #         if nengo_sim_run_opts:
-    #             sim.run(step_runtime, progress_bar=False)
-    #         else:
-    #             sim.run(step_runtime)
-    #         timestamp = time.time()
-    #         t = sim.trange()[-1]
-
-    #         if use_data_dict and len(sim.model.probes) > 0:
-    #             if num_data_indices > 0:
-    #                 data_len = len(sim._probe_outputs[sim.model.probes[0]])
-
-    #                 tdata = sim.trange()[-num_data_indices:]
-
-    #                 data_len_remove = data_len - num_data_indices
-    #                 for probe in sim.model.probes:
-    #                     if data_len_remove > 0:
-    #                         del sim._probe_outputs[probe][:(data_len_remove)]
-
-    #                     pdata = sim.data[probe].T
-    #                     data_dict[probe] = pdata
-    #             else:
-    #                 tdata = sim.trange()
-
-    #                 for probe in sim.model.probes:
-    #                     pdata = sim.data[probe].T
-    #                     data_dict[probe] = pdata
-
-    #             yield (tdata, data_dict)
-
-    #         print_progress_bar(t, t_stop,
-    #                            eta_s=1.0 * (timestamp - timestamp_start)
-    #                            * (t_stop - t) / t)
-    #     print ""
+    # NOTE: Running the simulation in slices (and streaming the probe data
+    #       while it runs) is supported by live_stream.run_sim_streaming
 
     @staticmethod
     def keyed_data_funcs(t_data, func_map, t_index_step=1):
@@ -140,42 +98,58 @@ class DataFunctions(object):
     def arm_path(ee_path_data=None, target_path_data=None,
                  pen_status_data=None, arm_posx_data=None, arm_posy_data=None,
                  arm_pos_bias=None):
-
+        # The arm path data for all timesteps is computed once. Format:
+        # [0:2]: EE (x, y), [2:4]: target (x, y), [4]: pen status,
+        # [5:9]: arm joint x positions, [9:13]: arm joint y positions,
+        # [13]: start index of the current pen up / down segment
+        # The data function returns views (no copies) of the path data:
+        # (current pen segment up to t_index, previous pen segment)
         if arm_pos_bias is None:
             arm_pos_bias = [0, 0]
 
-        def data_func(t_index, ee_data=ee_path_data, tgt_data=target_path_data,
-                      pen_data=pen_status_data,
-                      arm_data=[arm_posx_data, arm_posy_data],
-                      arm_bias=arm_pos_bias):
-            data = np.zeros(13)
-
-            if ee_data is not None:
-                data[0:2] = ee_data[t_index, :]
-            else:
-                data[0:2] = None
-
-            if tgt_data is not None:
-                data[2:4] = tgt_data[t_index, :]
-            else:
-                data[2:4] = None
-
-            if pen_data is not None:
-                data[4] = pen_data[t_index, 0]
-            else:
-                data[4] = 1
-
-            if arm_data[0] is not None and arm_data[1] is not None:
-                data[5:9] = arm_data[0][t_index, :] - arm_bias[0]
-                data[9:13] = arm_data[1][t_index, :] - arm_bias[1]
-
-                if ee_data is None:
-                    data[0] = arm_data[0][t_index, -1] - arm_bias[0]
-                    data[1] = arm_data[1][t_index, -1] - arm_bias[1]
-            else:
-                data[5:] = None
-
-            return data
+        path_data_list = [ee_path_data, target_path_data, pen_status_data,
+                          arm_posx_data, arm_posy_data]
+        num_steps = max([np.shape(d)[0] for d in path_data_list
+                         if d is not None])
+        path_data = np.empty((num_steps, 14))
+
+        if ee_path_data is not None:
+            path_data[:, 0:2] = np.asarray(ee_path_data)[:, :2]
+        else:
+            path_data[:, 0:2] = np.nan
+
+        if target_path_data is not None:
+            path_data[:, 2:4] = np.asarray(target_path_data)[:, :2]
+        else:
+            path_data[:, 2:4] = np.nan
+
+        if pen_status_data is not None:
+            path_data[:, 4] = np.asarray(pen_status_data)[:, 0]
+        else:
+            path_data[:, 4] = 1
+
+        if arm_posx_data is not None and arm_posy_data is not None:
+            path_data[:, 5:9] = np.asarray(arm_posx_data) - arm_pos_bias[0]
+            path_data[:, 9:13] = np.asarray(arm_posy_data) - arm_pos_bias[1]
+
+            if ee_path_data is None:
+                path_data[:, 0] = path_data[:, 8]
+                path_data[:, 1] = path_data[:, 12]
+        else:
+            path_data[:, 5:13] = np.nan
+
+        # Find the start of each pen up / down segment
+        pen_down = path_data[:, 4] > 0.5
+        segment_starts = np.zeros(num_steps, dtype=int)
+        segment_starts[1:] = np.where(pen_down[1:] != pen_down[:-1],
+                                      np.arange(1, num_steps), 0)
+        path_data[:, 13] = np.maximum.accumulate(segment_starts)
+
+        def data_func(t_index, path_data=path_data):
+            seg_start = int(path_data[t_index, 13])
+            prev_seg_start = int(path_data[max(seg_start - 1, 0), 13])
+            return (path_data[seg_start:t_index + 1],
+                    path_data[prev_seg_start:seg_start])
 
         return data_func
 
@@ -185,6 +159,51 @@ class DataFunctions(object):
             return data[t_index, :]
         return data_func
 
+    @staticmethod
+    def stim_image(data, image_data=None):
+        # Rebuilds the stimulus images from recorded stimulus events (see
+        # SpaunProbeConfig.probe_stimulus)
+        if image_data is None:
+            from ..modules.vision.data import vis_data
+            image_data = vis_data.images_data
+
+        event_steps = np.asarray(data['step'])
+        event_images = np.asarray(data['image'])
+        blank_image = np.zeros(image_data.shape[1])
+
+        def data_func(t_index, event_steps=event_steps,
+                      event_images=event_images):
+            event_ind = np.searchsorted(event_steps, t_index, side='right') - 1
+            if event_ind < 0 or event_images[event_ind] < 0:
+                return blank_image
+            return image_data[event_images[event_ind]]
+        return data_func
+
+    @staticmethod
+    def spike_trains(data, neurons=None):
+        # Spike probe data (sparse spike event list, see probe_io.SpikeTrains)
+        # Returns the spike data vector of the given neurons for each timestep
+        if neurons is None:
+            neurons = np.arange(data.shape[1])
+
+        if not isinstance(data, SpikeTrains):
+            # Dense probe data (spikes, or the firing rates of a rate neuron
+            # type) is returned as is
+            def dense_data_func(t_index, data=data, neurons=neurons):
+                return np.asarray(data[t_index])[neurons]
+            return dense_data_func
+
+        neuron_map = -np.ones(data.num_neurons, dtype=int)
+        neuron_map[neurons] = np.arange(len(neurons))
+
+        def data_func(t_index, data=data, neuron_map=neuron_map):
+            spike_data = np.zeros(len(neurons))
+            spike_inds = neuron_map[data.step_neurons(t_index)]
+            np.add.at(spike_data, spike_inds[spike_inds >= 0],
+                      data.spike_value)
+            return spike_data
+        return data_func
+
     @staticmethod
     def generic_constant(data):
         flatten_data = np.asarray(data).flatten()
@@ -21,14 +21,6 @@ class ArmAnim(MatplotlibAnim):
             self.subplot_data[key][plot_type]['ax'] = ax
 
         subplot_data = self.subplot_data[key][plot_type]
-        subplot_data['ee_down_data'] = [[], []]
-        subplot_data['ee_up_data'] = [[], []]
-        subplot_data['ee_point'] = []
-        subplot_data['target_down_data'] = [[], []]
-        subplot_data['target_up_data'] = [[], []]
-        subplot_data['target_point'] = []
-        subplot_data['last_up_down_state'] = 0  # 0: up, 1: down
-        subplot_data['last_t'] = 0
 
         ee_point_down_plot_args.setdefault('color', '#0000DD')
         ee_point_down_plot_args.setdefault('marker', 'x')
@@ -83,81 +75,31 @@ class ArmAnim(MatplotlibAnim):
          target_point_line, target_down_line, target_up_line, arm_line) = \
             subplot_data['lines']
 
-        ee_x = data[0]
-        ee_y = data[1]
-        target_x = data[2]
-        target_y = data[3]
-        up_down = data[4]
-        arm_pos_x_data = data[5:9]
-        arm_pos_y_data = data[9:13]
-
-        # Last up-down state
-        last_up_down_state = subplot_data['last_up_down_state']
-
-        # Update EE (end effector) and target path plots
-        ee_down_data = subplot_data['ee_down_data']
-        ee_up_data = subplot_data['ee_up_data']
-        target_down_data = subplot_data['target_down_data']
-        target_up_data = subplot_data['target_up_data']
-
-        # Need to manually erase data on animation loop restart
-        if t_data < subplot_data['last_t']:
-            del ee_down_data[0][:]
-            del ee_down_data[1][:]
-            del target_down_data[0][:]
-            del target_down_data[1][:]
-            del ee_up_data[0][:]
-            del ee_up_data[1][:]
-            del target_up_data[0][:]
-            del target_up_data[1][:]
-            subplot_data['last_up_down_state'] = 0
-
-            # Update plots
-            ee_point_down_line.set_data(None, None)
-            ee_point_up_line.set_data(None, None)
-            target_point_line.set_data(None, None)
-            ee_down_line.set_data(ee_down_data[0], ee_down_data[1])
-            target_down_line.set_data(target_down_data[0], target_down_data[1])
-            ee_up_line.set_data(ee_up_data[0], ee_up_data[1])
-            target_up_line.set_data(target_up_data[0], target_up_data[1])
-        subplot_data['last_t'] = t_data
+        # Path data views (see DataFunctions.arm_path): the current pen
+        # segment (up to the current timestep), and the previous pen segment
+        # (which has the other pen state). Each frame only depends on the
+        # data for the current timestep.
+        curr_path, prev_path = data
+        ee_x, ee_y, target_x, target_y, up_down = curr_path[-1, :5]
+        arm_pos_x_data = curr_path[-1, 5:9]
+        arm_pos_y_data = curr_path[-1, 9:13]
 
         if up_down > 0.5:
             # EE is in down state
-            if last_up_down_state == 0:
-                subplot_data['last_up_down_state'] = 1
-                del ee_down_data[0][:]
-                del ee_down_data[1][:]
-                del target_down_data[0][:]
-                del target_down_data[1][:]
-                ee_point_up_line.set_data(None, None)
-
-            ee_down_data[0].append(ee_x)
-            ee_down_data[1].append(ee_y)
-            target_down_data[0].append(target_x)
-            target_down_data[1].append(target_y)
-
+            down_path, up_path = curr_path, prev_path
             ee_point_down_line.set_data(ee_x, ee_y)
-            ee_down_line.set_data(ee_down_data[0], ee_down_data[1])
-            target_down_line.set_data(target_down_data[0], target_down_data[1])
+            ee_point_up_line.set_data(None, None)
         else:
             # EE is in up state
-            if last_up_down_state == 1:
-                subplot_data['last_up_down_state'] = 0
-                del ee_up_data[0][:]
-                del ee_up_data[1][:]
-                del target_up_data[0][:]
-                del target_up_data[1][:]
-                ee_point_down_line.set_data(None, None)
-
-            ee_up_data[0].append(ee_x)
-            ee_up_data[1].append(ee_y)
-            target_up_data[0].append(target_x)
-            target_up_data[1].append(target_y)
-
+            down_path, up_path = prev_path, curr_path
+            ee_point_down_line.set_data(None, None)
             ee_point_up_line.set_data(ee_x, ee_y)
-            ee_up_line.set_data(ee_up_data[0], ee_up_data[1])
-            target_up_line.set_data(target_up_data[0], target_up_data[1])
+
+        # Update EE (end effector) and target path plots
+        ee_down_line.set_data(down_path[:, 0], down_path[:, 1])
+        target_down_line.set_data(down_path[:, 2], down_path[:, 3])
+        ee_up_line.set_data(up_path[:, 0], up_path[:, 1])
+        target_up_line.set_data(up_path[:, 2], up_path[:, 3])
 
         target_point_line.set_data(target_x, target_y)
 
@@ -170,3 +112,4 @@ class ArmAnim(MatplotlibAnim):
         draw_artists.append(target_point_line)
         draw_artists.append(target_down_line)
         draw_artists.append(target_up_line)
+        draw_artists.append(arm_line)
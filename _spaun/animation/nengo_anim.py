@@ -72,9 +72,11 @@ class NengoAnim(MatplotlibAnim):
             # sdata = ma.array(data[:n_neurons, :].repeat(3).flatten())
             # sdata = np.multiply(sdata, spike_heights.flatten()) / max_val
 
-            tdata = t_data.repeat(3)
+            # Only draw the spikes (nonzero data)
             for n in range(n_neurons):
-                sdata = ma.array((data[n]).repeat(3))
+                spike_inds = np.nonzero(data[n])[0]
+                tdata = t_data[spike_inds].repeat(3)
+                sdata = ma.array(np.repeat(data[n][spike_inds], 3))
                 sdata[0::3] *= (1 + n - s_h) / max_val
                 sdata[1::3] *= (1 + n + s_h) / max_val
                 sdata[2::3] = ma.masked
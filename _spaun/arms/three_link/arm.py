@@ -87,8 +87,9 @@ class Arm3Link(Arm):
         """
         u = -1 * np.array(u, dtype='float')
 
-        for ii in range(int(np.ceil(dt / 1e-5))):
-            self.sim.step(self.state, u)
+        # Note: The integration substeps are run in one call to the compiled
+        #       arm simulation (which releases the GIL while integrating)
+        self.sim.step_n(self.state, u, int(np.ceil(dt / 1e-5)))
         self.update_state()
 
     def gen_jacCOM1(self, q=None):
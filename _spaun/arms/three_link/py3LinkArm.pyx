@@ -5,7 +5,7 @@ cdef extern from "threelinkarm.cpp":
     cdef cppclass Sim:
         Sim(double dt, double* params)
         void reset(double* out, double* ic)
-        void step(double* out, double* u)
+        void step(double* out, double* u) nogil
  
 cdef class pySim:
     cdef Sim* thisptr
@@ -40,4 +40,23 @@ cdef class pySim:
             NOTE: output is of form [time, output]
         param np.ndarray u: the control signal
         """
-        self.thisptr.step(&out[0], &u[0])
+        with nogil:
+            self.thisptr.step(&out[0], &u[0])
+
+    def step_n(self, np.ndarray[double, mode="c"] out,
+                     np.ndarray[double, mode="c"] u, int num_steps):
+        """
+        Step the simulation forward num_steps timesteps with the same
+        control signal. The integration loop runs without the GIL, so
+        other Python threads can run in the meantime.
+        param np.ndarray out: where to store the system output
+            NOTE: output is of form [time, output]
+        param np.ndarray u: the control signal
+        param int num_steps: the number of timesteps to step
+        """
+        cdef int ii
+        cdef double* out_ptr = &out[0]
+        cdef double* u_ptr = &u[0]
+        with nogil:
+            for ii in range(num_steps):
+                self.thisptr.step(out_ptr, u_ptr)
@@ -10,8 +10,11 @@ from _spa import MemoryBlock as MB
 from _spa import SPAEnsembleArray
 from _spa.utils import get_optimal_radius
 from _networks import AssociativeMemory as AM
+from _networks import StackedAssociativeMemory as StackedAM
 from _networks import InputGatedMemory as Memory
 from _networks import Selector, Router, VectorNormalize
+from _networks import ThresholdEnsembleBlock
+from subdim_tuner import SubdimTuner
 # from arms import Arm3Link
 
 from vocabulator import vocab
@@ -38,6 +41,29 @@ class SpaunConfig(object):
 
         self.sim_dt = 0.001
 
+        # Stack the threshold ensembles (with the same configuration) of all
+        # of the threshold networks into population blocks
+        self.thresh_ens_blocks = False
+        self._thresh_blocks = []
+
+        # Use the associative memory implementation with stacked item
+        # populations
+        self.am_stacked = False
+
+        # Tune the sub-ensembles of the SPA ensemble arrays (memories,
+        # selectors, routers, gates). The sub-ensemble dimensionality, number
+        # of neurons and radius of each ensemble array configuration are
+        # chosen to meet the representation RMSE of the default 1D
+        # sub-ensemble configuration (or subdim_target_rmse) with the fewest
+        # neurons (see subdim_tuner.py). The tuned configurations are stored
+        # in subdim_table: (dimensions, n_neurons, radius) ->
+        # (ens_dimensions, n_neurons, radius). Entries in the table (e.g.
+        # from a previous run) are used without re-tuning.
+        self.subdim_tuning = False
+        self.subdim_target_rmse = None
+        self.subdim_max_ens_dimensions = 16
+        self.subdim_table = {}
+
         self.ps_mb_gain_scale = 2.0
         self.ps_use_am_mb = True
         self.ps_action_am_threshold = 0.2
@@ -80,6 +106,19 @@ class SpaunConfig(object):
 
         self._backend = 'ref'
 
+        # Multi-rate python nodes: The slow python nodes (stimulus, output
+        # monitor) only recompute their output when the stimulus changes or
+        # their update period (in seconds) elapses, and return their cached
+        # output otherwise
+        self.multirate_nodes = False
+        self.mon_update_period = 0.005
+
+        # Spaun module groups simulated in separate processes by the local
+        # multi-process backend (everything else is simulated in the main
+        # process)
+        self.local_mp_groups = [['vis'], ['ps', 'bg', 'thal', 'reward'],
+                                ['enc', 'mem'], ['trfm'], ['dec'], ['mtr']]
+
         self.data_dir = ''
         self.probe_data_filename = 'probe_data.npz'
 
@@ -98,6 +137,8 @@ class SpaunConfig(object):
             self._backend = 'mpi'
         elif val in ['spinn']:
             self._backend = 'spinn'
+        elif val in ['local_mp', 'mp']:
+            self._backend = 'local_mp'
         else:
             raise RuntimeError('Exception! "%s" backend is not supported!' %
                                val)
@@ -118,6 +159,10 @@ class SpaunConfig(object):
     def use_spinn(self):
         return self.backend == 'spinn'
 
+    @property
+    def use_local_mp(self):
+        return self.backend == 'local_mp'
+
     @property
     def mtr_arm_class(self):
         if self.mtr_arm_type is None:
@@ -170,7 +215,11 @@ class SpaunConfig(object):
         am_args['threshold'] = args.get('threshold', 0.5)
         am_args['n_neurons'] = args.get('n_neurons', self.n_neurons_am)
 
-        am_net = AM(input_vectors, output_vectors, **am_args)
+        if self.am_stacked and not isinstance(self.neuron_type,
+                                              nengo.Direct):
+            am_net = StackedAM(input_vectors, output_vectors, **am_args)
+        else:
+            am_net = AM(input_vectors, output_vectors, **am_args)
 
         if default_output_vector is not None:
             am_net.add_default_output_vector(default_output_vector)
@@ -218,6 +267,30 @@ class SpaunConfig(object):
         if exp_scale is None:
             exp_scale = (1 - threshold) / 10.0
 
+        if self.thresh_ens_blocks and args.get('dimensions', 1) == 1 and \
+           set(args.keys()) <= set(['n_neurons', 'radius', 'label']) and \
+           not isinstance(self.neuron_type, nengo.Direct):
+            # Threshold ensembles are created (as part of a population block)
+            # in make_thresh_ens_blocks
+            with net:
+                net.input = nengo.Node(size_in=num_ens)
+                net.output = nengo.Node(size_in=num_ens)
+
+            block = ThresholdEnsembleBlock(
+                args.get('n_neurons', self.n_neurons_ens), threshold,
+                exp_scale, radius=args.get('radius', 1.0),
+                label='Threshold Ens Block')
+            for thresh_block in self._thresh_blocks:
+                if thresh_block.key == block.key:
+                    block = thresh_block
+                    break
+            else:
+                self._thresh_blocks.append(block)
+
+            for i in range(num_ens):
+                block.add_unit(net.input[i], net.output[i], thresh_func)
+            return net
+
         with net:
             ens_args = dict(args)
             ens_args['n_neurons'] = args.get('n_neurons', self.n_neurons_ens)
@@ -239,6 +312,18 @@ class SpaunConfig(object):
                                  function=thresh_func, synapse=None)
         return net
 
+    def make_thresh_ens_blocks(self, net=None):
+        # Creates the population blocks for the threshold ensembles created
+        # with make_thresh_ens_net (when thresh_ens_blocks is True)
+        if net is None:
+            net = nengo.Network(label='Threshold Ens Blocks')
+
+        with net:
+            for block in self._thresh_blocks:
+                block.build(self.neuron_type, self.max_rates, self.rng)
+        self._thresh_blocks = []
+        return net
+
     def make_ens_array(self, **args):
         ens_args = dict(args)
         ens_args['n_neurons'] = args.get('n_neurons', self.n_neurons_ens)
@@ -247,10 +332,31 @@ class SpaunConfig(object):
         ens_args['radius'] = args.get('radius', self.get_optimal_sp_radius())
         return EnsembleArray(**ens_args)
 
+    def get_subdim_config(self, dimensions, n_neurons, radius=None):
+        # Returns the tuned (ens_dimensions, n_neurons, radius) ensemble
+        # array configuration (see subdim_tuning)
+        key = (dimensions, n_neurons,
+               None if radius is None else round(radius, 6))
+        if key not in self.subdim_table:
+            tuner = SubdimTuner(self.neuron_type, self.max_rates,
+                                self.subdim_target_rmse,
+                                self.subdim_max_ens_dimensions)
+            self.subdim_table[key] = tuner.tune(dimensions, n_neurons,
+                                                radius)
+        return self.subdim_table[key]
+
     def make_spa_ens_array(self, **args):
         ens_args = dict(args)
         ens_args['n_neurons'] = args.get('n_neurons', self.n_neurons_ens)
         ens_args['dimensions'] = args.get('dimensions', vocab.sp_dim)
+
+        if self.subdim_tuning and 'n_ensembles' not in args and \
+           not isinstance(self.neuron_type, nengo.Direct):
+            ens_dimensions, ens_args['n_neurons'], ens_args['radius'] = \
+                self.get_subdim_config(ens_args['dimensions'],
+                                       ens_args['n_neurons'],
+                                       args.get('radius', None))
+            ens_args['n_ensembles'] = ens_args['dimensions'] // ens_dimensions
         return SPAEnsembleArray(**ens_args)
 
     def make_spa_ens_array_gate(self, threshold_gate=True, inhib_scale=3,
@@ -1,8 +1,130 @@
 import numpy as np
+from warnings import warn
 
 from loggerator import logger
 
 
+def get_task_ref_answer(task_str, task_info):
+    # Computes the reference (expected) answer for a task, given the task
+    # string (e.g. 'A3') and the task information string (the task stimulus
+    # before the question mark, e.g. '[1234]R'). Returns the list of answer
+    # characters, or None if the task has no reference answer (learning task)
+    # or the task is invalid.
+    if task_str not in ['A0', 'A1', 'A3', 'A4', 'A5', 'A6', 'A7']:
+        return None
+
+    # Record special characters
+    has_R = 'R' in task_info
+    has_P = 'P' in task_info
+    has_K = 'K' in task_info
+
+    # Split up the different components of the task info, and remove [ ]'s
+    # and special characters from each part
+    task_info_split = task_info.split(']')
+    if task_info_split[-1] == '':
+        task_info_split = task_info_split[:-1]
+    for c in ['[', ']', 'F', 'R', 'P', 'K']:
+        task_info_split = [info.replace(c, '') for info in task_info_split]
+
+    if task_str in ['A0', 'A1', 'A3']:
+        # For copy-draw, classification, memory task
+        task_answer_ref = list(task_info_split[0])
+        if has_R:
+            task_answer_ref = task_answer_ref[::-1]
+        return task_answer_ref
+    elif task_str == 'A4':
+        # For counting tasks
+        ans_num = int(task_info_split[0]) + int(task_info_split[1])
+
+        # Ignore invalid task options
+        if ans_num > 9:
+            warn('A4: Computed answer > 9')
+            return None
+        return [str(ans_num)]
+    elif task_str == 'A5':
+        # QA task
+        num_list = map(int, list(task_info_split[0]))
+        probe_num = int(task_info_split[1])
+
+        if has_P:
+            return [str(num_list[probe_num - 1])]
+        elif has_K:
+            return [str(num_list.index(probe_num) + 1)]
+        else:
+            warn('A5: No valid P/K for QA task')
+            return None
+    elif task_str == 'A6':
+        # RVC task
+        if not len(task_info_split) % 2:
+            warn('A6: Invalid RVC task. No question list given.')
+            return None
+
+        match_list = None
+        for i in range(len(task_info_split) / 2):
+            list1 = np.array(list(task_info_split[i * 2]))
+            list2 = np.array(list(task_info_split[i * 2 + 1]))
+            if match_list is None:
+                match_list = [set(np.where(list1 == item)[0])
+                              for item in list2]
+            elif len(list2) != len(match_list):
+                warn('A6: Inconsistent RVC ref answer lengths.')
+                return None
+            else:
+                match_list = [match_list[j] &
+                              set(np.where(list1 == list2[j])[0])
+                              for j in range(len(match_list))]
+        list1 = list(task_info_split[-1])
+        return [list1[sorted(match_set)[0]] for match_set in match_list]
+    elif task_str == 'A7':
+        # Raven's induction task
+        # Induction task comes in two forms: changing list len, and changing
+        #                                    number relations
+        col_count = 1
+        induction_diff = None
+        induction_len_change = None
+
+        for i in range(1, len(task_info_split)):
+            if col_count % 3 == 0:
+                col_count += 1
+                continue
+            list1 = map(int, list(task_info_split[i - 1]))
+            list2 = map(int, list(task_info_split[i]))
+
+            # Handle the following cases:
+            # 1. Unchanging list lengths of len 1
+            if len(list1) == len(list2) == 1:
+                diff = list2[0] - list1[0]
+                if induction_diff is None:
+                    induction_diff = diff
+                if induction_diff != diff:
+                    warn('A7: Inconsistent change between induction items')
+                    return None
+            # 2. Changing list lengths, but containing identical items
+            elif list1[0] == list2[0]:
+                len_change = len(list2) - len(list1)
+                if induction_len_change is None:
+                    induction_len_change = len_change
+                if induction_len_change != len_change:
+                    warn('A7: Inconsistent change between list lengths')
+                    return None
+            else:
+                warn('A7: Unhandled induction task type')
+                return None
+
+            # Handle transition to next row
+            col_count += 1
+
+        list1 = [int(c) if c.isdigit() else -1
+                 for c in list(task_info_split[-1])]
+        if induction_diff is not None and induction_len_change is None:
+            return [str(list1[0] + induction_diff)]
+        elif induction_len_change is not None and induction_diff is None:
+            return [str(list1[0])] * (len(list1) + 1)
+        else:
+            warn('A7: Multiple induction types encountered?')
+            return None
+
+
 class SpaunExperiment(object):
     def __init__(self):
         self.num_map = {'0': 'ZER', '1': 'ONE', '2': 'TWO', '3': 'THR',
@@ -37,6 +159,15 @@ class SpaunExperiment(object):
 
         self.prev_t_ind = -1
 
+        # List of presented stimulus events (time, stimulus token, image
+        # index). Recorded only when the presented image changes.
+        self.stim_events = []
+
+        # List of task records (one for each task presented). Each record is a
+        # dict with the task string, the task stimulus tokens, the task start
+        # time, and Spaun's answers (and response times).
+        self.task_records = []
+
     @property
     def num_learn_actions(self):
         return max(self._num_learn_actions, self.learn_min_num_actions)
@@ -436,6 +567,11 @@ class SpaunExperiment(object):
     def get_t_ind(self, t):
         return int(self.get_t_ind_float(t))
 
+    def get_stim_key(self, t):
+        # The output of get_stimulus only changes when this key changes
+        # (used to trigger the updates of multi-rate stimulus nodes)
+        return (self.get_t_ind(t), int(round(self.get_t_ind_float(t))))
+
     def in_learning_phase(self, t):
         t_ind = min(self.get_t_ind(t), len(self.task_phase_seq_list) - 1)
         task = self.task_phase_seq_list[t_ind]
@@ -452,6 +588,9 @@ class SpaunExperiment(object):
             # Write the stimulus to file
             if t_ind < len(self.stim_seq_list):
                 stim_char = self.stim_seq_list[t_ind]
+                self.record_task_stim(t, stim_char)
+                logger.write_record('stim', t=t, stim=str(stim_char))
+
                 if (stim_char == '.'):
                     # logger.write('_')
                     logger.write('')  # Ignore the . blank character
@@ -483,8 +622,11 @@ class SpaunExperiment(object):
         else:
             out_str = self.null_output
         logger.write(out_str)
+        logger.write_record('output', t=t, output=out_str)
         logger.flush()
 
+        self.record_task_output(t, out_ind)
+
         if self.in_learning_phase(t):
             # Denote learning phase reward
             logger.write('|')
@@ -519,7 +661,96 @@ class SpaunExperiment(object):
                                get_image_label, self.present_blanks,
                                mtr_est_digit_response_time, rng)
 
+    def record_stim_event(self, t, stim_token, img_ind):
+        if len(self.stim_events) > 0 and self.stim_events[-1][2] == img_ind:
+            return
+        self.stim_events.append((t, stim_token, img_ind))
+
+    def get_stim_token(self, stim_char):
+        # Symbolic (log format) representation of the stimulus character
+        if isinstance(stim_char, tuple):
+            # Handwritten digit (image index, label)
+            return str(stim_char[1])
+        elif isinstance(stim_char, int):
+            return '<%s>' % stim_char
+        elif stim_char in self.num_rev_map:
+            return self.num_rev_map[stim_char]
+        elif stim_char in self.sym_rev_map:
+            return self.sym_rev_map[stim_char]
+        else:
+            return str(stim_char)
+
+    def record_task_stim(self, t, stim_char):
+        if stim_char is None or stim_char == '.':
+            return
+
+        if stim_char == 'A':
+            self.task_records.append({'task': '', 'stim': [],
+                                      'start_time': t, 'answer': [],
+                                      'response_times': []})
+        elif len(self.task_records) > 0:
+            record = self.task_records[-1]
+            if record['task'] == '':
+                record['task'] = 'A' + self.get_stim_token(stim_char)
+            else:
+                record['stim'].append(self.get_stim_token(stim_char))
+
+    def record_task_output(self, t, out_ind):
+        if len(self.task_records) <= 0:
+            return
+
+        if out_ind >= 0 and out_ind < len(self.num_out_list) - 1:
+            out_str = str(out_ind)
+        elif out_ind == len(self.num_out_list) - 1:
+            out_str = '-'
+        else:
+            out_str = self.null_output
+
+        self.task_records[-1]['answer'].append(out_str)
+        self.task_records[-1]['response_times'].append(t)
+
+    def write_task_records(self, filename):
+        # Writes the task records in a columnar format:
+        # - task, stim, ref_answer, answer, start_time: one entry per task
+        #   (stimulus and answers are stored as strings)
+        # - response_times: Response times for all the answers, with
+        #   response_ptr giving the start index for each task (CSR format)
+        tasks = []
+        stims = []
+        ref_answers = []
+        valid = []
+        for record in self.task_records:
+            task_stim = ''.join(record['stim'])
+            ref_answer = get_task_ref_answer(record['task'],
+                                             task_stim.split('?', 1)[0])
+
+            tasks.append(record['task'])
+            stims.append(task_stim)
+            ref_answers.append('' if ref_answer is None else
+                               ''.join(ref_answer))
+            valid.append(ref_answer is not None)
+
+        num_responses = [len(r['response_times']) for r in self.task_records]
+        response_ptr = np.zeros(len(self.task_records) + 1, dtype=int)
+        response_ptr[1:] = np.cumsum(num_responses)
+        response_times = [t for r in self.task_records
+                          for t in r['response_times']]
+
+        np.savez_compressed(
+            filename, task=np.array(tasks, dtype=str),
+            stim=np.array(stims, dtype=str),
+            ref_answer=np.array(ref_answers, dtype=str),
+            ref_valid=np.array(valid, dtype=bool),
+            answer=np.array([''.join(r['answer'])
+                             for r in self.task_records], dtype=str),
+            start_time=np.array([r['start_time']
+                                 for r in self.task_records]),
+            response_ptr=response_ptr,
+            response_times=np.array(response_times))
+
     def reset(self):
         self.prev_t_ind = -1
+        self.stim_events = []
+        self.task_records = []
 
 experiment = SpaunExperiment()
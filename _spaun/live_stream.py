@@ -0,0 +1,177 @@
+import sys
+import json
+import threading
+from collections import deque
+from urlparse import urlparse, parse_qs
+from SocketServer import ThreadingMixIn
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+import numpy as np
+import nengo
+
+
+class ProbeRingBuffer(object):
+    # Bounded (thread-safe) buffer of downsampled probe data samples. Once
+    # full, the oldest samples are discarded. Each sample is given a sequence
+    # number so that clients can request the samples they have not yet seen.
+    def __init__(self, capacity=10000):
+        self.samples = deque(maxlen=capacity)
+        self.lock = threading.Lock()
+        self.last_seq = 0
+        self.meta = {}
+
+    def append(self, t_data, data_dict):
+        # t_data: array of sample times, data_dict: key -> array of samples
+        # (first dimension matching t_data)
+        with self.lock:
+            for i, t in enumerate(t_data):
+                self.last_seq += 1
+                sample_data = dict([(key, data_dict[key][i].tolist())
+                                    for key in data_dict])
+                self.samples.append({'seq': self.last_seq, 't': float(t),
+                                     'data': sample_data})
+
+    def get_since(self, seq=0, max_samples=None):
+        with self.lock:
+            samples = [sample for sample in self.samples
+                       if sample['seq'] > seq]
+            last_seq = self.last_seq
+        if max_samples is not None:
+            samples = samples[:max_samples]
+        return {'last_seq': last_seq, 'samples': samples}
+
+
+class LiveStreamRequestHandler(BaseHTTPRequestHandler):
+    # GET /meta: Stream information (keys, vocab labels, sample period)
+    # GET /data?since=<seq>&max=<num>: Samples newer than the given sequence
+    #                                  number
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        ring_buffer = self.server.ring_buffer
+
+        if url.path in ['/', '/meta']:
+            response = ring_buffer.meta
+        elif url.path == '/data':
+            try:
+                seq = int(query.get('since', [0])[0])
+                max_samples = query.get('max', [None])[0]
+                if max_samples is not None:
+                    max_samples = int(max_samples)
+            except ValueError:
+                self.send_error(400, 'Invalid query parameters')
+                return
+            response = ring_buffer.get_since(seq, max_samples)
+        else:
+            self.send_error(404)
+            return
+
+        response_str = json.dumps(response)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(response_str)))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(response_str)
+
+    def log_message(self, format, *args):
+        # Don't clutter the simulation output with request logs
+        pass
+
+
+class LiveStreamServer(ThreadingMixIn, HTTPServer):
+    # Local HTTP (JSON) server for the probe data ring buffer. Runs in a
+    # background (daemon) thread.
+    daemon_threads = True
+
+    def __init__(self, ring_buffer, port, host='127.0.0.1'):
+        HTTPServer.__init__(self, (host, port), LiveStreamRequestHandler)
+        self.ring_buffer = ring_buffer
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever,
+                                       name='SpaunLiveStream')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def add_stream_probes(model, vocab, dt, sample_every=0.01, synapse=0.01):
+    # Adds the (downsampled) probes to stream to the given spaun model.
+    # Vocab probes are projected onto the vocabulary in the simulation (only
+    # the similarities are streamed). Returns the dictionary of stream probes
+    # (key -> probe) and the stream meta information.
+    stream_objs = []
+    if hasattr(model, 'vis'):
+        stream_objs.append(('vis', model.vis.output, vocab.vis_main))
+    if hasattr(model, 'ps'):
+        stream_objs.append(('ps_task', model.ps.task_mb.mem1.output,
+                            vocab.ps_task))
+        stream_objs.append(('ps_state', model.ps.state_mb.mem1.output,
+                            vocab.ps_state))
+    if hasattr(model, 'mtr'):
+        stream_objs.append(('ee_loc', model.mtr.zero_centered_arm_ee_loc,
+                            None))
+        stream_objs.append(('pen_down', model.mtr.pen_down, None))
+
+    stream_probes = {}
+    meta = {'dt': dt, 'sample_every': sample_every, 'keys': [],
+            'vocab_keys': {}}
+    with model:
+        for key, obj, obj_vocab in stream_objs:
+            if obj_vocab is not None:
+                proj_node = nengo.Node(size_in=len(obj_vocab.keys),
+                                       label='Stream Probe Proj')
+                nengo.Connection(obj, proj_node,
+                                 transform=obj_vocab.vectors, synapse=None)
+                obj = proj_node
+                meta['vocab_keys'][key] = list(obj_vocab.keys)
+
+            stream_probes[key] = nengo.Probe(obj, synapse=synapse,
+                                             sample_every=sample_every)
+            meta['keys'].append(key)
+
+    return stream_probes, meta
+
+
+def run_sim_streaming(sim, runtime, stream_probes, ring_buffer,
+                      t_slice=0.1):
+    # Runs the simulation in slices of t_slice seconds. After each slice, the
+    # new stream probe samples are pushed to the ring buffer and removed from
+    # the simulator (so the stream probes don't accumulate data over long
+    # simulation runs).
+    steps = int(np.round(float(runtime) / sim.dt))
+    slice_steps = max(int(np.round(float(t_slice) / sim.dt)), 1)
+
+    # Note: All stream probes have the same sampling period
+    period = int(np.round(stream_probes.values()[0].sample_every / sim.dt))
+    sample_count = sim.n_steps // period
+
+    steps_run = 0
+    while steps_run < steps:
+        run_steps = min(slice_steps, steps - steps_run)
+        sim.run_steps(run_steps, progress_bar=False)
+        steps_run += run_steps
+
+        # Gather (and remove) the new samples
+        data_dict = {}
+        for key, probe in stream_probes.items():
+            probe_output = sim._probe_outputs[probe]
+            data_dict[key] = np.array(probe_output)
+            del probe_output[:]
+
+        num_samples = data_dict.values()[0].shape[0]
+        t_data = (np.arange(num_samples) + sample_count + 1) * period * sim.dt
+        sample_count += num_samples
+
+        if num_samples > 0:
+            ring_buffer.append(t_data, data_dict)
+
+        sys.stdout.write("\rSIM TIME: %0.3f / %0.3fs" %
+                         (steps_run * sim.dt, steps * sim.dt))
+        sys.stdout.flush()
+    print ""
@@ -0,0 +1,384 @@
+import time
+import traceback
+import multiprocessing
+
+import numpy as np
+
+import nengo
+
+from optimizer import get_conn_params, pin_seeds
+from partitioner import get_base_obj
+
+
+# ----- Process synchronization -----
+class StepBarrier(object):
+    # Reusable barrier for a fixed number of processes (multiprocessing in
+    # python 2 does not provide one). Can be aborted (e.g. when one of the
+    # processes fails), in which case all waiting processes raise a
+    # RuntimeError instead of blocking forever.
+    def __init__(self, parties):
+        self.parties = parties
+        self._cond = multiprocessing.Condition()
+        self._count = multiprocessing.RawValue('i', 0)
+        self._generation = multiprocessing.RawValue('i', 0)
+        self._aborted = multiprocessing.RawValue('b', 0)
+
+    def wait(self):
+        with self._cond:
+            if self._aborted.value:
+                raise RuntimeError('StepBarrier - Barrier aborted.')
+
+            generation = self._generation.value
+            self._count.value += 1
+            if self._count.value == self.parties:
+                self._count.value = 0
+                self._generation.value += 1
+                self._cond.notify_all()
+            else:
+                while generation == self._generation.value and \
+                        not self._aborted.value:
+                    self._cond.wait()
+
+            if self._aborted.value:
+                raise RuntimeError('StepBarrier - Barrier aborted.')
+
+    def abort(self):
+        with self._cond:
+            self._aborted.value = 1
+            self._cond.notify_all()
+
+
+class BoundaryBuffer(object):
+    # Double-buffered shared memory buffer for one connection between
+    # process groups. On timestep n, the sending process writes to slot
+    # (n % 2) and the receiving process reads the value written on the
+    # previous timestep from slot ((n - 1) % 2), so (with one barrier per
+    # timestep) reads and writes never overlap. The boundary signal is thus
+    # delayed by one timestep.
+    def __init__(self, size, dt):
+        self.size = size
+        self.dt = dt
+        self._raw = multiprocessing.RawArray('d', 2 * size)
+        self._data = None
+
+    @property
+    def data(self):
+        # Note: The numpy view is made on first use (i.e. after the fork)
+        if self._data is None:
+            self._data = np.frombuffer(self._raw).reshape(2, self.size)
+        return self._data
+
+    def get_step(self, t):
+        return int(round(t / self.dt))
+
+    def write(self, t, x):
+        self.data[self.get_step(t) % 2] = x
+
+    def read(self, t):
+        return self.data[(self.get_step(t) - 1) % 2].copy()
+
+
+# ----- Model grouping -----
+def get_probe_obj(probe):
+    # Returns the ensemble / node a probe belongs to (probes on connections
+    # belong to the connection's pre object)
+    target = getattr(probe.target, 'obj', probe.target)
+    if isinstance(target, nengo.Connection):
+        target = target.pre_obj
+    return get_base_obj(target)
+
+
+def get_obj_groups(model, module_groups):
+    # Returns the dictionary of ensemble / node -> process group index.
+    # module_groups is a list of lists of the (top-level) spaun module names
+    # in each child process group (group indices start at 1). Everything
+    # else is put in group 0 (the main process), except for passthrough
+    # nodes whose inputs are all in one other group (e.g. vocab projection
+    # probe nodes), which are put in that group.
+    obj_groups = {}
+    for obj in model.all_ensembles + model.all_nodes:
+        obj_groups[obj] = 0
+
+    for group, module_names in enumerate(module_groups):
+        for module_name in module_names:
+            module = getattr(model, module_name, None)
+            if module is None:
+                continue
+            for obj in module.all_ensembles + module.all_nodes:
+                obj_groups[obj] = group + 1
+
+    node_inputs = {}
+    for conn in model.all_connections:
+        node_inputs.setdefault(conn.post_obj, []).append(conn)
+
+    changed = True
+    while changed:
+        changed = False
+        for node in model.all_nodes:
+            if node.output is not None or obj_groups[node] != 0 or \
+               node not in node_inputs:
+                continue
+            input_groups = set([obj_groups[get_base_obj(conn.pre_obj)]
+                                for conn in node_inputs[node]])
+            if len(input_groups) == 1 and 0 not in input_groups:
+                obj_groups[node] = input_groups.pop()
+                changed = True
+    return obj_groups
+
+
+def get_boundary_conns(model, obj_groups, dt):
+    # Returns the list of (connection, pre group, post group, buffer) for
+    # all connections between process groups
+    probed_conns = set([getattr(probe.target, 'obj', probe.target)
+                        for probe in model.all_probes])
+
+    boundary_conns = []
+    for conn in model.all_connections:
+        pre_group = obj_groups[get_base_obj(conn.pre_obj)]
+        post_group = obj_groups[get_base_obj(conn.post_obj)]
+        if pre_group == post_group:
+            continue
+
+        if conn.learning_rule_type is not None or conn in probed_conns or \
+           (isinstance(conn.pre_obj, nengo.Ensemble) and
+                conn.solver.weights):
+            raise ValueError('Learned, probed, and weight-solver ' +
+                             'connections cannot be split between process ' +
+                             'groups. (Connection: %s)' % conn)
+        boundary_conns.append((conn, pre_group, post_group,
+                               BoundaryBuffer(conn.size_out, dt)))
+    return boundary_conns
+
+
+def save_model_objects(model):
+    # Returns a copy of the object lists of every network in the model
+    return dict([(net, dict([(obj_type, list(objs))
+                             for obj_type, objs in net.objects.items()]))
+                 for net in [model] + model.all_networks])
+
+
+def restore_model_objects(saved_objects):
+    for net, objects in saved_objects.items():
+        for obj_type, objs in objects.items():
+            net.objects[obj_type][:] = objs
+
+
+def make_group_model(model, obj_groups, boundary_conns, group):
+    # Modifies the model (in place) so that it only contains the objects of
+    # the given process group. Boundary connections are replaced with
+    # connections to / from nodes that write to / read from the shared
+    # memory buffers. The decoders (and transform) are computed on the
+    # sending side; the synapse is applied on the receiving side.
+    boundary_conns = dict([(conn, (pre_group, post_group, buf))
+                           for conn, pre_group, post_group, buf
+                           in boundary_conns])
+
+    for net in [model] + model.all_networks:
+        net.objects[nengo.Ensemble][:] = \
+            [ens for ens in net.ensembles if obj_groups[ens] == group]
+        net.objects[nengo.Node][:] = \
+            [node for node in net.nodes if obj_groups[node] == group]
+        net.objects[nengo.Probe][:] = \
+            [probe for probe in net.probes
+             if obj_groups[get_probe_obj(probe)] == group]
+
+        conns = []
+        for conn in net.connections:
+            if conn not in boundary_conns:
+                if obj_groups[get_base_obj(conn.pre_obj)] == group:
+                    conns.append(conn)
+                continue
+
+            pre_group, post_group, buf = boundary_conns[conn]
+            if pre_group == group:
+                send_node = nengo.Node(output=buf.write,
+                                       size_in=conn.size_out,
+                                       label='MP Send', add_to_container=False)
+                conn_params = get_conn_params(conn)
+                conn_params['synapse'] = None
+                conns.append(nengo.Connection(
+                    conn.pre, send_node, transform=conn.transform,
+                    add_to_container=False, **conn_params))
+                net.objects[nengo.Node].append(send_node)
+            elif post_group == group:
+                recv_node = nengo.Node(output=buf.read,
+                                       size_out=conn.size_out,
+                                       label='MP Recv', add_to_container=False)
+                conns.append(nengo.Connection(
+                    recv_node, conn.post, synapse=conn.synapse,
+                    add_to_container=False))
+                net.objects[nengo.Node].append(recv_node)
+        net.objects[nengo.Connection][:] = conns
+
+
+def build_group_sim(model, obj_groups, boundary_conns, group, dt):
+    # Builds the simulator for the given process group (the model objects
+    # are restored once the model is built)
+    saved_objects = save_model_objects(model)
+    try:
+        make_group_model(model, obj_groups, boundary_conns, group)
+        sim = nengo.Simulator(model, dt=dt)
+    finally:
+        restore_model_objects(saved_objects)
+    return sim
+
+
+def run_group_process(model, obj_groups, boundary_conns, group, dt,
+                      barrier, pipe):
+    # Main function of the child processes. Builds the group's simulator,
+    # then runs commands ('run', n_steps), ('data',), ('close',) sent by the
+    # main process through the pipe.
+    try:
+        timestamp = time.time()
+        sim = build_group_sim(model, obj_groups, boundary_conns, group, dt)
+        probes = [probe for probe in model.all_probes
+                  if obj_groups[get_probe_obj(probe)] == group]
+        probe_inds = dict([(probe, i)
+                           for i, probe in enumerate(model.all_probes)])
+        pipe.send(('built', time.time() - timestamp))
+
+        while True:
+            command = pipe.recv()
+            if command[0] == 'run':
+                for _ in range(command[1]):
+                    sim.step()
+                    barrier.wait()
+                pipe.send(('done',))
+            elif command[0] == 'data':
+                pipe.send(('data', dict([(probe_inds[probe], sim.data[probe])
+                                         for probe in probes])))
+            elif command[0] == 'close':
+                sim.close()
+                break
+    except Exception:
+        barrier.abort()
+        pipe.send(('error', traceback.format_exc()))
+
+
+# ----- Local multi-process simulator -----
+class LocalMPSimulator(object):
+    # Simulator that runs groups of spaun modules in separate (forked)
+    # processes on the local machine. Each process builds and steps its own
+    # nengo.Simulator for its group of modules, and the signals of the
+    # connections between groups are exchanged every timestep through
+    # shared memory buffers (with a one timestep delay, see BoundaryBuffer).
+    # Objects not in any module group (e.g. the stimulus and monitor
+    # modules, whose python functions update the experimenter state) are
+    # simulated in the main process.
+    # Note: Requires the 'fork' process start method (i.e. not Windows).
+    def __init__(self, model, dt=0.001, module_groups=None):
+        if module_groups is None:
+            module_groups = []
+
+        self.dt = dt
+        self.probes = model.all_probes
+        self.t_child_build = []
+        self._data = None
+
+        # Fix the object seeds so that every process builds its objects
+        # exactly as they would be built in the full model
+        pin_seeds(model)
+
+        obj_groups = get_obj_groups(model, module_groups)
+        boundary_conns = get_boundary_conns(model, obj_groups, dt)
+        groups = sorted(set(obj_groups.values()) - set([0]))
+
+        self.n_boundary_conns = len(boundary_conns)
+        self.n_boundary_values = sum([conn.size_out for conn, _, _, _
+                                      in boundary_conns])
+
+        self.barrier = StepBarrier(len(groups) + 1)
+        self.pipes = []
+        self.processes = []
+        for group in groups:
+            parent_pipe, child_pipe = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=run_group_process,
+                args=(model, obj_groups, boundary_conns, group, dt,
+                      self.barrier, child_pipe))
+            process.daemon = True
+            process.start()
+            self.pipes.append(parent_pipe)
+            self.processes.append(process)
+
+        try:
+            self.sim = build_group_sim(model, obj_groups, boundary_conns, 0,
+                                       dt)
+        except Exception:
+            self.close()
+            raise
+        self.t_child_build = [self._recv(pipe)[1] for pipe in self.pipes]
+
+    @property
+    def model(self):
+        # Note: This is the built model of the main process group only
+        return self.sim.model
+
+    @property
+    def n_steps(self):
+        return self.sim.n_steps
+
+    @property
+    def time(self):
+        return self.sim.time
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = dict([(probe, self.sim.data[probe])
+                               for probe in self.probes
+                               if probe in self.sim.data])
+            for pipe in self.pipes:
+                pipe.send(('data',))
+                for ind, data in self._recv(pipe)[1].items():
+                    self._data[self.probes[ind]] = data
+        return self._data
+
+    def _recv(self, pipe):
+        msg = pipe.recv()
+        if msg[0] == 'error':
+            self.close()
+            raise RuntimeError('LocalMPSimulator - Error in child ' +
+                               'process:\n%s' % msg[1])
+        return msg
+
+    def trange(self, dt=None):
+        return self.sim.trange(dt)
+
+    def step(self):
+        self.run_steps(1)
+
+    def run(self, time_in_seconds):
+        self.run_steps(int(np.round(float(time_in_seconds) / self.dt)))
+
+    def run_steps(self, steps):
+        self._data = None
+        for pipe in self.pipes:
+            pipe.send(('run', steps))
+        try:
+            for _ in range(steps):
+                self.sim.step()
+                self.barrier.wait()
+        except Exception:
+            self.barrier.abort()
+            for pipe in self.pipes:
+                if pipe.poll():
+                    self._recv(pipe)
+            raise
+        for pipe in self.pipes:
+            self._recv(pipe)
+
+    def close(self):
+        for pipe, process in zip(self.pipes, self.processes):
+            if process.is_alive():
+                try:
+                    pipe.send(('close',))
+                except IOError:
+                    pass
+                process.join(1.0)
+            if process.is_alive():
+                process.terminate()
+        self.pipes = []
+        self.processes = []
+        if hasattr(self, 'sim'):
+            self.sim.close()
@@ -1,4 +1,9 @@
 import os
+import json
+import atexit
+import signal
+import threading
+from collections import deque
 from datetime import datetime
 
 
@@ -7,8 +12,25 @@ class SpaunLogger(object):
         self.data_dir = ''
         self.log_filename = ''
         self.data_obj = None
+        self.json_obj = None
 
-    def initialize(self, data_dir='', log_filename='log.txt'):
+        # Writes are queued and written to file in batches by a background
+        # writer thread (so that writes made in the simulation loop are cheap)
+        self.flush_interval = 0.5
+        self.max_batch_size = 4096
+
+        self.pid = None
+        self.write_queue = deque()
+        self.json_queue = deque()
+        self.writer_thread = None
+        self.writer_event = threading.Event()
+        self.writer_lock = threading.Lock()
+        self.writer_stop = False
+
+        self.handlers_installed = False
+        self.prev_sigterm_handler = None
+
+    def initialize(self, data_dir='', log_filename='log.txt', jsonl=False):
         self.data_dir = data_dir
         self.log_filename = log_filename
 
@@ -16,28 +38,145 @@ class SpaunLogger(object):
             os.path.join(self.data_dir, self.log_filename)
         self.data_obj = open(self.data_filename, 'a')
 
+        # Optional structured (one JSON record per line) log channel
+        if jsonl:
+            self.json_filename = \
+                os.path.splitext(self.data_filename)[0] + '.jsonl'
+            self.json_obj = open(self.json_filename, 'a')
+        else:
+            self.json_filename = None
+            self.json_obj = None
+
+        self.start_writer()
+        self.install_handlers()
+
         self.write_header()
 
+    def start_writer(self):
+        self.pid = os.getpid()
+        self.write_queue = deque()
+        self.json_queue = deque()
+        self.writer_event = threading.Event()
+        self.writer_lock = threading.Lock()
+        self.writer_stop = False
+
+        self.writer_thread = threading.Thread(target=self.writer_loop,
+                                              name='SpaunLoggerWriter')
+        self.writer_thread.daemon = True
+        self.writer_thread.start()
+
+    def install_handlers(self):
+        if self.handlers_installed:
+            return
+
+        atexit.register(self.close)
+
+        # Signal handlers can only be installed from the main thread
+        if threading.current_thread().name == 'MainThread':
+            self.prev_sigterm_handler = signal.getsignal(signal.SIGTERM)
+            signal.signal(signal.SIGTERM, self.sigterm_handler)
+        self.handlers_installed = True
+
+    def sigterm_handler(self, signum, frame):
+        self.close()
+
+        prev_handler = self.prev_sigterm_handler
+        if callable(prev_handler):
+            prev_handler(signum, frame)
+        elif prev_handler != signal.SIG_IGN:
+            raise SystemExit(128 + signum)
+
+    def check_pid(self):
+        # Forked worker processes inherit the queues, but not the writer
+        # thread. Discard the records queued by the parent process (the
+        # parent will write those out) and start a new writer for this
+        # process.
+        if self.pid != os.getpid() and self.data_obj is not None and \
+           not self.data_obj.closed:
+            self.data_obj = open(self.data_filename, 'a')
+            if self.json_obj is not None:
+                self.json_obj = open(self.json_filename, 'a')
+            self.start_writer()
+
+    def writer_loop(self):
+        while not self.writer_stop:
+            self.writer_event.wait(self.flush_interval)
+            self.writer_event.clear()
+            self.write_batches()
+
+    def write_batches(self):
+        with self.writer_lock:
+            for queue, file_obj in [(self.write_queue, self.data_obj),
+                                    (self.json_queue, self.json_obj)]:
+                if len(queue) == 0:
+                    continue
+                while len(queue) > 0:
+                    batch = []
+                    while len(queue) > 0 and \
+                       len(batch) < self.max_batch_size:
+                        batch.append(queue.popleft())
+                    file_obj.write(''.join(batch))
+                file_obj.flush()
+
     def write_header(self):
-        self.data_obj.write('# Spaun Simulation Properties:\n')
-        self.data_obj.write('# - Run datetime: %s\n' % datetime.now())
-        self.data_obj.write('#\n')
+        self.write('# Spaun Simulation Properties:\n')
+        self.write('# - Run datetime: %s\n' % datetime.now())
+        self.write('#\n')
 
     def write(self, str):
         if self.data_obj is not None:
-           orig_closed_state = self.data_obj.closed
-           if orig_closed_state:
-               self.data_obj = open(self.data_filename, 'a')
-   
-           self.data_obj.write(str)
-   
-           if orig_closed_state:
-               self.data_obj.close()
-
-    def flush(self):
-        self.data_obj.flush()
+            if self.data_obj.closed:
+                # Logger has been closed. Write directly to file.
+                with open(self.data_filename, 'a') as data_obj:
+                    data_obj.write(str)
+                return
+
+            self.check_pid()
+            self.write_queue.append(str)
+
+    def write_record(self, record_type, **fields):
+        # Writes a structured record to the JSONL log channel (if enabled)
+        if self.json_obj is None:
+            return
+
+        record = dict(fields, type=record_type)
+        if self.json_obj.closed:
+            with open(self.json_filename, 'a') as json_obj:
+                json_obj.write(json.dumps(record) + '\n')
+            return
+
+        self.check_pid()
+        self.json_queue.append(json.dumps(record) + '\n')
+
+    def flush(self, block=False):
+        # Signals the writer thread to write out the queued records. If block
+        # is True, the queued records are written out before returning.
+        if self.data_obj is None or self.data_obj.closed:
+            return
+
+        self.check_pid()
+        if block:
+            self.write_batches()
+        else:
+            self.writer_event.set()
 
     def close(self):
+        if self.data_obj is None or self.data_obj.closed:
+            return
+
+        # Records queued in a forked process that has not written anything
+        # itself belong to the parent process, and are not written out here.
+        if self.pid == os.getpid():
+            self.writer_stop = True
+            self.writer_event.set()
+            if self.writer_thread is not None and \
+               self.writer_thread.is_alive():
+                self.writer_thread.join()
+            self.write_batches()
+        self.writer_thread = None
+
         self.data_obj.close()
+        if self.json_obj is not None:
+            self.json_obj.close()
 
 logger = SpaunLogger()
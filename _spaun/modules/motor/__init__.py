@@ -1,2 +1,3 @@
 from .osc_neurons import OSControllerNengo as OSController
+from .osc_neurons import arm_state_slices
 from .sig_ramp_net import Ramp_Signal_Network
@@ -22,6 +22,12 @@ import nengo
 import controller
 
 
+# Slices of the arm state bus vector (see OSControllerNengo.get_arm_state)
+arm_state_slices = {'q': slice(0, 3), 'dq': slice(3, 6), 'x': slice(6, 8),
+                    'px': slice(8, 12), 'py': slice(12, 16)}
+arm_state_size = 16
+
+
 class OSControllerNengo(controller.Control):
     """
     A controller that implements operational space control.
@@ -54,7 +60,13 @@ class OSControllerNengo(controller.Control):
         return self.target
 
     def get_arm_state(self, t):
-        self.arm_state = np.hstack([self.arm.q, self.arm.dq, self.arm.x])
+        # Arm state bus: [q (3), dq (3), ee x, ee y, joint x positions (4),
+        # joint y positions (4)]. The forward kinematics are computed once
+        # per timestep, and every consumer of the arm state slices this
+        # vector (see arm_state_slices).
+        px, py = self.arm.position()
+        self.arm_state = np.hstack([self.arm.q, self.arm.dq, px[-1], py[-1],
+                                    px, py])
         return self.arm_state
 
     def initialize_model(self):
@@ -76,7 +88,9 @@ class OSControllerNengo(controller.Control):
             # model.config[nengo.Ensemble].neuron_type = nengo.Direct()
 
             # create input nodes
-            arm_node = nengo.Node(self.get_arm_state, size_out=8)
+            arm_node = nengo.Node(self.get_arm_state,
+                                  size_out=arm_state_size, label='Arm State')
+            model.arm_state = arm_node
 
             # def get_target(t):
             #     return model.target
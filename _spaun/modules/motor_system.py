@@ -10,7 +10,7 @@ from nengo.utils.network import with_self
 from .._networks import DifferenceFunctionEvaluator as DiffFuncEvaltr
 from ..configurator import cfg
 from ..vocabulator import vocab
-from .motor import OSController, Ramp_Signal_Network
+from .motor import OSController, Ramp_Signal_Network, arm_state_slices
 from .motor.data import mtr_data
 
 
@@ -119,12 +119,19 @@ class MotorSystem(Module):
             # ## Note: osc_net already has an internal node that gets info
             #          from arm_obj (i.e. state information). So an external
             #          connection is not required
-
-            zero_centered_arm_ee_loc = \
-                nengo.Node(output=lambda t,
-                           bias=np.array([cfg.mtr_arm_rest_x_bias,
-                                          cfg.mtr_arm_rest_y_bias]):
-                           arm_obj.x - bias, label='Centered Arm EE')
+            # ## Note: All of the arm information used outside of the osc_net
+            #          is sliced from the osc_net's arm state node (so that
+            #          the arm is only queried once per timestep)
+            arm_state = osc_net.arm_state
+
+            zero_centered_arm_ee_loc = nengo.Node(size_in=2,
+                                                  label='Centered Arm EE')
+            nengo.Connection(arm_state[arm_state_slices['x']],
+                             zero_centered_arm_ee_loc, synapse=None)
+            nengo.Connection(bias_node, zero_centered_arm_ee_loc,
+                             transform=[[-cfg.mtr_arm_rest_x_bias],
+                                        [-cfg.mtr_arm_rest_y_bias]],
+                             synapse=None)
 
         # ------ MOTOR ARM CONTROL SIGNAL FEEDBACK ------
         # X to target norm calculation
@@ -203,10 +210,12 @@ class MotorSystem(Module):
 
         # Arm segments joint locations
         if arm_obj is not None:
-            self.arm_px_node = \
-                nengo.Node(output=lambda t: arm_obj.position()[0])
-            self.arm_py_node = \
-                nengo.Node(output=lambda t: arm_obj.position()[1])
+            self.arm_px_node = nengo.Node(size_in=arm_obj.DOF + 1)
+            self.arm_py_node = nengo.Node(size_in=arm_obj.DOF + 1)
+            nengo.Connection(arm_state[arm_state_slices['px']],
+                             self.arm_px_node, synapse=None)
+            nengo.Connection(arm_state[arm_state_slices['py']],
+                             self.arm_py_node, synapse=None)
         else:
             self.arm_px_node = nengo.Node(0)
             self.arm_py_node = nengo.Node(0)
@@ -215,6 +224,10 @@ class MotorSystem(Module):
         if arm_obj is not None:
             self.zero_centered_arm_ee_loc = zero_centered_arm_ee_loc
 
+        # Arm state bus (see OSControllerNengo.get_arm_state)
+        if arm_obj is not None:
+            self.arm_state = arm_state
+
         # Target ee zero_centered location
         self.zero_centered_tgt_ee_loc = func_eval_net.func_output
 
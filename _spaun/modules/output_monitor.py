@@ -8,6 +8,7 @@ from nengo.utils.network import with_self
 from ..configurator import cfg
 from ..vocabulator import vocab
 from ..experimenter import experiment
+from ..multirate import MultiRateFunc
 
 
 class SpaunOutputMonitor(Module):
@@ -24,8 +25,13 @@ class SpaunOutputMonitor(Module):
         if cfg.use_mpi:
             raise RuntimeError('Not Implemented')
         else:
+            monitor_func = self.monitor_node_func
+            if cfg.multirate_nodes:
+                monitor_func = MultiRateFunc(self.monitor_node_func,
+                                             cfg.sim_dt,
+                                             period=cfg.mon_update_period)
             self.output = \
-                nengo.Node(output=self.monitor_node_func,
+                nengo.Node(output=monitor_func,
                            size_in=len(vocab.mtr.keys) + 3,
                            label='Experiment monitor')
 
@@ -7,6 +7,7 @@ from nengo.utils.network import with_self
 from ..configurator import cfg
 from ..vocabulator import vocab
 from ..experimenter import experiment
+from ..multirate import MultiRateFunc
 from .vision.data import vis_data
 
 
@@ -25,7 +26,10 @@ def get_vocab(label=None):
 
 
 def stim_func_vis(t):
-    return get_image(experiment.get_stimulus(t))[0]
+    stim_token = experiment.get_stimulus(t)
+    img, img_ind = get_image(stim_token)
+    experiment.record_stim_event(t, stim_token, img_ind)
+    return img
 
 
 def stim_func_vocab(t):
@@ -48,7 +52,11 @@ class SpaunStimulus(Module):
                                         experiment.present_interval,
                                         experiment.present_blanks)
         else:
-            self.output = nengo.Node(output=stim_func_vis,
+            stim_func = stim_func_vis
+            if cfg.multirate_nodes:
+                stim_func = MultiRateFunc(stim_func_vis, cfg.sim_dt,
+                                          trigger=experiment.get_stim_key)
+            self.output = nengo.Node(output=stim_func,
                                      label='Stim Module Out')
 
         # Define vocabulary inputs and outputs
@@ -85,10 +85,12 @@ class WorkingMemory(Module):
         self.input = self.mem_in
 
         # ----- Set up module vocab inputs and outputs -----
-        self.outputs = dict(mb1=(self.mb1, vocab.enum),
-                            mb2=(self.mb2, vocab.enum),
-                            mb3=(self.mb3, vocab.enum),
-                            mbave=(self.mbave, vocab.enum))
+        # Note: The enumerated (position * item) debug vocabulary is only
+        #       used by the probes, so it is not built for every model
+        self.outputs = dict(mb1=(self.mb1, vocab.main),
+                            mb2=(self.mb2, vocab.main),
+                            mb3=(self.mb3, vocab.main),
+                            mbave=(self.mbave, vocab.main))
 
     def setup_connections(self, parent_net):
         p_net = parent_net
@@ -0,0 +1,65 @@
+import numpy as np
+
+
+class MultiRateFunc(object):
+    # Node output function wrapper for slow python nodes. The wrapped function
+    # is only called when an update is due (and the cached output is returned
+    # otherwise). Updates are due:
+    #   - every `period` seconds (rounded to a whole number of timesteps), or
+    #   - when the value of trigger(t) changes (for functions whose output
+    #     only changes at known times, e.g. the stimulus), or
+    #   - every timestep if neither a period nor a trigger is given.
+    # Note: Calls for t <= 0 (i.e. nengo's node output checks) are passed
+    #       through without being cached. The update schedule is restarted
+    #       when the time goes backwards (i.e. a new simulator run).
+    def __init__(self, func, dt, period=None, trigger=None):
+        self.func = func
+        self.dt = dt
+        self.period = period
+        self.trigger = trigger
+
+        if period is not None:
+            self.period_steps = max(int(np.round(period / dt)), 1)
+        else:
+            self.period_steps = 1
+
+        self.reset()
+
+    def reset(self):
+        self.output = None
+        self.last_step = 0
+        self.next_step = 0
+        self.trigger_key = None
+
+    def update_due(self, t):
+        step = int(np.round(t / self.dt))
+        if step < self.last_step:
+            self.reset()
+        self.last_step = step
+
+        if self.trigger is not None:
+            trigger_key = self.trigger(t)
+            if self.next_step > 0 and trigger_key == self.trigger_key:
+                return False
+            self.trigger_key = trigger_key
+        elif step < self.next_step:
+            return False
+
+        self.next_step = step + self.period_steps
+        return True
+
+    def __call__(self, t, *args):
+        if t <= 0:
+            return self.func(t, *args)
+        if self.update_due(t):
+            self.output = self.func(t, *args)
+        return self.output
+
+
+def get_node_update_period(node):
+    # Returns the declared update period (a whole number of timesteps) of a
+    # node (None if the node is not a periodic multi-rate node)
+    output = getattr(node, 'output', None)
+    if isinstance(output, MultiRateFunc) and output.period is not None:
+        return output.period_steps * output.dt
+    return None
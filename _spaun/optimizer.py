@@ -0,0 +1,312 @@
+import numpy as np
+
+import nengo
+from nengo.dists import Distribution
+from nengo.utils import numpy as npext
+from nengo.utils.builder import full_transform
+
+
+# ----- Helper functions -----
+def get_probe_targets(model):
+    targets = set()
+    for probe in model.all_probes:
+        targets.add(probe.target)
+        targets.add(getattr(probe.target, 'obj', probe.target))
+    return targets
+
+
+def get_conn_params(conn):
+    # Returns the keyword arguments needed to recreate the given connection
+    # (with a different pre / post / transform)
+    return dict(synapse=conn.synapse, function=conn.function,
+                solver=conn.solver, eval_points=conn.eval_points,
+                scale_eval_points=conn.scale_eval_points,
+                seed=conn.seed, label=conn.label)
+
+
+def replace_conn(net, conn, new_conn):
+    # Swaps the connection in the network's connection list (in place, so
+    # that the build order, and hence the seeding, of the other objects in
+    # the network is unchanged)
+    conns = net.objects[nengo.Connection]
+    conns[conns.index(conn)] = new_conn
+
+
+def full_slice_inds(obj_view, size):
+    # Returns the list of indices selected by the (pre / post) slice
+    return list(np.arange(size)[obj_view])
+
+
+def make_obj_view(obj, inds, size):
+    # Returns the (sliced) view of obj for the given list of indices. Uses
+    # basic slices where possible (avoids the fancy-indexed copies)
+    if len(inds) == size and np.all(np.diff(inds) == 1) and \
+       (size == 0 or inds[0] == 0):
+        return obj
+    if len(inds) > 0 and np.all(np.diff(inds) == 1):
+        return obj[inds[0]:inds[-1] + 1]
+    return obj[list(inds)]
+
+
+def get_conn_owners(model):
+    # Returns a dictionary mapping each connection to the network that
+    # contains it
+    owners = {}
+    for net in [model] + model.all_networks:
+        for conn in net.connections:
+            owners[conn] = net
+    return owners
+
+
+def get_conn_cost(conn):
+    # Approximate number of multiply-adds needed to compute the connection
+    # each timestep (decoded connections have transform * decoders weights)
+    if isinstance(conn.pre_obj, nengo.Ensemble) and \
+       not isinstance(conn.pre_obj.neuron_type, nengo.Direct):
+        return conn.size_out * conn.pre_obj.n_neurons
+    if conn.transform.ndim < 2:
+        return conn.size_out
+    return conn.transform.size
+
+
+def pin_seeds(model):
+    # Explicitly sets the seed of every object to the seed nengo would have
+    # assigned it. Nengo assigns seeds to a network's objects sequentially
+    # (connections first), so without this, adding or removing connections
+    # would change the seeds (e.g. encoders) of every ensemble in the network.
+    if model.seed is None:
+        return
+
+    def assign_seeds(net):
+        rng = np.random.RandomState(net.seed)
+        for obj_type in sorted(net.objects, key=lambda t: t.__name__):
+            for obj in net.objects[obj_type]:
+                seed = rng.randint(npext.maxint)
+                if obj.seed is None:
+                    obj.seed = seed
+                if isinstance(obj, nengo.Network):
+                    assign_seeds(obj)
+    assign_seeds(model)
+
+
+# ----- Transform classification -----
+def classify_transform(transform, tol=0.0):
+    # Identifies the structure of a dense (2D) transform matrix. Returns a
+    # tuple of (kind, params), where kind is one of:
+    #   'scalar'      - c * I                 params: c
+    #   'diagonal'    - diag(d)               params: d
+    #   'permutation' - (scaled) permutation  params: (inds, scales), where
+    #                   row inds[j] of the matrix has its only non-zero
+    #                   element (scales[j]) in column j
+    # or (None, None) if the transform has none of these structures.
+    size_out, size_in = transform.shape
+    nonzero = np.abs(transform) > tol
+
+    if size_in != size_out:
+        return None, None
+
+    diag = np.diag(transform)
+    if np.sum(nonzero) == np.sum(nonzero.diagonal()):
+        if np.all(diag == diag[0]):
+            return 'scalar', diag[0]
+        return 'diagonal', diag
+
+    if np.all(np.sum(nonzero, axis=0) == 1) and \
+       np.all(np.sum(nonzero, axis=1) == 1):
+        inds = np.argmax(nonzero, axis=0)
+        scales = transform[inds, np.arange(size_in)]
+        return 'permutation', (inds, scales)
+
+    return None, None
+
+
+# ----- Transform compression pass -----
+def compress_transforms(model, min_size=2):
+    # Rewrites connections with dense transforms that are really simple
+    # structures, so that the dense matrices are never built (and the
+    # per-step matrix-vector products are replaced with elementwise
+    # operations):
+    #   - Identity / scaled identity transforms -> scalar transforms
+    #   - Diagonal transforms -> elementwise (1D) transforms
+    #   - Permutation transforms (e.g. invol_matrix) -> post-sliced
+    #     connections with elementwise transforms
+    # Note: Broadcast (N x 1) transforms are not rewritten. A pre-sliced
+    #       connection with a repeated index list is built (by nengo 2.3)
+    #       as an extra signal plus a per-step copy, which costs more than
+    #       the N x 1 matrix-vector product.
+    # Learned, probed, and weight-solver connections are left untouched.
+    # Returns a dictionary of rewrite counts for each transform kind (and
+    # the number of dense transform elements removed).
+    probe_targets = get_probe_targets(model)
+    counts = {'scalar': 0, 'diagonal': 0, 'permutation': 0,
+              'dense_elements': 0}
+
+    for net in [model] + model.all_networks:
+        for conn in list(net.connections):
+            transform = conn.transform
+            if isinstance(transform, Distribution) or \
+               transform.ndim != 2 or max(transform.shape) < min_size:
+                continue
+            if conn.learning_rule_type is not None or \
+               conn in probe_targets or \
+               (isinstance(conn.pre_obj, nengo.Ensemble) and
+                    conn.solver.weights):
+                continue
+
+            kind, params = classify_transform(transform)
+            if kind == 'scalar':
+                conn.transform = params
+            elif kind == 'diagonal':
+                conn.transform = params
+            elif kind == 'permutation':
+                # Input element j is sent to output element inds[j]
+                inds, scales = params
+                post_inds = full_slice_inds(conn.post_slice,
+                                            conn.post_obj.size_in)
+                new_conn = nengo.Connection(
+                    conn.pre, conn.post_obj[[post_inds[i] for i in inds]],
+                    transform=(scales[0] if np.all(scales == scales[0])
+                               else scales),
+                    add_to_container=False, **get_conn_params(conn))
+                replace_conn(net, conn, new_conn)
+            else:
+                continue
+
+            counts[kind] += 1
+            counts['dense_elements'] += transform.size
+    return counts
+
+
+# ----- Passthrough node elimination pass -----
+def merge_conns(c_in, c_out):
+    # Creates the connection equivalent to c_in -> (passthrough node) ->
+    # c_out. Returns None if the combined transform is zero. The combined
+    # transform is compressed (to a scalar / elementwise transform with a
+    # sliced post object) where possible.
+    if c_in.synapse is None:
+        synapse = c_out.synapse
+    else:
+        synapse = c_in.synapse
+
+    transform = np.dot(
+        full_transform(c_out, slice_post=False, allow_scalars=False),
+        full_transform(c_in, slice_pre=False, allow_scalars=False))
+
+    # Only the non-zero rows (and columns, if there is no function computed
+    # on the pre slice) of the combined transform need to be connected
+    nonzero_rows = np.where(np.any(transform != 0, axis=1))[0]
+    if len(nonzero_rows) == 0:
+        return None
+    if c_in.function is None:
+        nonzero_cols = np.where(np.any(transform != 0, axis=0))[0]
+    else:
+        nonzero_cols = np.arange(transform.shape[1])
+
+    kind = None
+    if len(nonzero_rows) == len(nonzero_cols):
+        kind, params = classify_transform(
+            transform[np.ix_(nonzero_rows, nonzero_cols)])
+
+    pre = c_in.pre
+    post = c_out.post
+    if kind in ['scalar', 'diagonal', 'permutation']:
+        post_inds = np.array(full_slice_inds(
+            c_out.post_slice, c_out.post_obj.size_in))[nonzero_rows]
+        if kind == 'permutation':
+            inds, transform = params
+            post_inds = post_inds[inds]
+        else:
+            transform = params
+        if np.all(transform == np.ravel(transform)[0]):
+            transform = np.ravel(transform)[0]
+
+        post = make_obj_view(c_out.post_obj, post_inds,
+                             c_out.post_obj.size_in)
+        if c_in.function is None:
+            pre_inds = np.array(full_slice_inds(
+                c_in.pre_slice, c_in.pre_obj.size_out))[nonzero_cols]
+            pre = make_obj_view(c_in.pre_obj, pre_inds,
+                                c_in.pre_obj.size_out)
+
+    conn_params = get_conn_params(c_in)
+    conn_params['synapse'] = synapse
+    return nengo.Connection(pre, post, transform=transform,
+                            add_to_container=False, **conn_params)
+
+
+def can_merge(c_in, c_out):
+    # At most one of the filters can be non-None (two filters in series can't
+    # be combined into one), and the output connections can't compute
+    # functions
+    return (c_in.synapse is None or c_out.synapse is None) and \
+        c_out.function is None
+
+
+def remove_passthrough_nodes(model):
+    # Merges chains of passthrough nodes (nengo.Node(size_in=...) relays)
+    # into direct connections. A node is removed only if:
+    #   - it is not probed (and its connections are not probed or learned)
+    #   - every input / output connection pair can be merged (see can_merge)
+    #   - the merged connections are cheaper (see get_conn_cost) than the
+    #     connections to and from the node (e.g. a decoded connection to a
+    #     node that projects to many neurons is not merged)
+    # The merged connections are added to the network containing the
+    # output connection. Object seeds are pinned first (see pin_seeds).
+    # Returns the number of nodes removed.
+    probe_targets = get_probe_targets(model)
+    owners = get_conn_owners(model)
+
+    inputs = {}
+    outputs = {}
+    for conn in owners:
+        inputs.setdefault(conn.post_obj, []).append(conn)
+        outputs.setdefault(conn.pre_obj, []).append(conn)
+
+    pin_seeds(model)
+
+    num_removed = 0
+    for net in [model] + model.all_networks:
+        for node in list(net.nodes):
+            if node.output is not None or node in probe_targets:
+                continue
+
+            node_inputs = inputs.get(node, [])
+            node_outputs = outputs.get(node, [])
+            node_conns = node_inputs + node_outputs
+            if any([conn in probe_targets or
+                    conn.learning_rule_type is not None or
+                    not isinstance(conn.post_obj, (nengo.Node,
+                                                   nengo.Ensemble,
+                                                   nengo.ensemble.Neurons)) or
+                    conn.pre_obj is conn.post_obj
+                    for conn in node_conns]):
+                continue
+            if not all([can_merge(c_in, c_out) for c_in in node_inputs
+                        for c_out in node_outputs]):
+                continue
+
+            new_conns = []
+            for c_in in node_inputs:
+                for c_out in node_outputs:
+                    new_conn = merge_conns(c_in, c_out)
+                    if new_conn is not None:
+                        new_conns.append((new_conn, owners[c_out]))
+
+            if sum([get_conn_cost(conn) for conn, _ in new_conns]) > \
+               sum([get_conn_cost(conn) for conn in node_conns]):
+                continue
+
+            # Replace the node and its connections with the merged
+            # connections
+            net.objects[nengo.Node].remove(node)
+            for conn in node_conns:
+                owners.pop(conn).objects[nengo.Connection].remove(conn)
+                outputs[conn.pre_obj].remove(conn)
+                inputs[conn.post_obj].remove(conn)
+            for conn, owner in new_conns:
+                owner.objects[nengo.Connection].append(conn)
+                owners[conn] = owner
+                inputs.setdefault(conn.post_obj, []).append(conn)
+                outputs.setdefault(conn.pre_obj, []).append(conn)
+            num_removed += 1
+    return num_removed
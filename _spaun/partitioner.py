@@ -0,0 +1,264 @@
+import numpy as np
+
+import nengo
+from nengo.ensemble import Neurons
+
+from optimizer import get_conn_cost
+
+
+# ----- Cost model -----
+def get_obj_cost(obj):
+    # Approximate number of operations needed to simulate the object each
+    # timestep (neuron updates and encoding for ensembles, copies for nodes)
+    if isinstance(obj, nengo.Ensemble):
+        return obj.n_neurons * (1 + obj.dimensions)
+    return obj.size_in + obj.size_out
+
+
+def get_base_obj(obj):
+    # Returns the ensemble / node that a connection pre / post belongs to
+    if isinstance(obj, Neurons):
+        return obj.ensemble
+    if isinstance(obj, nengo.connection.LearningRule):
+        # Learning rules are computed with the learned connection
+        return get_base_obj(obj.connection.pre_obj)
+    return obj
+
+
+class PartitionUnit(object):
+    # A group of objects (a sub-network, or a single object) that is
+    # assigned to one partition
+    def __init__(self, key, objs, pinned=None):
+        self.key = key
+        self.objs = objs
+        self.pinned = pinned
+        self.n_neurons = sum([obj.n_neurons for obj in objs
+                              if isinstance(obj, nengo.Ensemble)])
+        self.weight = sum([get_obj_cost(obj) for obj in objs])
+
+    @property
+    def label(self):
+        label = getattr(self.key, 'label', None)
+        return label if label is not None else type(self.key).__name__
+
+
+def is_pinned_node(obj):
+    # Nodes with python function outputs are simulated on the master
+    # process (partition 0)
+    return isinstance(obj, nengo.Node) and obj.output is not None and \
+        callable(obj.output)
+
+
+def get_partition_units(model, num_parts, split_scale=0.5):
+    # Splits the model into partition units. Sub-networks whose weight is
+    # larger than split_scale times the average partition weight are split
+    # into their sub-networks (the objects directly in the split network
+    # become units of their own).
+    def make_units(net, split):
+        units = []
+        if split:
+            for obj in net.ensembles + net.nodes:
+                units.append(PartitionUnit(
+                    obj, [obj], 0 if is_pinned_node(obj) else None))
+            for subnet in net.networks:
+                units.extend(make_units(subnet, False))
+        else:
+            objs = net.all_ensembles + net.all_nodes
+            pinned_objs = [obj for obj in objs if is_pinned_node(obj)]
+            objs = [obj for obj in objs if not is_pinned_node(obj)]
+            if len(objs) > 0:
+                units.append(PartitionUnit(net, objs))
+            units.extend([PartitionUnit(obj, [obj], 0)
+                          for obj in pinned_objs])
+        return units
+
+    units = make_units(model, True)
+    total_weight = sum([unit.weight for unit in units])
+    while True:
+        max_weight = split_scale * total_weight / num_parts
+        split_units = [unit for unit in units
+                       if isinstance(unit.key, nengo.Network) and
+                       unit.weight > max_weight and
+                       len(unit.key.networks) > 0]
+        if len(split_units) == 0:
+            break
+        for unit in split_units:
+            units.remove(unit)
+            units.extend(make_units(unit.key, True))
+    return units
+
+
+def get_unit_edges(model, units):
+    # Returns the dictionary of (unit index, unit index) -> signal width
+    # (number of values sent each timestep) between each pair of units, and
+    # the extra (connection) cost of each unit
+    unit_inds = {}
+    for i, unit in enumerate(units):
+        for obj in unit.objs:
+            unit_inds[obj] = i
+
+    edges = {}
+    conn_costs = np.zeros(len(units))
+    for conn in model.all_connections:
+        pre_ind = unit_inds[get_base_obj(conn.pre_obj)]
+        post_ind = unit_inds[get_base_obj(conn.post_obj)]
+
+        # Connection weights are computed on the pre object's process
+        conn_costs[pre_ind] += get_conn_cost(conn)
+        if pre_ind != post_ind:
+            edge = (min(pre_ind, post_ind), max(pre_ind, post_ind))
+            edges[edge] = edges.get(edge, 0) + conn.size_out
+    return edges, conn_costs
+
+
+# ----- Partitioning -----
+def partition_units(weights, edges, num_parts, pinned=None, tol=0.05,
+                    max_passes=20):
+    # Balanced k-way partitioning of the weighted unit graph. Units are
+    # greedily assigned (heaviest first) to the least loaded partition
+    # (preferring the partition they are most connected to), then moved
+    # between partitions to reduce the cut weight while keeping every
+    # partition within (1 + tol) of the average load (or at least not
+    # making the balance worse).
+    # Returns the partition index of each unit.
+    num_units = len(weights)
+    if pinned is None:
+        pinned = [None] * num_units
+
+    neighbours = [{} for _ in range(num_units)]
+    for (i, j), width in edges.items():
+        neighbours[i][j] = neighbours[i].get(j, 0) + width
+        neighbours[j][i] = neighbours[j].get(i, 0) + width
+
+    parts = -np.ones(num_units, dtype=int)
+    loads = np.zeros(num_parts)
+    for i in range(num_units):
+        if pinned[i] is not None:
+            parts[i] = pinned[i]
+            loads[pinned[i]] += weights[i]
+
+    def connectivity(i, part):
+        return sum([width for j, width in neighbours[i].items()
+                    if parts[j] == part])
+
+    for i in np.argsort(weights)[::-1]:
+        if parts[i] >= 0:
+            continue
+        min_load = np.min(loads)
+        candidates = [p for p in range(num_parts)
+                      if loads[p] + weights[i] <=
+                      max(min_load + weights[i],
+                          (1 + tol) * np.sum(weights) / num_parts)]
+        part = max(candidates, key=lambda p: (connectivity(i, p), -loads[p]))
+        parts[i] = part
+        loads[part] += weights[i]
+
+    # Refinement passes
+    max_load = (1 + tol) * np.sum(weights) / num_parts
+    for _ in range(max_passes):
+        moved = False
+        for i in range(num_units):
+            if pinned[i] is not None:
+                continue
+            curr = parts[i]
+            curr_conn = connectivity(i, curr)
+            best_part, best_gain = curr, 0
+            for p in range(num_parts):
+                if p == curr:
+                    continue
+                new_load = loads[p] + weights[i]
+                if new_load > max(max_load, loads[curr]):
+                    continue
+                gain = connectivity(i, p) - curr_conn
+                if gain > best_gain:
+                    best_part, best_gain = p, gain
+            if best_part != curr:
+                loads[curr] -= weights[i]
+                loads[best_part] += weights[i]
+                parts[i] = best_part
+                moved = True
+        if not moved:
+            break
+    return parts
+
+
+def get_cut_width(edges, parts):
+    return sum([width for (i, j), width in edges.items()
+                if parts[i] != parts[j]])
+
+
+class SpaunPartitioner(object):
+    # Spaun-aware partitioner for the MPI backend. Partitions the model into
+    # num_parts partitions, balancing the (neuron and operator) cost of each
+    # partition, while minimizing the signal width of the connections
+    # between partitions. Does not require nengo_mpi (the assignments
+    # dictionary can be passed to nengo_mpi.Simulator).
+    def __init__(self, num_parts, tol=0.05, split_scale=0.5,
+                 bytes_per_value=8):
+        self.num_parts = num_parts
+        self.tol = tol
+        self.split_scale = split_scale
+        self.bytes_per_value = bytes_per_value
+
+        self.units = []
+        self.parts = []
+        self.edges = {}
+        self.weights = []
+
+    def partition(self, model):
+        # Returns the assignments dictionary (network / object ->
+        # partition index)
+        self.units = get_partition_units(model, self.num_parts,
+                                         self.split_scale)
+        self.edges, conn_costs = get_unit_edges(model, self.units)
+        self.weights = np.array([unit.weight for unit in self.units]) + \
+            conn_costs
+        self.parts = partition_units(self.weights, self.edges,
+                                     self.num_parts,
+                                     [unit.pinned for unit in self.units],
+                                     self.tol)
+
+        assignments = {}
+        for unit, part in zip(self.units, self.parts):
+            if isinstance(unit.key, nengo.Network):
+                assignments[unit.key] = int(part)
+            for obj in unit.objs:
+                assignments[obj] = int(part)
+        return assignments
+
+    def get_report(self):
+        # Returns the list of partition quality report strings
+        loads = np.zeros(self.num_parts)
+        n_neurons = np.zeros(self.num_parts, dtype=int)
+        n_units = np.zeros(self.num_parts, dtype=int)
+        for unit, weight, part in zip(self.units, self.weights, self.parts):
+            loads[part] += weight
+            n_neurons[part] += unit.n_neurons
+            n_units[part] += 1
+
+        cut_width = get_cut_width(self.edges, self.parts)
+        num_cut_edges = len([edge for edge in self.edges
+                             if self.parts[edge[0]] != self.parts[edge[1]]])
+
+        report = ['Partitions: %i (%i units)' % (self.num_parts,
+                                                 len(self.units))]
+        for p in range(self.num_parts):
+            report.append('- Partition %i: cost %i, %i neurons, %i units' %
+                          (p, loads[p], n_neurons[p], n_units[p]))
+        report.append('Load imbalance: %0.2f%% (max / mean - 1)' %
+                      ((np.max(loads) / np.mean(loads) - 1) * 100))
+        report.append('Cut edges: %i, cut values / step: %i, ' %
+                      (num_cut_edges, cut_width) +
+                      'cut bytes / step: %i' %
+                      (cut_width * self.bytes_per_value))
+        return report
+
+    def write_report(self, filename):
+        with open(filename, 'w') as report_file:
+            report_file.write('\n'.join(self.get_report()) + '\n')
+            report_file.write('\nUnit assignments:\n')
+            for unit, weight, part in sorted(
+                    zip(self.units, self.weights, self.parts),
+                    key=lambda x: (x[2], -x[1])):
+                report_file.write('- %i: %s (cost %i, %i neurons)\n' %
+                                  (part, unit.label, weight, unit.n_neurons))
@@ -0,0 +1,379 @@
+import os
+import numpy as np
+
+
+# Probe data file formats (determined by the probe data file extension):
+# - '.npz':  Compressed numpy archive (legacy format). Each probe is loaded
+#            (and decompressed) in full when accessed.
+# - '.npyd': Directory of uncompressed per-probe '.npy' files. Probe data is
+#            memory-mapped, so only the requested time range is read.
+# - '.h5':   HDF5 file (also the nengo_mpi format). Probe data is stored in
+#            time-chunked datasets, so only the requested time range is read.
+#
+# For the '.npyd' and '.h5' formats, a pyramid of min/max downsampled levels
+# is also stored for long probes (see write_probe_data) so that plots of long
+# runs can be drawn without reading every sample.
+#
+# Spike probe data can be stored as a sparse spike event list (see
+# spikes_to_csr), which the reader provides as a SpikeTrains object.
+probe_data_formats = ['npz', 'npyd', 'h5']
+
+pyramid_dir = 'pyramid'
+pyramid_factor = 10
+pyramid_min_len = 10000
+h5_chunk_len = 1024
+
+
+def get_probe_data_format(filename):
+    ext = os.path.splitext(filename.rstrip(os.sep))[1][1:]
+    if ext not in probe_data_formats:
+        raise RuntimeError('Filename: %s - File format not supported.' %
+                           filename)
+    return ext
+
+
+def minmax_downsample(min_data, max_data, factor):
+    # Computes the next min/max downsampled level (the last bin may contain
+    # fewer than 'factor' samples)
+    num_bins = int(np.ceil(1.0 * min_data.shape[0] / factor))
+    pad_len = num_bins * factor - min_data.shape[0]
+    if pad_len > 0:
+        min_data = np.concatenate([min_data, min_data[-1:].repeat(pad_len, 0)])
+        max_data = np.concatenate([max_data, max_data[-1:].repeat(pad_len, 0)])
+
+    new_shape = (num_bins, factor) + min_data.shape[1:]
+    return (min_data.reshape(new_shape).min(axis=1),
+            max_data.reshape(new_shape).max(axis=1))
+
+
+def make_minmax_pyramid(data, min_len=pyramid_min_len,
+                        factor=pyramid_factor):
+    # Returns a dict of {downsample factor: (min_data, max_data)} for each
+    # pyramid level with at least 'min_len' / 'factor' samples
+    pyramid = {}
+
+    data = np.asarray(data)
+    if data.ndim != 2 or data.dtype.kind not in 'fiub':
+        return pyramid
+
+    level_factor = 1
+    min_data = max_data = data
+    while min_data.shape[0] >= min_len:
+        level_factor *= factor
+        min_data, max_data = minmax_downsample(min_data, max_data, factor)
+        pyramid[level_factor] = (min_data, max_data)
+    return pyramid
+
+
+def pyramid_key(key, level_factor, minmax):
+    return '%s_%i_%s' % (key, level_factor, minmax)
+
+
+spike_csr_suffixes = ['_spike_ptr', '_spike_inds', '_spike_info']
+
+
+def is_spike_data(data, spike_value):
+    # Returns True if the data is (non-negative) integer multiples of the
+    # spike value, i.e. spikes of a spiking neuron type (and not e.g. the
+    # firing rates of a rate neuron type, which can't be stored as spikes)
+    counts = np.asarray(data) / spike_value
+    return bool(np.all(counts >= 0) and
+                np.allclose(counts, np.round(counts), rtol=0, atol=1e-6))
+
+
+def spikes_to_csr(key, data, spike_value):
+    # Converts dense (T, N) spike data into a per-neuron CSR list of spike
+    # step indices. Returns a dict of the arrays to store for the spike probe.
+    data = np.asarray(data)
+    num_steps, num_neurons = data.shape
+
+    counts = np.round(data / spike_value).astype(int)
+    steps, neurons = np.nonzero(counts)
+    order = np.lexsort((steps, neurons))
+    steps = steps[order]
+    neurons = neurons[order]
+
+    # More than one spike per timestep is stored as repeated step indices
+    spike_counts = counts[steps, neurons]
+    spike_inds = np.repeat(steps, spike_counts).astype(np.int32)
+    spike_ptr = np.zeros(num_neurons + 1, dtype=np.int64)
+    spike_ptr[1:] = np.cumsum(np.bincount(neurons, weights=spike_counts,
+                                          minlength=num_neurons))
+
+    return {key + '_spike_ptr': spike_ptr,
+            key + '_spike_inds': spike_inds,
+            key + '_spike_info': np.array([num_steps, num_neurons,
+                                           spike_value])}
+
+
+class SpikeTrains(object):
+    # Spike probe data stored as per-neuron lists of spike step indices (CSR
+    # format). Slicing the object (by time step) returns the dense spike data.
+    def __init__(self, spike_ptr, spike_inds, num_steps, spike_value):
+        self.spike_ptr = spike_ptr
+        self.spike_inds = spike_inds
+        self.num_steps = int(num_steps)
+        self.num_neurons = len(spike_ptr) - 1
+        self.spike_value = spike_value
+
+        self._spike_neurons = None
+        self._step_order = None
+
+    @classmethod
+    def from_dense(cls, data, spike_value=None):
+        data = np.asarray(data)
+        if spike_value is None:
+            spike_value = np.min(data[data > 0]) if np.any(data > 0) else 1.0
+        csr_data = spikes_to_csr('', data, spike_value)
+        return cls(csr_data['_spike_ptr'], csr_data['_spike_inds'],
+                   data.shape[0], spike_value)
+
+    @property
+    def shape(self):
+        return (self.num_steps, self.num_neurons)
+
+    @property
+    def spike_neurons(self):
+        # Neuron index of each spike in spike_inds
+        if self._spike_neurons is None:
+            self._spike_neurons = np.repeat(np.arange(self.num_neurons),
+                                            np.diff(self.spike_ptr))
+        return self._spike_neurons
+
+    def spike_steps(self, neuron, tslice=slice(None)):
+        start, stop, _ = tslice.indices(self.num_steps)
+        steps = self.spike_inds[self.spike_ptr[neuron]:
+                                self.spike_ptr[neuron + 1]]
+        return np.asarray(steps[np.searchsorted(steps, start):
+                                np.searchsorted(steps, stop)])
+
+    def counts(self, tslice=slice(None)):
+        # Number of spikes for each neuron within the time slice
+        start, stop, _ = tslice.indices(self.num_steps)
+        in_range = (self.spike_inds >= start) & (self.spike_inds < stop)
+        return np.bincount(self.spike_neurons[in_range],
+                           minlength=self.num_neurons)
+
+    def step_neurons(self, step):
+        # Indices of the neurons that spiked on the given time step
+        if self._step_order is None:
+            self._step_order = np.argsort(self.spike_inds, kind='mergesort')
+            self._step_sorted = np.asarray(self.spike_inds)[self._step_order]
+        start = np.searchsorted(self._step_sorted, step, side='left')
+        stop = np.searchsorted(self._step_sorted, step, side='right')
+        return self.spike_neurons[self._step_order[start:stop]]
+
+    def __getitem__(self, tslice):
+        if not isinstance(tslice, slice):
+            tslice = slice(tslice, tslice + 1)
+        start, stop, _ = tslice.indices(self.num_steps)
+
+        dense_data = np.zeros((max(stop - start, 0), self.num_neurons))
+        in_range = (self.spike_inds >= start) & (self.spike_inds < stop)
+        np.add.at(dense_data, (self.spike_inds[in_range] - start,
+                               self.spike_neurons[in_range]),
+                  self.spike_value)
+        return dense_data
+
+
+def write_probe_data(filename, probe_data):
+    data_format = get_probe_data_format(filename)
+
+    if data_format == 'npz':
+        np.savez_compressed(filename, **probe_data)
+    elif data_format == 'npyd':
+        if not os.path.isdir(os.path.join(filename, pyramid_dir)):
+            os.makedirs(os.path.join(filename, pyramid_dir))
+
+        for key in probe_data:
+            np.save(os.path.join(filename, key + '.npy'), probe_data[key])
+            pyramid = make_minmax_pyramid(probe_data[key])
+            for level_factor in pyramid:
+                for i, minmax in enumerate(['min', 'max']):
+                    np.save(os.path.join(filename, pyramid_dir,
+                                         pyramid_key(key, level_factor,
+                                                     minmax) + '.npy'),
+                            pyramid[level_factor][i])
+    elif data_format == 'h5':
+        import h5py
+
+        with h5py.File(filename, 'w') as h5_file:
+            pyramid_group = h5_file.create_group(pyramid_dir)
+            for key in probe_data:
+                data = np.asarray(probe_data[key])
+                if data.dtype.kind == 'O':
+                    data = np.array(map(str, data))
+
+                if data.ndim == 2 and data.shape[0] > 0:
+                    h5_file.create_dataset(
+                        key, data=data,
+                        chunks=(min(data.shape[0], h5_chunk_len),
+                                data.shape[1]))
+                else:
+                    h5_file.create_dataset(key, data=data)
+
+                pyramid = make_minmax_pyramid(data)
+                for level_factor in pyramid:
+                    for i, minmax in enumerate(['min', 'max']):
+                        pyramid_group.create_dataset(
+                            pyramid_key(key, level_factor, minmax),
+                            data=pyramid[level_factor][i])
+
+
+class ProbeDataReader(object):
+    def __init__(self, filename):
+        self.filename = filename
+        self.data_format = get_probe_data_format(filename)
+
+        self.data_cache = {}
+        self.pyramid_levels = {}
+
+        if self.data_format == 'npz':
+            self.data_file = np.load(filename, allow_pickle=True)
+            self.data_keys = list(self.data_file.keys())
+        elif self.data_format == 'npyd':
+            self.data_file = None
+            self.data_keys = [f[:-4] for f in os.listdir(filename)
+                              if f.endswith('.npy')]
+
+            pyramid_path = os.path.join(filename, pyramid_dir)
+            if os.path.isdir(pyramid_path):
+                self.load_pyramid_levels(
+                    [f[:-4] for f in os.listdir(pyramid_path)])
+        elif self.data_format == 'h5':
+            import h5py
+
+            self.data_file = h5py.File(filename, 'r')
+            self.data_keys = [key for key in self.data_file.keys()
+                              if key != pyramid_dir]
+
+            if pyramid_dir in self.data_file:
+                self.load_pyramid_levels(
+                    list(self.data_file[pyramid_dir].keys()))
+
+        # Sparse spike probe data is provided under the spike probe key
+        self.spike_keys = [key[:-len(spike_csr_suffixes[0])]
+                           for key in self.data_keys
+                           if key.endswith(spike_csr_suffixes[0])]
+        self.file_keys = self.data_keys
+        self.data_keys = [key for key in self.file_keys
+                          if not any([key.endswith(suffix)
+                                      for suffix in spike_csr_suffixes])]
+        self.data_keys.extend(self.spike_keys)
+
+    def load_pyramid_levels(self, pyramid_keys):
+        for p_key in pyramid_keys:
+            key, level_factor, minmax = p_key.rsplit('_', 2)
+            if minmax == 'min':
+                self.pyramid_levels.setdefault(key, []).append(
+                    int(level_factor))
+        for key in self.pyramid_levels:
+            self.pyramid_levels[key].sort()
+
+    def keys(self):
+        return list(self.data_keys)
+
+    def __contains__(self, key):
+        return key in self.data_keys
+
+    def __getitem__(self, key):
+        # Returns an array-like object for the probe data. For the '.npyd' and
+        # '.h5' formats, data is only read from file when sliced.
+        if key not in self.data_keys:
+            raise KeyError(key)
+
+        if key in self.spike_keys:
+            if key not in self.data_cache:
+                num_steps, _, spike_value = \
+                    np.asarray(self.load(key + '_spike_info'))
+                self.data_cache[key] = \
+                    SpikeTrains(self.load(key + '_spike_ptr'),
+                                np.asarray(self.load(key + '_spike_inds')),
+                                num_steps, spike_value)
+            return self.data_cache[key]
+        return self.load(key)
+
+    def get_spikes(self, key, spike_value=None):
+        # Returns the spike probe data as a SpikeTrains object (converted from
+        # dense spike data if it was not stored in the sparse format). Returns
+        # None if the dense probe data is not spike data (e.g. the firing
+        # rates of a rate neuron type, see is_spike_data).
+        data = self[key]
+        if isinstance(data, SpikeTrains):
+            return data
+        data = np.asarray(data)
+        if spike_value is not None and not is_spike_data(data, spike_value):
+            return None
+        return SpikeTrains.from_dense(data, spike_value)
+
+    def load(self, key):
+        if key not in self.data_cache:
+            if self.data_format == 'npz':
+                self.data_cache[key] = self.data_file[key]
+            elif self.data_format == 'npyd':
+                filename = os.path.join(self.filename, key + '.npy')
+                try:
+                    self.data_cache[key] = np.load(filename, mmap_mode='r')
+                except ValueError:
+                    # Arrays of python objects can't be memory-mapped
+                    self.data_cache[key] = np.load(filename,
+                                                   allow_pickle=True)
+            elif self.data_format == 'h5':
+                self.data_cache[key] = self.data_file[key]
+        return self.data_cache[key]
+
+    def get_data(self, key, tslice=slice(None)):
+        return np.asarray(self[key][tslice])
+
+    def get_pyramid_level(self, key, level_factor, minmax):
+        p_key = pyramid_key(key, level_factor, minmax)
+        if self.data_format == 'npyd':
+            return np.load(os.path.join(self.filename, pyramid_dir,
+                                        p_key + '.npy'), mmap_mode='r')
+        else:
+            return self.data_file[pyramid_dir][p_key]
+
+    def get_minmax_data(self, key, tslice=slice(None), max_samples=5000):
+        # Returns the min/max downsampled probe data (for the given time
+        # slice) with at most (approximately) max_samples samples, as a tuple
+        # of (sample indices of the start of each bin, min data, max data).
+        # If the data does not need to be downsampled, min data and max data
+        # are the raw probe data.
+        data = self[key]
+        start, stop, _ = tslice.indices(data.shape[0])
+        num_samples = stop - start
+
+        if num_samples <= max_samples:
+            raw_data = self.get_data(key, slice(start, stop))
+            return np.arange(start, stop), raw_data, raw_data
+
+        # Find the smallest stored downsample factor that fits max_samples
+        level_factor = None
+        for factor in self.pyramid_levels.get(key, []):
+            if num_samples / factor <= max_samples:
+                level_factor = factor
+                break
+
+        if level_factor is not None:
+            bin_slice = slice(start // level_factor,
+                              int(np.ceil(1.0 * stop / level_factor)))
+            min_data = np.asarray(self.get_pyramid_level(
+                key, level_factor, 'min')[bin_slice])
+            max_data = np.asarray(self.get_pyramid_level(
+                key, level_factor, 'max')[bin_slice])
+            sample_inds = np.arange(bin_slice.start, bin_slice.stop) * \
+                level_factor
+        else:
+            # No stored pyramid level, so compute the downsampled data from
+            # the raw data
+            level_factor = int(np.ceil(1.0 * num_samples / max_samples))
+            raw_data = self.get_data(key, slice(start, stop))
+            min_data, max_data = \
+                minmax_downsample(raw_data, raw_data, level_factor)
+            sample_inds = start + np.arange(min_data.shape[0]) * level_factor
+        return sample_inds, min_data, max_data
+
+    def close(self):
+        self.data_cache = {}
+        if self.data_file is not None:
+            self.data_file.close()
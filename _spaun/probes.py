@@ -5,8 +5,11 @@ import nengo
 from nengo.spa import Vocabulary
 
 from configurator import cfg
+from .probe_io import write_probe_data, spikes_to_csr, is_spike_data
+from .modules.stimulus import stim_func_vis
 from .modules.transform_system import TransformationSystemDummy
 from .modules.motor.data import mtr_data
+from .multirate import get_node_update_period
 
 
 def idstr(p):
@@ -18,14 +21,16 @@ def idstr(p):
 
 class SpaunProbeConfig(object):
     def __init__(self, spaun_model, spaun_vocab, dt, probe_data_dir,
-                 probe_data_filename):
+                 probe_data_filename, vocab_project=True, probe_budget=None,
+                 runtime=None):
         # Probe config version number
-        self.version = 5.0
+        self.version = 5.4
 
         # File data names and locations
         self.data_dir = probe_data_dir
         self.data_filename = probe_data_filename
-        self.config_filename = probe_data_filename[:-4] + '_cfg.npz'
+        self.config_filename = \
+            os.path.splitext(probe_data_filename)[0] + '_cfg.npz'
 
         # Probe config internal objects
         self.graph_list = []
@@ -36,18 +41,24 @@ class SpaunProbeConfig(object):
         #                               'v*' for value probes with legends,
         #                               'V.' for value vocabulary probes,
         #                               'V*' for value vocab probes with legend
+        #                                    (see vocab_proj_dict below)
         #                               's.' for spike probes,
         #                               's*' for spike probes with legends
         #                               'i.' or 'i*' for image probes
+        #                               'I.' or 'I*' for stimulus event probes
         # - next graph tags are '..'
 
         self.probe_list = []
         self.label_dict = {}
         self.vocab_dict = {}
+        self.vocab_proj_dict = {}
         self.ncount_dict = {}
         self.image_dict = {}
+        self.stim_event_list = []
         self.path_dict = {}
+        self.decimate_dict = {}
         self.anim_config = []
+        self.budget_report = []
 
         # Store a reference to the original self.m (for use in
         # initialize_probes)
@@ -55,17 +66,55 @@ class SpaunProbeConfig(object):
         self.v = spaun_vocab
         self.dt = dt
 
+        # Vocab probes record the similarity of the probed signal to each
+        # vocabulary item (computed in the simulation) instead of the raw
+        # semantic pointer vectors. Raw vectors are kept only if this is
+        # disabled (or if vocab_raw=True is given to probe_value).
+        self.vocab_project = vocab_project
+
+        # Probe budget planner options (see apply_probe_budget)
+        # - Number of spike probe neurons to keep (as a multiple of the number
+        #   of neurons displayed) when subsampling spike probes
+        self.spike_subsample_scale = 5
+        # - Decimation factors (in order) to try on value probes
+        self.decimate_factors = [2, 5, 10, 20]
+        # - Estimated memory overhead per recorded probe sample (bytes)
+        self.sample_overhead = 96
+
         # Initialize the probes (add to the spaun self.m, and fill in the
         # config lists), then write the probe configuration to file
         self.initialize_probes()
+        if probe_budget is not None:
+            if runtime is None:
+                raise ValueError('SpaunProbeConfig - Simulation runtime ' +
+                                 'required to apply probe budget.')
+            self.apply_probe_budget(probe_budget, runtime)
         self.write_config_to_file()
 
     def probe_null(self):
         return '!!'
 
-    def probe_value(self, probed_obj, synapse=0.005, vocab=None, label=None):
+    def probe_value(self, probed_obj, synapse=0.005, vocab=None, label=None,
+                    vocab_raw=None):
+        if vocab_raw is None:
+            vocab_raw = not self.vocab_project
+
         if isinstance(probed_obj, str):
             probe_id = probed_obj[:-2]
+        elif vocab is not None and not vocab_raw:
+            # Project the probed signal onto the vocabulary vectors (fixed
+            # transform into a probe node), and probe the projection
+            with self.m:
+                proj_node = nengo.Node(size_in=len(vocab.keys),
+                                       label='Vocab Probe Proj')
+                nengo.Connection(probed_obj, proj_node,
+                                 transform=vocab.vectors, synapse=None)
+                probe = nengo.Probe(proj_node, synapse=synapse)
+
+            probe_id = idstr(probe)
+            if probe_id not in self.probe_list:
+                self.probe_list.append(probe_id)
+            self.vocab_proj_dict[probe_id] = list(vocab.keys)
         else:
             with self.m:
                 probe = nengo.Probe(probed_obj, synapse=synapse)
@@ -74,6 +123,14 @@ class SpaunProbeConfig(object):
             if probe_id not in self.probe_list:
                 self.probe_list.append(probe_id)
 
+            # Multi-rate nodes only need to be sampled once every update
+            # period (recorded as a decimated probe)
+            update_period = get_node_update_period(probed_obj)
+            if update_period is not None and update_period > self.dt:
+                probe.sample_every = update_period
+                self.decimate_dict[probe_id] = \
+                    int(np.round(update_period / self.dt))
+
         self.label_dict[probe_id] = label
 
         if vocab is not None:
@@ -107,6 +164,29 @@ class SpaunProbeConfig(object):
         self.image_dict[probe_id] = shape
         return probe_id + 'i.'
 
+    def probe_stimulus(self, shape, label=None):
+        # Records the vision stimulus as a list of stimulus events (time step
+        # index, stimulus token, image index) instead of the raw image data.
+        # The images are rebuilt from the vision image data when displayed.
+        stim_out = self.m.stim.output
+        # Note: Multi-rate stimulus functions wrap stim_func_vis
+        if not (isinstance(stim_out, nengo.Node) and
+                getattr(stim_out.output, 'func', stim_out.output) is
+                stim_func_vis):
+            # Stimulus events are only available when the stimulus is
+            # generated by stim_func_vis (e.g. not with nengo_mpi), so default
+            # to probing the raw image data.
+            return self.probe_image(stim_out, shape, synapse=None,
+                                    label=label)
+
+        probe_id = idstr(id(self.m.stim))
+        if probe_id not in self.stim_event_list:
+            self.stim_event_list.append(probe_id)
+
+        self.image_dict[probe_id] = shape
+        self.label_dict[probe_id] = label
+        return probe_id + 'I.'
+
     def probe_path(self, probed_path_obj, probed_pen_down_obj=None,
                    synapse=None, path_xlimits=[-1, 1], path_ylimits=[-1, 1],
                    label=None):
@@ -167,13 +247,185 @@ class SpaunProbeConfig(object):
                                  'plot_type': plot_type_name,
                                  'plot_type_params': plot_type_params})
 
+    def get_probe_objs(self):
+        probe_objs = {}
+        for probe in self.m.all_probes:
+            if idstr(probe) in self.probe_list:
+                probe_objs[idstr(probe)] = probe
+        return probe_objs
+
+    def remove_probe(self, probe):
+        for net in [self.m] + self.m.all_networks:
+            if probe in net.probes:
+                net.probes.remove(probe)
+
+    def replace_probe_id(self, probe_id, new_probe):
+        # Replaces all references to the given probe id with the id of the
+        # new probe object
+        new_probe_id = idstr(new_probe)
+        self.probe_list[self.probe_list.index(probe_id)] = new_probe_id
+        for probe_dict in [self.label_dict, self.vocab_dict,
+                           self.vocab_proj_dict, self.ncount_dict,
+                           self.image_dict, self.path_dict,
+                           self.decimate_dict]:
+            if probe_id in probe_dict:
+                probe_dict[new_probe_id] = probe_dict.pop(probe_id)
+        for i, p in enumerate(self.graph_list):
+            if p[:-2].replace('.', '').isdigit():
+                self.graph_list[i] = '.'.join(
+                    [new_probe_id if pid == probe_id else pid
+                     for pid in p[:-2].split('.')]) + p[-2:]
+        return new_probe_id
+
+    def get_probe_nbytes(self, probe, runtime):
+        # Estimated size of the data recorded by the probe over the given
+        # runtime (data is recorded as float64, one array per sample)
+        sample_period = \
+            self.dt if probe.sample_every is None else probe.sample_every
+        num_samples = int(np.ceil(runtime / sample_period))
+        return num_samples * (probe.size_in * 8 + self.sample_overhead)
+
+    def get_probes_nbytes(self, runtime):
+        return sum([self.get_probe_nbytes(probe, runtime)
+                    for probe in self.get_probe_objs().values()])
+
+    def apply_probe_budget(self, budget, runtime):
+        # Fits the probe data recorded over the given runtime into the given
+        # budget (in bytes). In order, until the budget is met:
+        # 1. Subsample the neurons recorded by spike probes
+        # 2. Decimate value probes (by increasing factors)
+        # 3. Drop probes
+        # Lowest priority probes are modified first. Probes used in the
+        # animation config are never modified.
+        probe_objs = self.get_probe_objs()
+
+        anim_probe_ids = []
+        for config in self.anim_config:
+            for param in config.get('data_func_params', {}).values():
+                if isinstance(param, str):
+                    anim_probe_ids.append(param)
+
+        # Figure out which graph types each probe is displayed with
+        probe_tags = {}
+        for p in self.graph_list:
+            if p[:-2].replace('.', '').isdigit():
+                for probe_id in p[:-2].split('.'):
+                    probe_tags.setdefault(probe_id, set()).add(p[-2])
+
+        # Probe priorities (most important first): animation probes, graphed
+        # value probes, graphed spike probes, then probes not graphed at all.
+        # Ties are broken using the probe creation order.
+        def probe_priority(probe_id):
+            if probe_id in anim_probe_ids:
+                group = 0
+            elif probe_id not in probe_tags:
+                group = 3
+            elif probe_id in self.ncount_dict:
+                group = 2
+            else:
+                group = 1
+            return (group, self.probe_list.index(probe_id))
+
+        probe_ids = sorted(probe_objs.keys(), key=probe_priority)
+        probe_ids = [probe_id for probe_id in probe_ids
+                     if probe_id not in anim_probe_ids][::-1]
+
+        def nbytes():
+            return sum([self.get_probe_nbytes(probe, runtime)
+                        for probe in probe_objs.values()])
+
+        report = self.budget_report
+        report.append('Probe budget: %i bytes, requested: %i bytes' %
+                      (budget, nbytes()))
+
+        # 1. Subsample spike probes
+        for i, probe_id in enumerate(probe_ids):
+            if nbytes() <= budget:
+                break
+            if probe_id not in self.ncount_dict:
+                continue
+
+            probe = probe_objs[probe_id]
+            num_keep = self.ncount_dict[probe_id] * self.spike_subsample_scale
+            if probe.size_in > num_keep:
+                inds = np.linspace(0, probe.size_in - 1, num_keep).astype(int)
+                with self.m:
+                    new_probe = nengo.Probe(probe.target[list(inds)],
+                                            synapse=probe.synapse)
+                self.remove_probe(probe)
+                probe_objs.pop(probe_id)
+                new_probe_id = self.replace_probe_id(probe_id, new_probe)
+                probe_objs[new_probe_id] = new_probe
+                probe_ids[i] = new_probe_id
+                probe_tags[new_probe_id] = probe_tags.pop(probe_id)
+                report.append('- Subsampled spike probe %s: %i -> %i neurons'
+                              % (new_probe_id, probe.size_in, num_keep))
+
+        # 2. Decimate value probes
+        for decimate in self.decimate_factors:
+            for probe_id in probe_ids:
+                if nbytes() <= budget:
+                    break
+                if probe_id in self.ncount_dict or \
+                   not probe_tags.get(probe_id, set()) <= set(['v', 'V']) or \
+                   self.decimate_dict.get(probe_id, 1) >= decimate:
+                    continue
+
+                probe_objs[probe_id].sample_every = decimate * self.dt
+                self.decimate_dict[probe_id] = decimate
+        for probe_id in probe_ids:
+            if probe_id in self.decimate_dict:
+                report.append('- Decimated value probe %s: x%i' %
+                              (probe_id, self.decimate_dict[probe_id]))
+
+        # 3. Drop probes
+        dropped_ids = []
+        for probe_id in probe_ids:
+            if nbytes() <= budget:
+                break
+
+            self.remove_probe(probe_objs.pop(probe_id))
+            self.probe_list.remove(probe_id)
+            self.decimate_dict.pop(probe_id, None)
+            dropped_ids.append(probe_id)
+            report.append('- Dropped probe %s (%s)' %
+                          (probe_id, self.label_dict.get(probe_id)))
+
+        # Remove dropped probes from graph list
+        for i, p in enumerate(self.graph_list):
+            if p[:-2].replace('.', '').isdigit() and \
+               any([probe_id in dropped_ids
+                    for probe_id in p[:-2].split('.')]):
+                self.graph_list[i] = self.probe_null()
+
+        report.append('Probe data estimate: %i bytes' % nbytes())
+        if nbytes() > budget:
+            report.append('WARNING: Unable to fit probe data in budget. ' +
+                          'Animation probes exceed budget.')
+
     def write_config_to_file(self):
+        # Record the decimation of the (decimated) animation data probes, so
+        # that the animation data can be expanded to one sample per timestep
+        for config in self.anim_config:
+            if not isinstance(config, dict) or \
+               'data_func_params' not in config:
+                continue
+            config['data_func_decimate'] = \
+                dict([(param_name, self.decimate_dict[param])
+                      for param_name, param in
+                      config['data_func_params'].items()
+                      if isinstance(param, str) and
+                      param in self.decimate_dict])
+
         config_data = {'graph_list': self.graph_list, 'sp_dim': self.v.sp_dim,
                        'vocab_dict': self.vocab_dict, 'prim_vocab': self.v,
+                       'vocab_proj_dict': self.vocab_proj_dict,
                        'ncount_dict': self.ncount_dict,
                        'anim_config': self.anim_config,
                        'image_dict': self.image_dict,
                        'path_dict': self.path_dict,
+                       'decimate_dict': self.decimate_dict,
+                       'budget_report': self.budget_report,
                        'label_dict': self.label_dict,
                        'dt': self.dt, 'version': self.version}
 
@@ -186,14 +438,30 @@ class SpaunProbeConfig(object):
                       'stim_seq': experiment.stim_seq_list,
                       'present_interval': experiment.present_interval}
 
+        # Stimulus event data
+        if len(self.stim_event_list) > 0:
+            stim_events = np.array(
+                [(int(round(t / self.dt)) - 1, str(stim_token), img_ind)
+                 for t, stim_token, img_ind in experiment.stim_events],
+                dtype=[('step', int), ('token', 'S16'), ('image', int)])
+            for probe_id in self.stim_event_list:
+                probe_data[probe_id] = stim_events
+
         # Sort out the actual probes from sim
+        # Note: Spike probe data is stored as a sparse spike event list
+        #       (unless it is not spike data, e.g. for rate neuron types)
         for probe in sim.data.keys():
             if isinstance(probe, nengo.Probe) and \
                idstr(probe) in self.probe_list:
-                probe_data[idstr(probe)] = sim.data[probe]
-        np.savez_compressed(os.path.join(self.data_dir,
-                                         self.data_filename),
-                            **probe_data)
+                if idstr(probe) in self.ncount_dict and \
+                   is_spike_data(sim.data[probe], 1.0 / sim.dt):
+                    probe_data.update(spikes_to_csr(idstr(probe),
+                                                    sim.data[probe],
+                                                    1.0 / sim.dt))
+                else:
+                    probe_data[idstr(probe)] = sim.data[probe]
+        write_probe_data(os.path.join(self.data_dir, self.data_filename),
+                         probe_data)
 
     def initialize_probes(self):
         # To be defined by SpaunProbeConfig subclasses
@@ -203,7 +471,7 @@ class SpaunProbeConfig(object):
 
 class SpaunProbeCfgVisOnly(SpaunProbeConfig):
     def initialize_probes(self):
-        p0 = self.probe_image(self.m.stim.output, synapse=None, shape=(28, 28))
+        p0 = self.probe_stimulus(shape=(28, 28))
 
         pvs1 = self.probe_value(self.m.vis.output, vocab=self.v.vis_main)
         pvs2 = self.probe_value(self.m.vis.neg_attention)
@@ -220,10 +488,12 @@ class SpaunProbeCfgAnimDefault(SpaunProbeConfig):
     def initialize_probes(self):
         if hasattr(self.m, 'vis') and hasattr(self.m, 'mtr'):
             # -------------------- VISION STIMULI PROBES ----------------------
-            p0 = self.probe_value(self.m.stim.output, synapse=None)
+            p0 = self.probe_stimulus(shape=(28, 28))
+            vis_data_func = 'stim_image' if p0[-2] == 'I' else \
+                'generic_single'
 
             self.add_animation(key='vis',
-                               data_func_name='generic_single',
+                               data_func_name=vis_data_func,
                                data_func_params={'data': p0},
                                plot_type_name='imshow',
                                plot_type_params={'shape': (28, 28)})
@@ -323,8 +593,7 @@ class SpaunProbeCfgDefault(SpaunProbeConfig):
 
         # ========================= MAKE PROBES ===============================
         if hasattr(self.m, 'stim'):
-            p0 = self.probe_image(self.m.stim.output, synapse=None,
-                                  shape=(28, 28))
+            p0 = self.probe_stimulus(shape=(28, 28))
         else:
             with self.m:
                 self.m.null_node = nengo.Node(0)
@@ -474,7 +743,12 @@ class SpaunProbeCfgDefault(SpaunProbeConfig):
             ptf1 = self.probe_value(net.select_in_a.output, vocab=mem_vocab)
             ptf2 = self.probe_value(net.select_in_b.output, vocab=mem_vocab)
             ptf3 = self.probe_value(net.cconv1.output, vocab=vocab_rpm)
-            ptf3b = self.probe_value(ptf3)
+            # Note: With vocab projection, ptf3 is the projection onto
+            #       vocab_rpm, so the raw cconv output is probed separately
+            if self.vocab_project:
+                ptf3b = self.probe_value(net.cconv1.output)
+            else:
+                ptf3b = self.probe_value(ptf3)
             # ptf3c = self.probe_value(ptf3)
             # ptf3d = self.probe_value(ptf3)
             ptf4 = self.probe_value(net.output, vocab=mem_vocab)
@@ -624,8 +898,7 @@ class SpaunProbeCfgDefault(SpaunProbeConfig):
 class SpaunProbeCfgDarpa(SpaunProbeConfig):
     def initialize_probes(self):
         if hasattr(self.m, 'stim'):
-            p0 = self.probe_image(self.m.stim.output, synapse=None,
-                                  shape=(28, 28), label='Vis Input')
+            p0 = self.probe_stimulus(shape=(28, 28), label='Vis Input')
         else:
             p0 = self.probe_null()
 
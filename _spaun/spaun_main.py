@@ -153,4 +153,8 @@ def Spaun():
         if hasattr(model, 'monitor'):
             model.monitor.setup_connections(model)
 
+        # Threshold ensemble population blocks (if enabled)
+        if cfg.thresh_ens_blocks:
+            model.thresh_blocks = cfg.make_thresh_ens_blocks()
+
     return model
@@ -0,0 +1,141 @@
+import math
+import numpy as np
+
+
+def norm_cdf(x):
+    return 0.5 * (1.0 + math.erf(x / math.sqrt(2.0)))
+
+
+def norm_ppf(p):
+    # Inverse of the standard normal CDF (P. J. Acklam's rational
+    # approximation, relative error < 1.15e-9)
+    if p <= 0:
+        return -np.inf
+    if p >= 1:
+        return np.inf
+
+    a = [-3.969683028665376e+01, 2.209460984245205e+02,
+         -2.759285104469687e+02, 1.383577518672690e+02,
+         -3.066479806614716e+01, 2.506628277459239e+00]
+    b = [-5.447609879822406e+01, 1.615858368580409e+02,
+         -1.556989798598866e+02, 6.680131188771972e+01,
+         -1.328068155288572e+01]
+    c = [-7.784894002430293e-03, -3.223964580411365e-01,
+         -2.400758277161838e+00, -2.549732539343734e+00,
+         4.374664141464968e+00, 2.938163982698783e+00]
+    d = [7.784695709041462e-03, 3.224671290700398e-01,
+         2.445134137142996e+00, 3.754408661907416e+00]
+
+    p_low = 0.02425
+    if p < p_low:
+        q = math.sqrt(-2 * math.log(p))
+        return ((((((c[0] * q + c[1]) * q + c[2]) * q + c[3]) * q + c[4]) *
+                 q + c[5]) /
+                ((((d[0] * q + d[1]) * q + d[2]) * q + d[3]) * q + 1))
+    if p > 1 - p_low:
+        return -norm_ppf(1 - p)
+
+    q = p - 0.5
+    r = q * q
+    return ((((((a[0] * r + a[1]) * r + a[2]) * r + a[3]) * r + a[4]) * r +
+             a[5]) * q /
+            (((((b[0] * r + b[1]) * r + b[2]) * r + b[3]) * r + b[4]) * r + 1))
+
+
+def bootstrap_means(data, num_samples=5000, rng=None, max_bytes=2 ** 26):
+    # Computes the bootstrap resampled means of each column of data (shape
+    # (n, positions)). The resampling indices are shared across all columns,
+    # and are generated in chunks of samples to bound memory usage.
+    if rng is None:
+        rng = np.random.RandomState()
+
+    n = data.shape[0]
+    chunk_size = max(1, int(max_bytes / (8 * n * max(data.shape[1], 1))))
+
+    means = np.zeros((num_samples, data.shape[1]))
+    for start in range(0, num_samples, chunk_size):
+        stop = min(start + chunk_size, num_samples)
+        inds = rng.randint(n, size=(stop - start, n))
+        means[start:stop] = data[inds].mean(axis=1)
+    return means
+
+
+def bootstrap_ci(data, num_samples=5000, confidence=0.95, method='percentile',
+                 seed=None, max_bytes=2 ** 26):
+    # Computes the bootstrap confidence interval of the mean for each column
+    # (position) of data. Returns an array of shape (positions, 3), with
+    # format: [0]: mean, [1]: low, [2]: high
+    # method: 'percentile' or 'bca' (bias-corrected and accelerated)
+    data = np.asarray(data, dtype=float)
+    if data.ndim == 1:
+        data = data[:, None]
+
+    rng = np.random.RandomState(seed)
+    means = np.sort(bootstrap_means(data, num_samples, rng, max_bytes),
+                    axis=0)
+    data_mean = data.mean(axis=0)
+
+    alpha = (1 - confidence) * 0.5
+    low_inds = np.ones(data.shape[1], dtype=int) * int(num_samples * alpha)
+    high_inds = num_samples - low_inds - 1
+
+    if method == 'bca':
+        # Jackknife estimate of the acceleration
+        n = data.shape[0]
+        jack_means = (data.sum(axis=0) - data) / max(n - 1, 1)
+        jack_diff = jack_means.mean(axis=0) - jack_means
+        jack_num = np.sum(jack_diff ** 3, axis=0)
+        jack_den = 6.0 * np.sum(jack_diff ** 2, axis=0) ** 1.5
+
+        for i in range(data.shape[1]):
+            prop_less = np.mean(means[:, i] < data_mean[i])
+            if jack_den[i] == 0 or prop_less <= 0 or prop_less >= 1:
+                # Degenerate cases: use the percentile interval
+                continue
+
+            accel = jack_num[i] / jack_den[i]
+            z0 = norm_ppf(prop_less)
+            for inds, z_alpha in [(low_inds, norm_ppf(alpha)),
+                                  (high_inds, norm_ppf(1 - alpha))]:
+                adj_alpha = norm_cdf(z0 + (z0 + z_alpha) /
+                                     (1 - accel * (z0 + z_alpha)))
+                inds[i] = min(max(int(adj_alpha * num_samples), 0),
+                              num_samples - 1)
+    elif method != 'percentile':
+        raise ValueError('Bootstrap CI method "%s" not supported.' % method)
+
+    cols = np.arange(data.shape[1])
+    return np.array([data_mean, means[low_inds, cols],
+                     means[high_inds, cols]]).T
+
+
+def _bootstrap_ci_args(args):
+    return bootstrap_ci(*args)
+
+
+def bootstrap_ci_dict(data_dict, num_samples=5000, confidence=0.95,
+                      method='percentile', seed=None, processes=1):
+    # Computes the bootstrap confidence intervals (see bootstrap_ci) for each
+    # entry in the data dict, optionally using a process pool. Each entry is
+    # given its own seed (derived from the given seed) so that the results do
+    # not depend on the number of processes used.
+    keys = sorted(data_dict.keys())
+    if seed is not None:
+        seeds = [seed + i for i in range(len(keys))]
+    else:
+        seeds = [None] * len(keys)
+
+    args_list = [(data_dict[key], num_samples, confidence, method, key_seed)
+                 for key, key_seed in zip(keys, seeds)]
+
+    if processes > 1 and len(keys) > 1:
+        import multiprocessing
+
+        pool = multiprocessing.Pool(min(processes, len(keys)))
+        ci_list = pool.map(_bootstrap_ci_args, args_list)
+        pool.close()
+        pool.join()
+    else:
+        ci_list = map(_bootstrap_ci_args, args_list)
+
+    return dict(zip(keys, ci_list))
@@ -0,0 +1,145 @@
+import numpy as np
+
+from nengo.dists import Distribution, Uniform, UniformHypersphere
+from nengo.solvers import LstsqL2
+
+from _spa.utils import get_optimal_radius
+
+
+def get_subdim_candidates(dimensions, max_subdim):
+    # Sub-ensemble dimensionalities that evenly divide the dimensions
+    return [subdim for subdim in range(1, min(dimensions, max_subdim) + 1)
+            if dimensions % subdim == 0]
+
+
+def get_subdim_radius(dimensions, subdim, base_radius=None):
+    # Returns the sub-ensemble radius for the given sub-ensemble
+    # dimensionality. base_radius is the radius used for 1D sub-ensembles
+    # (defaults to the optimal radius), and is scaled by the ratio of the
+    # optimal radii of the subdim and 1D sub-ensembles.
+    radius_1d = get_optimal_radius(dimensions, 1)
+    if base_radius is None:
+        base_radius = radius_1d
+    return base_radius * get_optimal_radius(dimensions, subdim) / radius_1d
+
+
+def get_decoding_rmse(n_neurons, subdim, radius, test_points, neuron_type,
+                      max_rates, rng, noise=0.1):
+    # Returns the (per dimension) RMSE of the decoded estimate of the test
+    # points for one sub-ensemble, with the ensemble parameters sampled from
+    # the nengo defaults. Gaussian noise (noise * the max firing rate) is
+    # added to the test point activities (the noise model of the default
+    # decoder solver).
+    intercepts = Uniform(-1, 1).sample(n_neurons, rng=rng)
+    if isinstance(max_rates, Distribution):
+        max_rates = max_rates.sample(n_neurons, rng=rng)
+    else:
+        max_rates = max_rates * np.ones(n_neurons)
+    gain, bias = neuron_type.gain_bias(max_rates, intercepts)
+    encoders = UniformHypersphere(surface=True).sample(n_neurons, subdim,
+                                                       rng=rng)
+
+    # Default number of evaluation points of nengo ensembles
+    n_eval_points = max(np.clip(500 * subdim, 750, 2500), 2 * n_neurons)
+    eval_points = UniformHypersphere().sample(n_eval_points, subdim, rng=rng)
+
+    activities = neuron_type.rates(np.dot(eval_points, encoders.T), gain,
+                                   bias)
+    decoders, _ = LstsqL2()(activities, eval_points * radius, rng=rng)
+
+    test_activities = neuron_type.rates(
+        np.dot(test_points / radius, encoders.T), gain, bias)
+    test_activities += rng.normal(0, noise * np.max(activities),
+                                  size=test_activities.shape)
+    decoded = np.dot(test_activities, decoders)
+    return np.sqrt(np.mean((decoded - test_points) ** 2))
+
+
+class SubdimTuner(object):
+    # Tunes the sub-ensemble configuration (sub-ensemble dimensionality,
+    # number of neurons per sub-ensemble, and radius) of SPA ensemble
+    # arrays. For each candidate sub-ensemble dimensionality (and radius
+    # scale of the optimal radius), the smallest number of neurons that
+    # meets the target representation RMSE of semantic pointer values is
+    # found, and the configuration with the lowest total neuron count is
+    # chosen (ties go to the configuration with fewer sub-ensembles). The
+    # target RMSE defaults to the RMSE of the given (1D sub-ensemble)
+    # configuration, which is always a valid result.
+    # Note: The RMSE is estimated from the decoding error of the sub-vectors
+    #       of random unit length vectors (see get_decoding_rmse), averaged
+    #       over n_trials sets of sampled ensemble parameters.
+    def __init__(self, neuron_type, max_rates, target_rmse=None,
+                 max_subdim=16, radius_scales=(0.8, 1.0, 1.25),
+                 n_neurons_step=10, n_test_points=500, n_trials=2, seed=0):
+        self.neuron_type = neuron_type
+        self.max_rates = max_rates
+        self.target_rmse = target_rmse
+        self.max_subdim = max_subdim
+        self.radius_scales = radius_scales
+        self.n_neurons_step = n_neurons_step
+        self.n_test_points = n_test_points
+        self.n_trials = n_trials
+        self.seed = seed
+
+    def get_test_points(self, dimensions, subdim):
+        rng = np.random.RandomState(self.seed)
+        vectors = UniformHypersphere(surface=True).sample(
+            self.n_test_points, dimensions, rng=rng)
+        return vectors[:, :subdim]
+
+    def get_rmse(self, n_neurons, subdim, radius, test_points):
+        rmse = [get_decoding_rmse(n_neurons, subdim, radius, test_points,
+                                  self.neuron_type, self.max_rates,
+                                  np.random.RandomState(self.seed + trial))
+                for trial in range(self.n_trials)]
+        return np.mean(rmse)
+
+    def get_min_neurons(self, subdim, radius, test_points, target_rmse,
+                        max_neurons):
+        # Binary search for the smallest number of neurons (in steps of
+        # n_neurons_step) that meets the target RMSE. Returns None if
+        # max_neurons does not meet the target RMSE.
+        low = 1
+        high = max_neurons // self.n_neurons_step
+        if high < low or self.get_rmse(high * self.n_neurons_step, subdim,
+                                       radius, test_points) > target_rmse:
+            return None
+        while low < high:
+            mid = (low + high) // 2
+            if self.get_rmse(mid * self.n_neurons_step, subdim, radius,
+                             test_points) <= target_rmse:
+                high = mid
+            else:
+                low = mid + 1
+        return high * self.n_neurons_step
+
+    def tune(self, dimensions, n_neurons, radius=None):
+        # Returns the tuned (ens_dimensions, n_neurons, radius) configuration
+        # for an ensemble array of the given dimensions, n_neurons (per
+        # dimension) and (1D sub-ensemble) radius
+        base_radius = get_subdim_radius(dimensions, 1, radius)
+        target_rmse = self.target_rmse
+        if target_rmse is None:
+            target_rmse = self.get_rmse(
+                n_neurons, 1, base_radius,
+                self.get_test_points(dimensions, 1))
+
+        best = (n_neurons * dimensions, -1, (1, n_neurons, base_radius))
+        for subdim in get_subdim_candidates(dimensions, self.max_subdim):
+            n_ensembles = dimensions // subdim
+            test_points = self.get_test_points(dimensions, subdim)
+            for radius_scale in self.radius_scales:
+                subdim_radius = radius_scale * \
+                    get_subdim_radius(dimensions, subdim, radius)
+                # Only configurations with at most as many neurons as the
+                # current best configuration are searched
+                max_neurons = best[0] // n_ensembles
+                subdim_neurons = self.get_min_neurons(
+                    subdim, subdim_radius, test_points, target_rmse,
+                    max_neurons)
+                if subdim_neurons is None:
+                    continue
+                result = (subdim_neurons * n_ensembles, -subdim,
+                          (subdim, subdim_neurons, subdim_radius))
+                best = min(best, result)
+        return best[2]
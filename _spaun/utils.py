@@ -3,6 +3,7 @@ import numpy as np
 from configurator import cfg
 from experimenter import experiment
 from vocabulator import vocab
+from stats import bootstrap_ci
 
 
 def get_total_n_neurons(model):
@@ -18,18 +19,8 @@ def sum_vocab_vecs(vocab, vocab_strs):
     return result.v
 
 
-def conf_interval(data, num_samples=5000, confidence=0.95):
-    mean_data = np.zeros(num_samples)
-
-    for i in range(num_samples):
-        mean_data[i] = np.mean(np.random.choice(data, len(data)))
-
-    mean_data = np.sort(mean_data)
-
-    low_ind = int(num_samples * (1 - confidence) * 0.5)
-    high_ind = num_samples - low_ind - 1
-
-    return (np.mean(data), mean_data[low_ind], mean_data[high_ind])
+def conf_interval(data, num_samples=5000, confidence=0.95, seed=None):
+    return tuple(bootstrap_ci(data, num_samples, confidence, seed=seed)[0])
 
 
 def strs_to_inds(str_list, ref_str_list):
@@ -40,6 +31,18 @@ def str_to_bool(string):
     return string.lower() in ['yes', 'true', 't', '1']
 
 
+def str_to_bytes(string):
+    # Parses a size string (e.g. '4GB', '512M', '1024') into a number of bytes
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+    string = string.strip().upper()
+    if string.endswith('B'):
+        string = string[:-1]
+    if len(string) > 0 and string[-1] in units:
+        return int(float(string[:-1]) * units[string[-1]])
+    return int(float(string))
+
+
 def invol_matrix(dim):
     result = np.eye(dim)
     return result[-np.arange(dim), :]
@@ -1,4 +1,6 @@
+import os
 import time
+import hashlib
 import numpy as np
 
 from nengo.spa import Vocabulary
@@ -7,10 +9,26 @@ from nengo.spa import SemanticPointer
 from loggerator import logger
 
 
+def bind_powers(base_sp, bind_sp, num_powers):
+    # Returns the array of base_sp * bind_sp^i (i = 1 .. num_powers) vectors,
+    # computed in the fourier domain in one batch (instead of num_powers
+    # chained circular convolutions)
+    bind_fft = np.fft.fft(bind_sp.v)
+    powers_fft = np.cumprod(np.tile(bind_fft, (num_powers, 1)), axis=0)
+    return np.fft.ifft(np.fft.fft(base_sp.v) * powers_fft, axis=1).real
+
+
 class SpaunVocabulary(object):
     def __init__(self):
         self.main = None
 
+        # Debug vocabulary (created when first used by the probes, see enum)
+        self._enum = None
+
+        # Directory to cache the generated vocabulary vectors in. Caching is
+        # disabled if None.
+        self.cache_dir = None
+
         self.sp_dim = 512
         self.mtr_dim = 50
         self.vis_dim = 200
@@ -84,6 +102,8 @@ class SpaunVocabulary(object):
         logger.write('# Spaun Vocabulary Options:\n')
         logger.write('# -------------------------\n')
         for param_name in sorted(self.__dict__.keys()):
+            if param_name.startswith('_'):
+                continue
             param_value = getattr(self, param_name)
             if not callable(param_value) and not isinstance(param_value, list)\
                and not isinstance(param_value, Vocabulary) \
@@ -116,26 +136,59 @@ class SpaunVocabulary(object):
         self.main = Vocabulary(self.sp_dim, unitary=self.unitary_sp_strs,
                                rng=rng)
 
+        cache_filename = self.get_cache_filename(rng)
+        if cache_filename is not None and os.path.exists(cache_filename):
+            self.load_main_vocab(cache_filename, rng)
+        else:
+            self.build_main_vocab()
+            if cache_filename is not None:
+                self.save_main_vocab(cache_filename, rng)
+
+        self.add_sp = self.main[self.ops_sp_strs[0]]
+        self.inc_sp = self.main[self.ops_sp_strs[1]]
+
+        # ################# Sub-vocabulary definitions ########################
+        self.vis_main = self.main.create_subset(self.vis_sp_strs)
+
+        self.pos = self.main.create_subset(self.pos_sp_strs)
+
+        self.item = self.main.create_subset(self.num_sp_strs)
+
+        self.ps_task = self.main.create_subset(self.ps_task_sp_strs)
+        self.ps_state = self.main.create_subset(self.ps_state_sp_strs)
+        self.ps_dec = self.main.create_subset(self.ps_dec_sp_strs)
+        self.ps_cmp = self.main.create_subset(self.misc_ps_sp_strs)
+        self.ps_action = self.main.create_subset(self.ps_action_sp_strs)
+        self.ps_action_learn = \
+            self.main.create_subset(self.ps_action_learn_sp_strs)
+
+        self.reward = self.main.create_subset(self.reward_sp_strs)
+
+        # --- Position 1 vocabulary (POS1 * item combinations), used by the
+        #     transformation system
+        self.pos1 = self.make_bound_vocab(self.pos_sp_strs[:1],
+                                          self.num_sp_strs)
+
+        # Debug vocabulary is (re)created on first use
+        self._enum = None
+
+    def build_main_vocab(self):
         # --- Add numerical sp's ---
         self.main.parse('%s+%s' % (self.ops_sp_strs[0], self.num_sp_strs[0]))
-        add_sp = self.main[self.ops_sp_strs[0]]
-        num_sp = self.main[self.num_sp_strs[0]].copy()
-        for i in range(len(self.num_sp_strs) - 1):
-            num_sp = num_sp.copy() * add_sp
+        num_sps = bind_powers(self.main[self.num_sp_strs[0]],
+                              self.main[self.ops_sp_strs[0]],
+                              len(self.num_sp_strs) - 1)
+        for i, num_sp in enumerate(num_sps):
             self.main.add(self.num_sp_strs[i + 1], num_sp)
 
-        self.add_sp = add_sp
-
         # --- Add positional sp's ---
         self.main.parse('%s+%s' % (self.ops_sp_strs[1], self.pos_sp_strs[0]))
-        inc_sp = self.main[self.ops_sp_strs[1]]
-        pos_sp = self.main[self.pos_sp_strs[0]].copy()
-        for i in range(len(self.pos_sp_strs) - 1):
-            pos_sp = pos_sp.copy() * inc_sp
+        pos_sps = bind_powers(self.main[self.pos_sp_strs[0]],
+                              self.main[self.ops_sp_strs[1]],
+                              len(self.pos_sp_strs) - 1)
+        for i, pos_sp in enumerate(pos_sps):
             self.main.add(self.pos_sp_strs[i + 1], pos_sp)
 
-        self.inc_sp = inc_sp
-
         # --- Add other visual sp's ---
         self.main.parse('+'.join(self.misc_vis_sp_strs))
         self.main.parse('+'.join(self.ps_task_vis_sp_strs))
@@ -148,36 +201,71 @@ class SpaunVocabulary(object):
             self.main.parse('+'.join(self.ps_action_sp_strs))
         self.main.parse('+'.join(self.misc_ps_sp_strs))
 
-        # ################# Sub-vocabulary definitions ########################
-        self.vis_main = self.main.create_subset(self.vis_sp_strs)
-
-        self.pos = self.main.create_subset(self.pos_sp_strs)
-
-        self.item = self.main.create_subset(self.num_sp_strs)
-
-        self.ps_task = self.main.create_subset(self.ps_task_sp_strs)
-        self.ps_state = self.main.create_subset(self.ps_state_sp_strs)
-        self.ps_dec = self.main.create_subset(self.ps_dec_sp_strs)
-        self.ps_cmp = self.main.create_subset(self.misc_ps_sp_strs)
-        self.ps_action = self.main.create_subset(self.ps_action_sp_strs)
-        self.ps_action_learn = \
-            self.main.create_subset(self.ps_action_learn_sp_strs)
-
-        self.reward = self.main.create_subset(self.reward_sp_strs)
-
-        # ############ Enumerated vocabulary definitions ######################
+    def get_cache_filename(self, rng):
+        # The vocabulary cache file is keyed on the vocabulary dimensionality,
+        # the rng state, and the semantic pointer lists
+        if self.cache_dir is None:
+            return None
+
+        rng_state = rng.get_state()
+        key_data = [self.sp_dim, self.unitary_sp_strs, self.num_sp_strs,
+                    self.pos_sp_strs, self.ops_sp_strs,
+                    self.misc_vis_sp_strs, self.ps_task_vis_sp_strs,
+                    self.ps_task_sp_strs, self.ps_state_sp_strs,
+                    self.ps_dec_sp_strs, self.ps_action_sp_strs,
+                    self.misc_ps_sp_strs, rng_state[0], rng_state[2:],
+                    hashlib.md5(rng_state[1].tostring()).hexdigest()]
+        return os.path.join(self.cache_dir, 'vocab_%s.npz' %
+                            hashlib.md5(repr(key_data)).hexdigest())
+
+    def save_main_vocab(self, filename, rng):
+        # Saves the main vocabulary vectors, and the rng state after the
+        # vocabulary has been generated
+        if not os.path.isdir(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+        rng_state = rng.get_state()
+        np.savez(filename, keys=np.array(self.main.keys),
+                 vectors=self.main.vectors, rng_key=rng_state[1],
+                 rng_pos=rng_state[2], rng_has_gauss=rng_state[3],
+                 rng_cached_gaussian=rng_state[4])
+
+    def load_main_vocab(self, filename, rng):
+        cache_data = np.load(filename)
+
+        for key, vector in zip(cache_data['keys'], cache_data['vectors']):
+            self.main.add(str(key), vector)
+
+        # Restore the rng state (as if the vocabulary had been generated)
+        rng.set_state(('MT19937', cache_data['rng_key'],
+                       int(cache_data['rng_pos']),
+                       int(cache_data['rng_has_gauss']),
+                       float(cache_data['rng_cached_gaussian'])))
+
+    # ############ Enumerated vocabulary definitions ######################
+    @property
+    def enum(self):
         # --- Enumerated vocabulary, enumerates all possible combinations of
         #     position and item vectors (for debug purposes)
-        self.enum = Vocabulary(self.sp_dim, rng=rng)
-        for pos in self.pos_sp_strs:
-            for num in self.num_sp_strs:
-                sp_str = '%s*%s' % (pos, num)
-                self.enum.add(sp_str, self.main.parse(sp_str))
-
-        self.pos1 = Vocabulary(self.sp_dim, rng=rng)
-        for num in self.num_sp_strs:
-            sp_str = '%s*%s' % (self.pos_sp_strs[0], num)
-            self.pos1.add(sp_str, self.main.parse(sp_str))
+        if self._enum is None:
+            self._enum = self.make_bound_vocab(self.pos_sp_strs,
+                                               self.num_sp_strs)
+        return self._enum
+
+    def make_bound_vocab(self, sp_strs_a, sp_strs_b):
+        # Creates the vocabulary of all A*B semantic pointer combinations (with
+        # the convolutions computed in one batch)
+        vocab = Vocabulary(self.sp_dim, rng=self.main.rng)
+
+        fft_a = np.fft.fft(self.main.create_subset(sp_strs_a).vectors)
+        fft_b = np.fft.fft(self.main.create_subset(sp_strs_b).vectors)
+        bound_vecs = np.fft.ifft(fft_a[:, None, :] * fft_b[None, :, :],
+                                 axis=2).real
+
+        for i, sp_str_a in enumerate(sp_strs_a):
+            for j, sp_str_b in enumerate(sp_strs_b):
+                vocab.add('%s*%s' % (sp_str_a, sp_str_b), bound_vecs[i, j])
+        return vocab
 
     def initialize_mtr_vocab(self, mtr_dim, mtr_sps):
         self.mtr_dim = mtr_dim
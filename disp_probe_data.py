@@ -1,12 +1,16 @@
 import os
+import glob
 import numpy as np
 import numpy.ma as ma
 import argparse
-import matplotlib.pyplot as plt
+import multiprocessing
+import matplotlib
+
+from _spaun.probe_io import ProbeDataReader
 
 
 # --------------------- DISP_PROBE_DATA CODE DEFAULTS ---------------------
-supported_data_version = 5.0
+supported_data_version = 5.4
 default_filename = ''
 
 # ----- Add current directory to system path ---
@@ -17,8 +21,9 @@ parser = argparse.ArgumentParser(description='Script for displaying recorded' +
                                  ' probed data generated by the run_spaun.py' +
                                  ' script.')
 parser.add_argument(
-    'data_filename', type=str,
-    help='Probe data filename.')
+    'data_filename', type=str, nargs='+',
+    help='Probe data filename(s). In batch mode, glob patterns (e.g. ' +
+         '"probe_data*.npz") can also be used.')
 parser.add_argument(
     '--showgrph', action='store_true',
     help='Supply to show graphing of probe data.')
@@ -41,494 +46,747 @@ parser.add_argument(
     '--trange', type=float, nargs=2, default=None,
     help=('Minimum and maximum time values (in seconds) to display on the ' +
           'graphs. Provided as two values e.g. --trange MIN MAX.'))
+parser.add_argument(
+    '--max_samples', type=int, default=5000,
+    help=('Maximum number of samples to plot for value probes. Longer ' +
+          'probe data is displayed using min/max downsampled data.'))
+parser.add_argument(
+    '--batch', action='store_true',
+    help='Supply to render the graphs (and input/output figure) of each ' +
+         'probe data file to image files instead of displaying them. Uses ' +
+         'a non-interactive matplotlib backend.')
+parser.add_argument(
+    '--output_dir', type=str, default=None,
+    help='Directory to save the rendered figures to in batch mode. Defaults ' +
+         'to the directory of each probe data file.')
+parser.add_argument(
+    '--output_format', type=str, nargs='+', default=['png'],
+    choices=['png', 'svg', 'pdf'],
+    help='File format(s) of the rendered figures in batch mode.')
+parser.add_argument(
+    '--dpi', type=int, default=100,
+    help='Resolution of the rendered figures in batch mode.')
+parser.add_argument(
+    '--saveanim', action='store_true',
+    help='Supply to render the animation of each (animation) probe data ' +
+         'file to a video file. Frames are rendered in parallel (using -j ' +
+         'processes) and encoded with ffmpeg.')
+parser.add_argument(
+    '--anim_format', type=str, default='mp4', choices=['mp4', 'gif'],
+    help='File format of the rendered animation videos.')
+parser.add_argument(
+    '--anim_frame_step', type=int, default=None,
+    help='Number of simulation timesteps per animation frame. Defaults to ' +
+         'the animation configuration setting.')
+parser.add_argument(
+    '--anim_fps', type=float, default=None,
+    help='Frame rate of the rendered animation videos. Defaults to real ' +
+         '(simulation) time playback.')
+parser.add_argument(
+    '--no_blit', action='store_true',
+    help='Supply to redraw the full animation figure for every frame when ' +
+         'rendering animation videos.')
+parser.add_argument(
+    '-j', type=int, default=multiprocessing.cpu_count(),
+    help='Number of processes to use to render probe data files in batch ' +
+         'mode (or animation frames with --saveanim).')
 
 args = parser.parse_args()
 
-data_filename = os.path.join(args.data_dir, args.data_filename)
-data_filename = data_filename.replace('"', '')
+# Batch mode uses a non-interactive backend (must be selected before pyplot is
+# imported)
+if args.batch:
+    matplotlib.use('Agg')
+import matplotlib.pyplot as plt
 
 show_grphs = args.showgrph
 show_io = args.showiofig
 show_anim = args.showanim
-if not (show_grphs or show_io or show_anim):
+if not (show_grphs or show_io or show_anim or args.saveanim):
     show_grphs = True
 
-# --------------------- LOAD SIM DATA ---------------------
-gen_trange = False
-if data_filename.endswith('.npz'):
-    config_filename = data_filename[:-4] + '_cfg.npz'
-    probe_data = np.load(data_filename)
-
-elif data_filename.endswith('.h5'):
-    # H5 file format (nengo_mpi)
-    config_dir, filename = os.path.split(data_filename[:-3])
-    nameparts = filename.split('+')
-    config_filename = os.path.join(config_dir,
-                                   '+'.join(nameparts[:2]) + '_cfg.npz')
-
-    import h5py
-    probe_data = h5py.File(data_filename)
-
-    gen_trange = True
-else:
-    raise RuntimeError('Filename: %s - File format not supported.' %
-                       data_filename)
-
-# --------------------- LOAD MODEL & PROBE CONFIG DATA ---------------------
-config_data = np.load(config_filename)
-
-data_version = 0 if 'version' not in config_data.keys() else \
-    config_data['version'].item()
-if int(data_version) != int(supported_data_version):
-    raise Exception('Unsupported data version number. Expected %i, got %i.'
-                    % (supported_data_version, data_version))
-
-vocab_dict = config_data['vocab_dict'].item()
-ncount_dict = config_data['ncount_dict'].item()
-image_shapes = config_data['image_dict'].item()
-path_limits = config_data['path_dict'].item()
-probe_labels = config_data['label_dict'].item()
-image_dict = dict()
-motor_dict = dict()
-sim_dt = config_data['dt']
-
-# --------------------- GENERATE T RANGE ---------------------
-if not gen_trange:
-    trange = probe_data['trange']
-else:
-    data_len = probe_data[probe_data.keys()[0]].shape[0]
-    trange = np.arange(0, data_len * sim_dt, sim_dt)
-
-if args.trange is None:
-    trange_inds = np.arange(trange.shape[0])
-else:
-    trange_min, trange_max = args.trange
-    trange_inds = np.where((trange >= trange_min) & (trange <= trange_max))
-t_data = trange[trange_inds]
-
-# --------------------- DISPLAY PROBE DATA ---------------------
-print "\nDISPLAYING PROBE DATA."
-
-fig_list = []
-
-
-# Function to handle closing of one figure window, and close all other figures
-def handle_close(fig, fig_list):
-    fig_list.pop(fig_list.index(fig))
-    if len(fig_list) > 0:
-        plt.close(fig_list[0])
-
-
-# Helper function to calculate differences in images (for show_io)
-def rmse(x1, x2):
-    return np.sqrt(np.sum((x1 - x2) ** 2))
-
-
-# Helper function to adjust path coordinates to help plotting
-def adjust_path_coords(path_data, path_limits, new_limits):
-    path_l_limit, path_u_limit = path_limits
-    path_range = path_u_limit - path_l_limit
-    new_l_limit, new_u_limit = new_limits
-    new_range = new_u_limit - new_l_limit
-
-    return ((path_data - path_l_limit) * (new_range / path_range) +
-            new_l_limit)
-
-
-# Helper function to plot legends
-def plot_legend(str_list, loc='right', labelspacing=0, max_per_row=5.0,
-                fontsize='medium'):
-    lgd = plt.legend(str_list, loc=loc, labelspacing=labelspacing,
-                     ncol=int(np.ceil(len(str_list) / max_per_row)))
-    lgd_text = lgd.get_texts()
-    plt.setp(lgd_text, fontsize=fontsize)
-
-# --------------------- DISPLAY GRAPHED DATA ---------------------
-# Get presentation interval (for image graphs)
-present_interval = probe_data['present_interval']
-aspect_equal_y_margin = present_interval * 0.25
-
-if show_grphs:
-    graph_list = config_data['graph_list']
-
-    print "GRAPH LIST: "
-    print graph_list
-
-    title_list = [[]]
-    grph_list = [[]]
-    for p in graph_list:
-        if p == '..':
-            grph_list.append([])
-            title_list.append([])
-        elif p[0] == '!':
-            pass
-        elif p[:-2].replace('.', '').isdigit():
-            grph_list[-1].append(p)
+if args.batch and show_anim:
+    print "Animations are not rendered in batch mode. Ignoring --showanim."
+    show_anim = False
+
+
+# --------------------- DISPLAY PROBE DATA FILE ---------------------
+# Generates the figures for the given probe data file. If save_dir is given,
+# the figures are saved to file (and closed) instead of being kept for display.
+# Returns the probe data reader (to be closed once the figures are no longer
+# being displayed).
+def disp_probe_data(data_filename, save_dir=None):
+    save_prefix = \
+        os.path.splitext(os.path.basename(data_filename.rstrip(os.sep)))[0]
+
+    # Helper function to save figures to file (in batch mode)
+    def save_figure(f, suffix):
+        for fmt in args.output_format:
+            f.savefig(os.path.join(save_dir, '%s_%s.%s' %
+                                   (save_prefix, suffix, fmt)),
+                      dpi=args.dpi)
+        plt.close(f)
+
+    # --------------------- LOAD SIM DATA ---------------------
+    # Note: Probe data is read lazily (only the probes and time ranges
+    # displayed are read from the file, where supported by the file format).
+    probe_data = ProbeDataReader(data_filename)
+    config_filename = \
+        os.path.splitext(data_filename.rstrip(os.sep))[0] + '_cfg.npz'
+
+    if probe_data.data_format == 'h5' and not os.path.exists(config_filename):
+        # H5 file format (nengo_mpi)
+        config_dir, filename = os.path.split(data_filename[:-3])
+        nameparts = filename.split('+')
+        config_filename = os.path.join(config_dir,
+                                       '+'.join(nameparts[:2]) + '_cfg.npz')
+
+    gen_trange = 'trange' not in probe_data
+
+    # ------------------- LOAD MODEL & PROBE CONFIG DATA -------------------
+    config_data = np.load(config_filename)
+
+    data_version = 0 if 'version' not in config_data.keys() else \
+        config_data['version'].item()
+    if int(data_version) != int(supported_data_version):
+        raise Exception('Unsupported data version number. Expected %i, got %i.'
+                        % (supported_data_version, data_version))
+
+    vocab_dict = config_data['vocab_dict'].item()
+    vocab_proj_dict = config_data['vocab_proj_dict'].item() \
+        if 'vocab_proj_dict' in config_data.keys() else dict()
+    ncount_dict = config_data['ncount_dict'].item()
+    image_shapes = config_data['image_dict'].item()
+    path_limits = config_data['path_dict'].item()
+    decimate_dict = config_data['decimate_dict'].item() \
+        if 'decimate_dict' in config_data.keys() else dict()
+    probe_labels = config_data['label_dict'].item()
+    image_dict = dict()
+    motor_dict = dict()
+    sim_dt = config_data['dt']
+
+    # --------------------- GENERATE T RANGE ---------------------
+    if not gen_trange:
+        trange = probe_data['trange']
+    else:
+        data_len = max([probe_data[key].shape[0] for key in probe_data.keys()])
+        trange = np.arange(0, data_len * sim_dt, sim_dt)
+
+    # Helper function to get the index slice of a time range (filtered by min
+    # and max tranges)
+    def get_trange_inds(trange):
+        if args.trange is None:
+            return slice(0, trange.shape[0])
+        else:
+            trange_min, trange_max = args.trange
+            return slice(np.searchsorted(trange, trange_min, side='left'),
+                         np.searchsorted(trange, trange_max, side='right'))
+
+    trange = np.asarray(trange)
+    trange_inds = get_trange_inds(trange)
+    t_data = trange[trange_inds]
+
+    # Helper function to get the time and probe data for a probe (filtered by
+    # min and max tranges), taking into account decimated probes. If minmax is
+    # True, long probe data is replaced with the (interleaved) min/max
+    # downsampled data.
+    def get_probe_data(probe, minmax=False):
+        decimate = decimate_dict.get(probe, 1)
+        if decimate == 1:
+            p_trange = trange
+            p_trange_inds = trange_inds
         else:
-            title_list[-1].append(p.replace('**', ''))
-
-    for n, fig in enumerate(grph_list):
-        f = plt.figure()
-        f.canvas.mpl_connect('close_event',
-                             lambda evt, fig=f, fig_list=fig_list:
-                             handle_close(fig, fig_list))
-        fig_list.append(f)
-
-        if len(title_list[n]) > 0:
-            plt.suptitle(title_list[n][-1])
-
-        max_r = len(fig)
-        for r, probe_id_str in enumerate(fig):
-            # Get probe id and probe plot options
-            probe_opts = probe_id_str[-2:]
-            probe = probe_id_str[:-2]
-
-            # Matplotlib settings
-            plt.subplot(max_r, 1, r + 1)
-            colormap = plt.cm.gist_ncar
-            graymap = plt.cm.gray
-
-            # Figure out if probe plot needs a legend
-            disp_legend = probe_opts[-1] == '*'
-
-            # Get probe data (filtered by min and max tranges)
-            if probe_opts[0] != 'p':
-                p_data = probe_data[probe][trange_inds]
-
-            if probe_opts[0] == 'V':
-                # Vector with vocabulary plots
-                vocab = vocab_dict[probe]
-                num_classes = len(vocab.keys)
-
-                plt.gca().set_color_cycle([colormap(i) for i in
-                                           np.linspace(0, 0.9, num_classes)])
-                for i in range(num_classes):
-                    plt.plot(t_data,
-                             np.dot(p_data, vocab.vectors.T)[:, i])
-                if disp_legend:
-                    plot_legend(vocab.keys)
-            elif probe_opts[0] == 'v':
-                # vector without vocabulary plots
-                num_classes = p_data[-1].size
-                if num_classes < 30:
+            p_trange = trange[decimate - 1::decimate]
+            p_trange_inds = get_trange_inds(p_trange)
+
+        if not minmax:
+            return (p_trange[p_trange_inds],
+                    probe_data.get_data(probe, p_trange_inds))
+
+        sample_inds, min_data, max_data = \
+            probe_data.get_minmax_data(probe, p_trange_inds, args.max_samples)
+        if min_data is max_data:
+            return p_trange[sample_inds], min_data
+
+        minmax_data = np.empty((min_data.shape[0] * 2,) + min_data.shape[1:])
+        minmax_data[0::2] = min_data
+        minmax_data[1::2] = max_data
+        return p_trange[sample_inds].repeat(2), minmax_data
+
+    # --------------------- DISPLAY PROBE DATA ---------------------
+    print "\nDISPLAYING PROBE DATA."
+
+    fig_list = []
+
+    # Function to handle closing of one figure window, and close all other
+    # figures
+    def handle_close(fig, fig_list):
+        fig_list.pop(fig_list.index(fig))
+        if len(fig_list) > 0:
+            plt.close(fig_list[0])
+
+    # Helper function to calculate differences in images (for show_io)
+    def rmse(x1, x2):
+        return np.sqrt(np.sum((x1 - x2) ** 2))
+
+    # Helper function to adjust path coordinates to help plotting
+    def adjust_path_coords(path_data, path_limits, new_limits):
+        path_l_limit, path_u_limit = path_limits
+        path_range = path_u_limit - path_l_limit
+        new_l_limit, new_u_limit = new_limits
+        new_range = new_u_limit - new_l_limit
+
+        return ((path_data - path_l_limit) * (new_range / path_range) +
+                new_l_limit)
+
+    # Helper function to get the vision image data (for stimulus event probes)
+    def get_vis_image_data():
+        from _spaun.modules.vision.data import vis_data
+        return vis_data.images_data
+
+    # Helper function to plot legends
+    def plot_legend(str_list, loc='right', labelspacing=0, max_per_row=5.0,
+                    fontsize='medium'):
+        lgd = plt.legend(str_list, loc=loc, labelspacing=labelspacing,
+                         ncol=int(np.ceil(len(str_list) / max_per_row)))
+        lgd_text = lgd.get_texts()
+        plt.setp(lgd_text, fontsize=fontsize)
+
+    # --------------------- DISPLAY GRAPHED DATA ---------------------
+    # Get presentation interval (for image graphs)
+    present_interval = float(np.asarray(probe_data['present_interval']))
+    aspect_equal_y_margin = present_interval * 0.25
+
+    if show_grphs:
+        graph_list = config_data['graph_list']
+
+        print "GRAPH LIST: "
+        print graph_list
+
+        title_list = [[]]
+        grph_list = [[]]
+        for p in graph_list:
+            if p == '..':
+                grph_list.append([])
+                title_list.append([])
+            elif p[0] == '!':
+                pass
+            elif p[:-2].replace('.', '').isdigit():
+                grph_list[-1].append(p)
+            else:
+                title_list[-1].append(p.replace('**', ''))
+
+        for n, fig in enumerate(grph_list):
+            f = plt.figure()
+            if save_dir is None:
+                f.canvas.mpl_connect('close_event',
+                                     lambda evt, fig=f, fig_list=fig_list:
+                                     handle_close(fig, fig_list))
+                fig_list.append(f)
+
+            if len(title_list[n]) > 0:
+                plt.suptitle(title_list[n][-1])
+
+            max_r = len(fig)
+            for r, probe_id_str in enumerate(fig):
+                # Get probe id and probe plot options
+                probe_opts = probe_id_str[-2:]
+                probe = probe_id_str[:-2]
+
+                # Matplotlib settings
+                plt.subplot(max_r, 1, r + 1)
+                colormap = plt.cm.gist_ncar
+                graymap = plt.cm.gray
+
+                # Figure out if probe plot needs a legend
+                disp_legend = probe_opts[-1] == '*'
+
+                # Get probe data (filtered by min and max tranges)
+                if probe_opts[0] not in ['p', 'I', 's']:
+                    # Min/max downsampled data can be used for value probes
+                    # (and vocab probes already projected onto the vocab)
+                    use_minmax = probe_opts[0] == 'v' or \
+                        (probe_opts[0] == 'V' and probe in vocab_proj_dict)
+                    p_t_data, p_data = get_probe_data(probe, use_minmax)
+
+                if probe_opts[0] == 'V':
+                    # Vector with vocabulary plots
+                    vocab = vocab_dict[probe]
+
+                    if probe in vocab_proj_dict:
+                        # Probe data already projected onto vocab in simulation
+                        vocab_keys = vocab_proj_dict[probe]
+                        vocab_data = p_data
+                    else:
+                        vocab_keys = vocab.keys
+                        vocab_data = np.dot(p_data, vocab.vectors.T)
+                    num_classes = len(vocab_keys)
+
                     plt.gca().set_color_cycle([colormap(i) for i in
                                                np.linspace(0, 0.9,
                                                            num_classes)])
                     for i in range(num_classes):
-                        plt.plot(t_data, p_data[:, i])
+                        plt.plot(p_t_data, vocab_data[:, i])
                     if disp_legend:
-                        plot_legend(map(str, range(num_classes)))
-                else:
-                    plt.plot(t_data, p_data)
-            elif probe_opts[0] == 's':
-                # Spike display options
-                height = 0.75  # Height of 1 spike
-                spike_value = 1.0 / sim_dt
-
-                # Find the neurons to display
-                # Choose random selection of top 35% of fastest firing neurons
-                spike_totals = np.sum(p_data, axis=0)
-
-                total_neuron_count = spike_totals.shape[0]
-                disp_neuron_count = min(ncount_dict[probe], total_neuron_count)
-                top_neuron_count = int(max(total_neuron_count * 0.35,
-                                           disp_neuron_count))
-
-                spike_ind_sorted = np.argsort(spike_totals)[-top_neuron_count:]
-                spike_ind_selected = np.random.permutation(spike_ind_sorted)
-                spike_ind_selected = spike_ind_selected[:disp_neuron_count]
-                spike_data = p_data[:, spike_ind_selected]
-
-                # Set the color cycle to grayscale
-                plt.gca().set_color_cycle(
-                    [graymap(i) for i in
-                     np.linspace(0, 0.8, disp_neuron_count)])
-
-                # Triple the trange (spike plotting oddities)
-                strange = ma.array(t_data).repeat(3)
-
-                # Plot the spike plot
-                for nn in range(disp_neuron_count):
-                    sdata = ma.array((spike_data[:, nn]).repeat(3))
-                    sdata[0::3] *= (1 + nn - height / 2.0) / spike_value
-                    sdata[1::3] *= (1 + nn + height / 2.0) / spike_value
-                    sdata[2::3] = ma.masked
-                    plt.plot(strange, sdata)
-
-                # Display a legend if specified?
-                if disp_legend:
-                    plot_legend(map(str, spike_ind_sorted + 1))
-
-                plt.ylim(0, disp_neuron_count + 1)
-            elif probe_opts[0] == 'i':
-                # Image plot option
-                if probe not in image_dict:
-                    # Raw image (vector) data hasn't been processed. Do
-                    # processing now.
-                    # Calculate root square error to figure out when the image
-                    # changes
-                    im_rse = np.sqrt(np.sum(np.diff(p_data, axis=0) ** 2,
-                                            axis=1))
-                    # Figure out where the changes take place
-                    im_timeline = \
-                        np.concatenate(([0], np.where(im_rse > 0.1)[0] + 1))
-                    image_dict[probe] = im_timeline
-                else:
-                    im_timeline = image_dict[probe]
-
-                # Get image dimensions
-                im_shape = image_shapes[probe]
-                im_height = im_width = present_interval
-
-                # Plot the images
-                for im_ind in im_timeline:
-                    im_data = p_data[im_ind, :]
-                    im_time = t_data[im_ind]
-                    plt.imshow(im_data.reshape(im_shape),
-                               cmap=plt.get_cmap('gray'),
-                               interpolation='nearest', aspect=args.aspect,
-                               extent=(im_time, im_time + im_width,
-                                       0, im_height))
-                    plt.plot([im_time] * 2,
-                             [-aspect_equal_y_margin,
-                              im_height + aspect_equal_y_margin], 'w')
-                plt.yticks([])
-                plt.gca().set_axis_bgcolor('black')
-                plt.ylim(-aspect_equal_y_margin,
-                         im_height + aspect_equal_y_margin)
-            elif probe_opts[0] == 'p':
-                probes = probe.split('.')
-                probe_path = probe = probes[0]
-                if len(probes) > 1:
-                    probe_pen = probes[1]
-
-                    # Figure out when the pen is up and when the pen is down
-                    pen_d_threshold = 0.5
-                    pen_u_threshold = 0.25
-
-                    pen_raw_data = probe_data[probe_pen][trange_inds]
-                    pen_data = np.zeros(shape=pen_raw_data.shape)
-
-                    # Anything above pen_d_threshold is considered down
-                    pen_data[pen_raw_data >= pen_d_threshold] = 1
-
-                    # Anything between pen_d_threshold and p_u_threshold has
-                    # to be calculated (by taking the state of pen_data for
-                    # one timestep previous)
-                    pen_u_d_ind = np.where((pen_raw_data < pen_d_threshold) &
-                                           (pen_raw_data > pen_u_threshold))[0]
-                    for ind in pen_u_d_ind:
-                        pen_data[ind] = pen_data[ind - 1]
-                    pen_data = pen_data.flatten()
-
-                    # Figure out where the crossing points are
-                    pen_change_inds = np.where(np.diff(pen_data))[0] + 1
-                    # Split the time data into different chunks corresponding
-                    # to each pen state
-                    t_change = np.split(t_data, pen_change_inds)
-                    # Split the path data into different chunks corresponding
-                    # to each pen state
-                    path_change = np.split(probe_data[probe_path],
-                                           pen_change_inds)
+                        plot_legend(vocab_keys)
+                elif probe_opts[0] == 'v':
+                    # vector without vocabulary plots
+                    num_classes = p_data[-1].size
+                    if num_classes < 30:
+                        plt.gca().set_color_cycle([colormap(i) for i in
+                                                   np.linspace(0, 0.9,
+                                                               num_classes)])
+                        for i in range(num_classes):
+                            plt.plot(p_t_data, p_data[:, i])
+                        if disp_legend:
+                            plot_legend(map(str, range(num_classes)))
+                    else:
+                        plt.plot(p_t_data, p_data)
+                elif probe_opts[0] == 's':
+                    # Spike display options
+                    height = 0.75  # Height of 1 spike
+
+                    # Spike data (read as a list of spike times for each
+                    # neuron)
+                    spikes = probe_data.get_spikes(probe, 1.0 / sim_dt)
+                    if spikes is None:
+                        # Not spike data (e.g. the firing rates of a rate
+                        # neuron type). The dense data is displayed instead.
+                        p_t_data, p_data = get_probe_data(probe)
+
+                    # Find the neurons to display
+                    # Choose random selection of top 35% of fastest firing
+                    # neurons
+                    if spikes is None:
+                        spike_totals = np.sum(p_data, axis=0)
+                    else:
+                        spike_totals = spikes.counts(trange_inds)
+
+                    total_neuron_count = spike_totals.shape[0]
+                    disp_neuron_count = min(ncount_dict[probe],
+                                            total_neuron_count)
+                    top_neuron_count = int(max(total_neuron_count * 0.35,
+                                               disp_neuron_count))
+
+                    spike_ind_sorted = \
+                        np.argsort(spike_totals)[-top_neuron_count:]
+                    spike_ind_selected = \
+                        np.random.permutation(spike_ind_sorted)
+                    spike_ind_selected = spike_ind_selected[:disp_neuron_count]
+
+                    # Set the color cycle to grayscale
+                    plt.gca().set_color_cycle(
+                        [graymap(i) for i in
+                         np.linspace(0, 0.8, disp_neuron_count)])
+
+                    if spikes is None:
+                        # Plot the firing rates (scaled to the spike height)
+                        max_rate = max(np.max(p_data), 1e-10)
+                        for nn, neuron in enumerate(spike_ind_selected):
+                            plt.plot(p_t_data,
+                                     1 + nn - height / 2.0 +
+                                     p_data[:, neuron] * height / max_rate)
+                    else:
+                        # Plot the spike plot
+                        for nn, neuron in enumerate(spike_ind_selected):
+                            spike_t = trange[
+                                spikes.spike_steps(neuron, trange_inds)]
+                            strange = ma.array(spike_t).repeat(3)
+                            sdata = ma.array(
+                                np.tile([1 + nn - height / 2.0,
+                                         1 + nn + height / 2.0, 0],
+                                        spike_t.shape[0]))
+                            sdata[2::3] = ma.masked
+                            plt.plot(strange, sdata)
+
+                    # Display a legend if specified?
+                    if disp_legend:
+                        plot_legend(map(str, spike_ind_sorted + 1))
+
+                    plt.ylim(0, disp_neuron_count + 1)
+                elif probe_opts[0] == 'i':
+                    # Image plot option
+                    if probe not in image_dict:
+                        # Raw image (vector) data hasn't been processed. Do
+                        # processing now.
+                        # Calculate root square error to figure out when the
+                        # image changes
+                        im_rse = np.sqrt(np.sum(np.diff(p_data, axis=0) ** 2,
+                                                axis=1))
+                        # Figure out where the changes take place
+                        im_timeline = np.concatenate(
+                            ([0], np.where(im_rse > 0.1)[0] + 1))
+                        image_dict[probe] = im_timeline
+                    else:
+                        im_timeline = image_dict[probe]
+
+                    # Get image dimensions
+                    im_shape = image_shapes[probe]
+                    im_height = im_width = present_interval
+
+                    # Plot the images
+                    for im_ind in im_timeline:
+                        im_data = p_data[im_ind, :]
+                        im_time = p_t_data[im_ind]
+                        plt.imshow(im_data.reshape(im_shape),
+                                   cmap=plt.get_cmap('gray'),
+                                   interpolation='nearest', aspect=args.aspect,
+                                   extent=(im_time, im_time + im_width,
+                                           0, im_height))
+                        plt.plot([im_time] * 2,
+                                 [-aspect_equal_y_margin,
+                                  im_height + aspect_equal_y_margin], 'w')
+                    plt.yticks([])
+                    plt.gca().set_axis_bgcolor('black')
+                    plt.ylim(-aspect_equal_y_margin,
+                             im_height + aspect_equal_y_margin)
+                elif probe_opts[0] == 'I':
+                    # Stimulus event plot option (images rebuilt from the
+                    # vision image data)
+                    stim_events = probe_data[probe]
+                    image_data = get_vis_image_data()
+
+                    # Get image dimensions
+                    im_shape = image_shapes[probe]
+                    im_height = im_width = present_interval
+
+                    # Find the stimulus events within the displayed time range
+                    # (including the event active at the start of the range)
+                    ev_times = trange[stim_events['step']]
+                    ev_start = max(np.searchsorted(ev_times, t_data[0],
+                                                   side='right') - 1, 0)
+                    ev_end = np.searchsorted(ev_times, t_data[-1],
+                                             side='right')
+
+                    # Plot the images
+                    for ev in range(ev_start, ev_end):
+                        img_ind = stim_events['image'][ev]
+                        if img_ind >= 0:
+                            im_data = image_data[img_ind]
+                        else:
+                            im_data = np.zeros(np.prod(im_shape))
+                        im_time = max(ev_times[ev], t_data[0])
+                        plt.imshow(im_data.reshape(im_shape),
+                                   cmap=plt.get_cmap('gray'),
+                                   interpolation='nearest', aspect=args.aspect,
+                                   extent=(im_time, im_time + im_width,
+                                           0, im_height))
+                        plt.plot([im_time] * 2,
+                                 [-aspect_equal_y_margin,
+                                  im_height + aspect_equal_y_margin], 'w')
+                    plt.yticks([])
+                    plt.gca().set_axis_bgcolor('black')
+                    plt.ylim(-aspect_equal_y_margin,
+                             im_height + aspect_equal_y_margin)
+                elif probe_opts[0] == 'p':
+                    probes = probe.split('.')
+                    probe_path = probe = probes[0]
+                    if len(probes) > 1:
+                        probe_pen = probes[1]
+
+                        # Figure out when the pen is up and when the pen is
+                        # down
+                        pen_d_threshold = 0.5
+                        pen_u_threshold = 0.25
+
+                        pen_raw_data = probe_data[probe_pen][trange_inds]
+                        pen_data = np.zeros(shape=pen_raw_data.shape)
+
+                        # Anything above pen_d_threshold is considered down
+                        pen_data[pen_raw_data >= pen_d_threshold] = 1
+
+                        # Anything between pen_d_threshold and p_u_threshold
+                        # has to be calculated (by taking the state of pen_data
+                        # for one timestep previous)
+                        pen_u_d_ind = \
+                            np.where((pen_raw_data < pen_d_threshold) &
+                                     (pen_raw_data > pen_u_threshold))[0]
+                        for ind in pen_u_d_ind:
+                            pen_data[ind] = pen_data[ind - 1]
+                        pen_data = pen_data.flatten()
+
+                        # Figure out where the crossing points are
+                        pen_change_inds = np.where(np.diff(pen_data))[0] + 1
+                        # Split the time data into different chunks
+                        # corresponding to each pen state
+                        t_change = np.split(t_data, pen_change_inds)
+                        # Split the path data into different chunks
+                        # corresponding to each pen state
+                        path_change = \
+                            np.split(probe_data[probe_path][trange_inds],
+                                     pen_change_inds)
+                    else:
+                        # If there is no pen down information, then just plot
+                        # the path at the end of the graph
+                        pen_change_inds = [0]
+                        pen_data = [1]
+                        t_change = [[0], [t_data[-1]]]
+                        path_change = \
+                            [[0], probe_data[probe_path][trange_inds]]
+
+                    # Get path limits
+                    path_x_limit, path_y_limit = path_limits[probe_path]
+
+                    # Iterate through the different pen states and plot them
+                    for j, ind in enumerate(pen_change_inds):
+                        # Get the pen state
+                        pen_state = pen_data[ind]
+                        # Plot if pen is down
+                        if pen_state:
+                            tstart = t_change[j + 1][-1] - present_interval
+                            path_x = \
+                                adjust_path_coords(path_change[j + 1][:, 0],
+                                                   path_x_limit,
+                                                   [tstart,
+                                                    tstart + present_interval])
+                            path_y = \
+                                adjust_path_coords(path_change[j + 1][:, 1],
+                                                   path_y_limit,
+                                                   [0, present_interval])
+                            plt.plot(path_x, path_y, 'b')
+
+                    plt.gca().set_aspect(args.aspect)
+                    plt.ylim(-aspect_equal_y_margin,
+                             present_interval + aspect_equal_y_margin)
+                    plt.yticks([])
                 else:
-                    # If there is no pen down information, then just plot the
-                    # path at the end of the graph
-                    pen_change_inds = [0]
-                    pen_data = [1]
-                    t_change = [[0], [t_data[-1]]]
-                    path_change = [[0], probe_data[probe_path][trange_inds]]
-
-                # Get path limits
-                path_x_limit, path_y_limit = path_limits[probe_path]
-
-                # Iterate through the different pen states and plot them
-                for j, ind in enumerate(pen_change_inds):
-                    # Get the pen state
-                    pen_state = pen_data[ind]
-                    # Plot if pen is down
-                    if pen_state:
-                        tstart = t_change[j + 1][-1] - present_interval
-                        path_x = \
-                            adjust_path_coords(path_change[j + 1][:, 0],
-                                               path_x_limit,
-                                               [tstart,
-                                                tstart + present_interval])
-                        path_y = \
-                            adjust_path_coords(path_change[j + 1][:, 1],
-                                               path_y_limit,
-                                               [0, present_interval])
-                        plt.plot(path_x, path_y, 'b')
-
-                plt.gca().set_aspect(args.aspect)
-                plt.ylim(-aspect_equal_y_margin,
-                         present_interval + aspect_equal_y_margin)
-                plt.yticks([])
-            else:
-                raise RuntimeError('Probe option: "%s" not supported' %
-                                   probe_opts[0])
-
-            plt.xlim([t_data[0], t_data[-1]])
-            if probe_labels[probe] is None:
-                plt.ylabel('%i,%i' % (n + 1, r + 1))
-            else:
-                plt.ylabel(probe_labels[probe])
-
-            # Compress plots (no vertical spaces between subplots)
-            f.subplots_adjust(hspace=0.05, bottom=0.05, left=0.05, right=0.98,
-                              top=0.95)
-            plt.setp([a.get_xticklabels() for a in f.axes[:-1]], visible=False)
-
-if show_anim or show_io:
-    anim_config = config_data['anim_config']
-
-    print "ANIMATION CONFIG: "
-    print anim_config
-
-if show_io:
-    from _spaun.modules.vision.data import VisionDataObject
-
-    # TODO: UPDATE TO USE NEW CODE FROM ABOVE
-    vis_stim_config = anim_config[0]
-    vis_stim_probe_id_str = vis_stim_config['data_func_params']['data']
-    vis_stim_data = np.array(probe_data[vis_stim_probe_id_str])
+                    raise RuntimeError('Probe option: "%s" not supported' %
+                                       probe_opts[0])
 
-    arm_data_dict = anim_config[1]['data_func_params']
-    ee_probe_id_str = arm_data_dict['ee_path_data']
-    ee_data = np.array(probe_data[ee_probe_id_str])
-    pen_probe_id_str = arm_data_dict['pen_status_data']
-    pen_data = np.array(probe_data[pen_probe_id_str])
-
-    arm_data_scale = anim_config[1]['plot_type_params']['xlim'][1]
+                plt.xlim([t_data[0], t_data[-1]])
+                if probe_labels[probe] is None:
+                    plt.ylabel('%i,%i' % (n + 1, r + 1))
+                else:
+                    plt.ylabel(probe_labels[probe])
 
-    A_img = VisionDataObject().get_image('A')[0]
-    num_cols = 0
-    curr_col_ind = 0
+                # Compress plots (no vertical spaces between subplots)
+                f.subplots_adjust(hspace=0.05, bottom=0.05, left=0.05,
+                                  right=0.98, top=0.95)
+                plt.setp([a.get_xticklabels() for a in f.axes[:-1]],
+                         visible=False)
 
-    plot_data = []
-    plot_type = []
+            if save_dir is not None:
+                save_figure(f, 'graph%i' % (n + 1))
 
-    pen_down = False
-    pen_down_ind = -1
+    if show_anim or show_io:
+        anim_config = config_data['anim_config']
 
-    img_ind_filter = []
-    path_len_filter = 200
+        print "ANIMATION CONFIG: "
+        print anim_config
 
-    prev_img = np.zeros(vis_stim_data.shape[1])
-    for i in range(vis_stim_data.shape[0]):
-        img = vis_stim_data[i, :]
+    if show_io:
+        from _spaun.modules.vision.data import VisionDataObject
 
-        img_shown = np.sum(img) > 0
-        if (not pen_down and pen_data[i] > 0.5 and not img_shown):
-            pen_down = True
-            pen_down_ind = i
-        elif (pen_down and (pen_data[i] < 0.25 or img_shown or
-                            i == vis_stim_data.shape[0] - 1)):
-            pen_down = False
-            path_data = ee_data[pen_down_ind:i, :]
-            if path_data.shape[0] > path_len_filter:
+        # TODO: UPDATE TO USE NEW CODE FROM ABOVE
+        vis_stim_config = anim_config[0]
+        vis_stim_probe_id_str = vis_stim_config['data_func_params']['data']
+        if vis_stim_config['data_func'] == 'stim_image':
+            from _spaun.animation import DataFunctions
+            vis_stim_func = \
+                DataFunctions.stim_image(probe_data[vis_stim_probe_id_str])
+        else:
+            vis_stim_data = np.array(probe_data[vis_stim_probe_id_str])
+            vis_stim_func = lambda i: vis_stim_data[i, :]
+
+        arm_data_dict = anim_config[1]['data_func_params']
+        ee_probe_id_str = arm_data_dict['ee_path_data']
+        ee_data = np.array(probe_data[ee_probe_id_str])
+        pen_probe_id_str = arm_data_dict['pen_status_data']
+        pen_data = np.array(probe_data[pen_probe_id_str])
+
+        arm_data_scale = anim_config[1]['plot_type_params']['xlim'][1]
+
+        A_img = VisionDataObject().get_image('A')[0]
+        num_cols = 0
+        curr_col_ind = 0
+
+        plot_data = []
+        plot_type = []
+
+        pen_down = False
+        pen_down_ind = -1
+
+        img_ind_filter = []
+        path_len_filter = 200
+
+        num_steps = ee_data.shape[0]
+        prev_img = np.zeros(A_img.shape[0])
+        for i in range(num_steps):
+            img = vis_stim_func(i)
+
+            img_shown = np.sum(img) > 0
+            if (not pen_down and pen_data[i] > 0.5 and not img_shown):
+                pen_down = True
+                pen_down_ind = i
+            elif (pen_down and (pen_data[i] < 0.25 or img_shown or
+                                i == num_steps - 1)):
+                pen_down = False
+                path_data = ee_data[pen_down_ind:i, :]
+                if path_data.shape[0] > path_len_filter:
+                    if len(plot_data) <= 0:
+                        plot_data.append([])
+                        plot_type.append([])
+                    plot_data[-1].append(path_data)
+                    plot_type[-1].append("path")
+
+            if rmse(prev_img, img) > 0.1:
+                # Img data is an 'A', so reset things
+                if rmse(img, A_img) < 0.1:
+                    if len(plot_data) > 0:
+                        num_cols = max(num_cols, len(plot_data[-1]))
+                    plot_data.append([])
+                    plot_type.append([])
+                    curr_col_ind = 0
                 if len(plot_data) <= 0:
                     plot_data.append([])
                     plot_type.append([])
-                plot_data[-1].append(path_data)
-                plot_type[-1].append("path")
-
-        if rmse(prev_img, img) > 0.1:
-            # Img data is an 'A', so reset things
-            if rmse(img, A_img) < 0.1:
-                if len(plot_data) > 0:
-                    num_cols = max(num_cols, len(plot_data[-1]))
-                plot_data.append([])
-                plot_type.append([])
-                curr_col_ind = 0
-            if len(plot_data) <= 0:
-                plot_data.append([])
-                plot_type.append([])
-            if (curr_col_ind in img_ind_filter) or len(img_ind_filter) == 0:
-                plot_data[-1].append(np.array(img))
-                plot_type[-1].append("im")
-            prev_img = img
-            curr_col_ind += 1
-
-    # Get number of columns (gotta do this here to take into account last row)
-    # added to the plot_data array
-    num_cols = max(num_cols, len(plot_data[-1]))
-
-    plt.figure(figsize=(min(2 * num_cols, 18), min(2 * len(plot_data), 12)))
-    for i in range(len(plot_data)):
-        for j in range(len(plot_data[i])):
-            plt.subplot(len(plot_data), num_cols, i * num_cols + j + 1,
-                        aspect=1)
-            if plot_type[i][j] == 'im':
-                # Reshape to 28 * 28 (TODO: FIX for generic images?)
-                im_data = plot_data[i][j].reshape((28, 28))
-                plt.imshow(im_data, cmap=plt.get_cmap('gray'),
-                           interpolation='nearest', aspect='equal')
-                plt.xticks([])
-                plt.yticks([])
-            else:
-                plt.plot(plot_data[i][j][:, 0], plot_data[i][j][:, 1])
-                plt.xticks([])
-                plt.yticks([])
-                plt.xlim(-arm_data_scale, arm_data_scale)
-                plt.ylim(-arm_data_scale, arm_data_scale)
-    plt.tight_layout()
-
-if show_anim:
-    from _spaun.animation import ArmAnim, DataFunctions, GeneratorFunctions
-
-    subplot_width = anim_config[-1]['subplot_width']
-    subplot_height = anim_config[-1]['subplot_height']
-    max_subplot_cols = anim_config[-1]['max_subplot_cols']
-
-    num_plots = len(anim_config) - 1
-    num_cols = num_plots if num_plots < max_subplot_cols else max_subplot_cols
-    num_rows = int(np.ceil(1.0 * num_plots / max_subplot_cols))
-
-    # Make the figure to pass to the animation object
-    # Note: not hooked into close handler of other figures so that you can
-    #       independently close animation figure while keeping others open
-    #       (and vice versa)
-    f = plt.figure(figsize=(num_cols * subplot_width,
-                            num_rows * subplot_height))
-
-    # Make the animation object
-    anim_obj = ArmAnim(None, (num_rows, num_cols), f)
-    func_map = {}
-
-    # Loop through the animation configuration list and add each subplot
-    for i, config in enumerate(anim_config[:-1]):
-        # Subplot location
-        subplot_row = i / max_subplot_cols
-        subplot_col = i % max_subplot_cols
-
-        # Create the data object to use for the animation
-        data_func_obj = getattr(DataFunctions, config['data_func'])
-        data_func_params = {}
-        for param_name in config['data_func_params']:
-            if isinstance(config['data_func_params'][param_name], str):
-                data_func_params[param_name] = \
-                    probe_data[config['data_func_params'][param_name]]
-            else:
-                data_func_params[param_name] = \
-                    config['data_func_params'][param_name]
-        data_func = data_func_obj(**data_func_params)
-
-        # Add the data function to the function map
-        func_map[config['key']] = data_func
-
-        # Add animation subplot to anim_obj
-        plot_type_params = dict(config['plot_type_params'])
-        plot_type_params.setdefault('key', config['key'])
-        plot_type_params.setdefault('tl_loc', (subplot_row, subplot_col))
-        getattr(anim_obj, 'add_' + config['plot_type'])(**plot_type_params)
-
-    # Assign the proper data generator function to the animation object and
-    # start it
-    data_gen_func_params = anim_config[-1]['generator_func_params']
-    anim_obj.data_gen_func = \
-        lambda: GeneratorFunctions.keyed_data_funcs(trange, func_map,
-                                                    **data_gen_func_params)
-    anim_obj.start(interval=10)
-
-plt.show()
-probe_data.close()
+                if (curr_col_ind in img_ind_filter) or \
+                   len(img_ind_filter) == 0:
+                    plot_data[-1].append(np.array(img))
+                    plot_type[-1].append("im")
+                prev_img = img
+                curr_col_ind += 1
+
+        # Get number of columns (gotta do this here to take into account last
+        # row) added to the plot_data array
+        num_cols = max(num_cols, len(plot_data[-1]))
+
+        f = plt.figure(figsize=(min(2 * num_cols, 18),
+                                min(2 * len(plot_data), 12)))
+        for i in range(len(plot_data)):
+            for j in range(len(plot_data[i])):
+                plt.subplot(len(plot_data), num_cols, i * num_cols + j + 1,
+                            aspect=1)
+                if plot_type[i][j] == 'im':
+                    # Reshape to 28 * 28 (TODO: FIX for generic images?)
+                    im_data = plot_data[i][j].reshape((28, 28))
+                    plt.imshow(im_data, cmap=plt.get_cmap('gray'),
+                               interpolation='nearest', aspect='equal')
+                    plt.xticks([])
+                    plt.yticks([])
+                else:
+                    plt.plot(plot_data[i][j][:, 0], plot_data[i][j][:, 1])
+                    plt.xticks([])
+                    plt.yticks([])
+                    plt.xlim(-arm_data_scale, arm_data_scale)
+                    plt.ylim(-arm_data_scale, arm_data_scale)
+        plt.tight_layout()
+
+        if save_dir is not None:
+            save_figure(f, 'io')
+
+    if show_anim:
+        from _spaun.animation import GeneratorFunctions, build_anim
+        from _spaun.animation.anim_export import get_anim_figsize
+
+        # Make the figure to pass to the animation object
+        # Note: not hooked into close handler of other figures so that you can
+        #       independently close animation figure while keeping others open
+        #       (and vice versa)
+        f = plt.figure(figsize=get_anim_figsize(anim_config))
+
+        # Make the animation object
+        anim_obj, func_map = build_anim(anim_config, probe_data, f,
+                                        trange.shape[0])
+
+        # Assign the proper data generator function to the animation object and
+        # start it
+        data_gen_func_params = anim_config[-1]['generator_func_params']
+        anim_obj.data_gen_func = \
+            lambda: GeneratorFunctions.keyed_data_funcs(trange, func_map,
+                                                        **data_gen_func_params)
+        anim_obj.start(interval=10)
+
+    return probe_data
+
+
+# Helper function to render one probe data file in batch mode (run in the
+# worker processes). Returns an error string if the rendering failed.
+def render_probe_data(data_filename):
+    if args.output_dir is None:
+        save_dir = os.path.dirname(data_filename.rstrip(os.sep))
+    else:
+        save_dir = args.output_dir
+
+    try:
+        disp_probe_data(data_filename, save_dir).close()
+    except Exception as e:
+        return '%s: %s' % (type(e).__name__, e)
+    finally:
+        plt.close('all')
+    return None
+
+
+# Helper function to render the animation of one probe data file to a video
+# file
+def save_anim(data_filename):
+    from _spaun.animation import export_anim
+
+    if args.output_dir is None:
+        save_dir = os.path.dirname(data_filename.rstrip(os.sep))
+    else:
+        save_dir = args.output_dir
+    anim_filename = os.path.join(
+        save_dir,
+        os.path.splitext(os.path.basename(data_filename.rstrip(os.sep)))[0] +
+        '_anim.' + args.anim_format)
+
+    print "RENDERING ANIMATION TO '%s'" % anim_filename
+    export_anim(data_filename, anim_filename, processes=args.j,
+                frame_step=args.anim_frame_step, fps=args.anim_fps,
+                dpi=args.dpi, blit=not args.no_blit)
+
+
+# Helper function to get the list of probe data files (expanding glob
+# patterns in batch mode)
+def get_data_filenames():
+    data_filenames = []
+    for filename in args.data_filename:
+        filename = os.path.join(args.data_dir, filename.replace('"', ''))
+        if not args.batch:
+            data_filenames.append(filename)
+            continue
+
+        for match in sorted(glob.glob(filename)):
+            # Ignore the config and task records files
+            if not (match.endswith('_cfg.npz') or
+                    match.endswith('_tasks.npz')):
+                data_filenames.append(match)
+    return data_filenames
+
+
+if __name__ == '__main__':
+    data_filenames = get_data_filenames()
+
+    if args.saveanim:
+        if args.output_dir is not None and not os.path.isdir(args.output_dir):
+            os.makedirs(args.output_dir)
+        for data_filename in data_filenames:
+            save_anim(data_filename)
+
+        if not (args.showgrph or args.showiofig or args.showanim):
+            data_filenames = []
+
+    if args.batch:
+        print "RENDERING %i PROBE DATA FILES." % len(data_filenames)
+        if args.output_dir is not None and not os.path.isdir(args.output_dir):
+            os.makedirs(args.output_dir)
+
+        if args.j > 1 and len(data_filenames) > 1:
+            pool = multiprocessing.Pool(min(args.j, len(data_filenames)))
+            errors = pool.map(render_probe_data, data_filenames, chunksize=1)
+            pool.close()
+            pool.join()
+        else:
+            errors = map(render_probe_data, data_filenames)
+
+        for data_filename, error in zip(data_filenames, errors):
+            if error is not None:
+                print "FAILED TO RENDER '%s' - %s" % (data_filename, error)
+    else:
+        probe_data_list = [disp_probe_data(data_filename)
+                           for data_filename in data_filenames]
+        plt.show()
+
+        for probe_data in probe_data_list:
+            probe_data.close()
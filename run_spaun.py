@@ -70,7 +70,10 @@ parser.add_argument(
          'motor response. e.g. A3[1234]?XXXX or A0[#1]?X')
 parser.add_argument(
     '-b', type=str, default='ref',
-    help='Backend to use for Spaun. One of ["ref", "ocl", "mpi", "spinn"]')
+    help='Backend to use for Spaun. One of ["ref", "ocl", "mpi", "spinn", ' +
+         '"local_mp"]. The "local_mp" backend simulates groups of Spaun ' +
+         'modules in parallel processes on the local machine (see the ' +
+         '"local_mp_groups" config option).')
 parser.add_argument(
     '--data_dir', type=str, default=os.path.join(cur_dir, 'data'),
     help='Directory to store output data.')
@@ -87,12 +90,57 @@ parser.add_argument(
 parser.add_argument(
     '--showgrph', action='store_true',
     help='Supply to show graphing of probe data.')
+parser.add_argument(
+    '--savegrph', action='store_true',
+    help='Supply to render the graphs of the probe data to image files ' +
+         '(without displaying them).')
 parser.add_argument(
     '--showanim', action='store_true',
     help='Supply to show animation of probe data.')
 parser.add_argument(
     '--showiofig', action='store_true',
     help='Supply to show Spaun input/output figure.')
+parser.add_argument(
+    '--probe_budget', type=str, default=None,
+    help='Memory budget for recorded probe data (e.g. 512MB, 4GB). When ' +
+         'supplied, probes are subsampled, decimated, or dropped (least ' +
+         'important first) to fit the budget, instead of disabling all ' +
+         'probes for long simulations.')
+parser.add_argument(
+    '--probe_format', type=str, default='npz',
+    choices=['npz', 'npyd', 'h5'],
+    help='File format to use for the probe data. "npz" for a compressed ' +
+         'numpy archive, "npyd" for a directory of memory-mappable ' +
+         'per-probe numpy files, "h5" for a HDF5 file (requires h5py).')
+parser.add_argument(
+    '--live_stream', type=int, default=None,
+    help='Port number of the local HTTP server to stream downsampled probe ' +
+         'data (vocab similarities, arm position, pen status) from while ' +
+         'the simulation is running. E.g. --live_stream 8000')
+parser.add_argument(
+    '--live_stream_dt', type=float, default=0.01,
+    help='Sampling period (in seconds) of the streamed probe data.')
+parser.add_argument(
+    '--live_stream_buffer', type=int, default=10000,
+    help='Number of streamed probe data samples to keep for clients.')
+parser.add_argument(
+    '--log_jsonl', action='store_true',
+    help='Supply to also write structured (JSON lines) stimulus and output ' +
+         'records alongside the text log file.')
+parser.add_argument(
+    '--probe_raw_vocab', action='store_true',
+    help='Supply to record the raw semantic pointer vectors for vocabulary ' +
+         'probes (by default, only the similarities to the vocabulary ' +
+         'items are recorded).')
+parser.add_argument(
+    '--remove_passthrough', action='store_true',
+    help='Supply to merge chains of passthrough nodes into direct ' +
+         'connections before the model is built.')
+parser.add_argument(
+    '--compress_trfms', action='store_true',
+    help='Supply to rewrite connections with identity, diagonal, and ' +
+         'permutation transforms to use scalar / elementwise transforms ' +
+         '(with sliced post objects) before the model is built.')
 parser.add_argument(
     '--tag', type=str, default="",
     help='Tag string to apply to probe data file name.')
@@ -131,6 +179,12 @@ parser.add_argument(
 parser.add_argument(
     '--mpi_p_auto', action='store_true',
     help='MPI Only: Use the automatic partitioner')
+parser.add_argument(
+    '--mpi_p_spaun', action='store_true',
+    help='MPI Only: Use the Spaun partitioner (balances the neuron and ' +
+         'operator cost of each partition, while minimizing the signal ' +
+         'width between partitions). Writes a partition report file next ' +
+         'to the MPI save file.')
 parser.add_argument(
     '--mpi_compress_save', action='store_true',
     help='Supply to compress the saved net file with gzip.')
@@ -182,6 +236,10 @@ if args.spinn:
 
 print "BACKEND: %s" % cfg.backend.upper()
 
+if cfg.use_local_mp and args.live_stream is not None:
+    raise RuntimeError('Live streaming is not supported with the local_mp ' +
+                       'backend.')
+
 # ----- Batch runs -----
 for n in range(args.n):
     print ("\n======================== RUN %i OF %i ========================" %
@@ -223,8 +281,17 @@ for n in range(args.n):
                            ' does not exist. Please ensure the correct path' +
                            ' has been specified.')
 
+    # ----- Check configuration option combinations -----
+    # Note: The threshold ensemble blocks are shared by (and connected with
+    #       synapse=None to) all of the modules, so with the local_mp
+    #       backend every threshold unit connection would become a (one
+    #       timestep delayed) connection between processes
+    if cfg.use_local_mp and cfg.thresh_ens_blocks:
+        raise RuntimeError('The thresh_ens_blocks option is not supported ' +
+                           'with the local_mp backend.')
+
     # ----- Spaun imports -----
-    from _spaun.utils import get_total_n_neurons
+    from _spaun.utils import get_total_n_neurons, str_to_bytes
     from _spaun.probes import default_probe_config, default_anim_config
     from _spaun.spaun_main import Spaun
 
@@ -236,6 +303,10 @@ for n in range(args.n):
     experiment.initialize(args.s, vis_data.get_image_ind,
                           vis_data.get_image_label,
                           cfg.mtr_est_digit_response_time, cfg.rng)
+    if args.seed > 0 or args.enable_cache:
+        # Reuse the generated vocabulary vectors (same conditions as the
+        # decoder cache)
+        vocab.cache_dir = os.path.join(cfg.data_dir, 'vocab_cache')
     vocab.initialize(experiment.num_learn_actions, cfg.rng)
     vocab.initialize_mtr_vocab(mtr_data.dimensions, mtr_data.sps)
     vocab.initialize_vis_vocab(vis_data.dimensions, vis_data.sps)
@@ -251,10 +322,13 @@ for n in range(args.n):
         cfg.probe_data_filename = get_probe_data_filename(mpi_savename,
                                                           suffix=args.tag)
     else:
-        cfg.probe_data_filename = get_probe_data_filename(suffix=args.tag)
+        cfg.probe_data_filename = get_probe_data_filename(
+            suffix=args.tag, ext=args.probe_format)
 
     # ----- Initalize looger and write header data -----
-    logger.initialize(cfg.data_dir, cfg.probe_data_filename[:-4] + '_log.txt')
+    logger.initialize(cfg.data_dir,
+                      os.path.splitext(cfg.probe_data_filename)[0] +
+                      '_log.txt', jsonl=args.log_jsonl)
     cfg.write_header()
     experiment.write_header()
     vocab.write_header()
@@ -270,6 +344,15 @@ for n in range(args.n):
     print "PROCESSED RAW STIM SEQ: %s" % (str(experiment.raw_seq_list))
     print "STIMULUS SEQ: %s" % (str(experiment.stim_seq_list))
 
+    # ----- Display tuned ensemble array configurations -----
+    if cfg.subdim_tuning:
+        logger.write('# Tuned ensemble array configurations:\n')
+        for key, value in sorted(cfg.subdim_table.items()):
+            print "SUBDIM TUNING: (dim, n_neurons, radius) %s -> " % \
+                str(key) + "(ens_dim, n_neurons, radius) %s" % str(value)
+            logger.write('# - %s: %s\n' % (key, value))
+        logger.write('#\n')
+
     # ----- Calculate runtime -----
     # Note: Moved up here so that we have data to disable probes if necessary
     runtime = args.t if args.t > 0 else experiment.get_est_simtime()
@@ -277,24 +360,46 @@ for n in range(args.n):
     # ----- Set up probes -----
     make_probes = not args.noprobes
 
-    if runtime > max_probe_time and make_probes:
+    probe_budget = None
+    if args.probe_budget is not None:
+        probe_budget = str_to_bytes(args.probe_budget)
+    elif runtime > max_probe_time and make_probes:
         print (">>> !!! WARNING !!! EST RUNTIME > %0.2fs - DISABLING PROBES" %
                max_probe_time)
         make_probes = False
 
     if make_probes:
         print "PROBE FILENAME: %s" % cfg.probe_data_filename
-        probe_cfg = default_probe_config(model, vocab, cfg.sim_dt,
-                                         cfg.data_dir,
-                                         cfg.probe_data_filename)
+        probe_cfg = default_probe_config(
+            model, vocab, cfg.sim_dt, cfg.data_dir, cfg.probe_data_filename,
+            vocab_project=not args.probe_raw_vocab, probe_budget=probe_budget,
+            runtime=runtime)
+        for report_str in probe_cfg.budget_report:
+            print "PROBE BUDGET: %s" % report_str
+
+        if probe_budget is not None:
+            probe_budget = \
+                max(probe_budget - probe_cfg.get_probes_nbytes(runtime), 0)
 
     # ----- Set up animation probes -----
     if args.showanim or args.showiofig or args.probeio:
-        anim_probe_data_filename = cfg.probe_data_filename[:-4] + '_anim.npz'
+        anim_probe_data_filename = \
+            os.path.splitext(cfg.probe_data_filename)[0] + '_anim.npz'
         print "ANIM PROBE FILENAME: %s" % anim_probe_data_filename
         probe_anim_cfg = default_anim_config(model, vocab,
                                              cfg.sim_dt, cfg.data_dir,
-                                             anim_probe_data_filename)
+                                             anim_probe_data_filename,
+                                             probe_budget=probe_budget,
+                                             runtime=runtime)
+        for report_str in probe_anim_cfg.budget_report:
+            print "ANIM PROBE BUDGET: %s" % report_str
+
+    # ----- Set up live streaming probes -----
+    if args.live_stream is not None:
+        from _spaun.live_stream import add_stream_probes
+
+        stream_probes, stream_meta = \
+            add_stream_probes(model, vocab, cfg.sim_dt, args.live_stream_dt)
 
     # ----- Neuron count debug -----
     print "MODEL N_NEURONS:  %i" % (get_total_n_neurons(model))
@@ -317,6 +422,21 @@ for n in range(args.n):
     if hasattr(model, 'mtr'):
         print "- mtr  n_neurons: %i" % (get_total_n_neurons(model.mtr))
 
+    # ----- Pre-build optimization passes -----
+    if args.remove_passthrough:
+        from _spaun.optimizer import remove_passthrough_nodes
+
+        print ("REMOVED PASSTHROUGH NODES: %i" %
+               remove_passthrough_nodes(model))
+    if args.compress_trfms:
+        from _spaun.optimizer import compress_transforms
+
+        trfm_counts = compress_transforms(model)
+        print ("COMPRESSED TRANSFORMS: %i scalar, %i diagonal, " %
+               (trfm_counts['scalar'], trfm_counts['diagonal']) +
+               "%i permutation (%i dense elements)" %
+               (trfm_counts['permutation'], trfm_counts['dense_elements']))
+
     # ----- Connections count debug -----
     print "MODEL N_CONNECTIONS: %i" % (len(model.all_connections))
 
@@ -362,8 +482,6 @@ for n in range(args.n):
         sim = nengo_ocl.Simulator(model, dt=cfg.sim_dt, context=ctx,
                                   profiling=args.ocl_profile)
     elif cfg.use_mpi:
-        import nengo_mpi
-
         mpi_savefile = \
             ('+'.join([cfg.get_probe_data_filename(mpi_savename)[:-4],
                       ('%ip' % args.mpi_p if not args.mpi_p_auto else 'autop'),
@@ -371,9 +489,27 @@ for n in range(args.n):
              mpi_saveext)
         mpi_savefile = os.path.join(cfg.data_dir, mpi_savefile)
 
+        if args.mpi_p_spaun:
+            # Note: Partitioning is done (and reported) before nengo_mpi is
+            #       imported, so partitions can be evaluated without nengo_mpi
+            from _spaun.partitioner import SpaunPartitioner
+
+            spaun_partitioner = SpaunPartitioner(args.mpi_p)
+            assignments = spaun_partitioner.partition(model)
+            for report_str in spaun_partitioner.get_report():
+                print "PARTITION: %s" % report_str
+            spaun_partitioner.write_report(
+                os.path.splitext(mpi_savefile)[0] + '_partition.txt')
+
+        import nengo_mpi
+
         print "USING MPI - Saving to: %s" % (mpi_savefile)
 
-        if args.mpi_p_auto:
+        if args.mpi_p_spaun:
+            sim = nengo_mpi.Simulator(model, dt=cfg.sim_dt,
+                                      assignments=assignments,
+                                      save_file=mpi_savefile)
+        elif args.mpi_p_auto:
             assignments = {}
             for n, module in enumerate(model.modules):
                 assignments[module] = n
@@ -385,6 +521,14 @@ for n in range(args.n):
             sim = nengo_mpi.Simulator(model, dt=cfg.sim_dt,
                                       partitioner=partitioner,
                                       save_file=mpi_savefile)
+    elif cfg.use_local_mp:
+        from _spaun.local_mp import LocalMPSimulator
+
+        sim = LocalMPSimulator(model, dt=cfg.sim_dt,
+                               module_groups=cfg.local_mp_groups)
+        print "USING LOCAL_MP - %i processes, " % (len(sim.processes) + 1) + \
+            "%i boundary connections (%i values / step)" % \
+            (sim.n_boundary_conns, sim.n_boundary_values)
     else:
         sim = nengo.Simulator(model, dt=cfg.sim_dt)
 
@@ -394,13 +538,33 @@ for n in range(args.n):
 
     # ----- Spaun simulation run -----
     experiment.reset()
-    if cfg.use_opencl or cfg.use_ref:
+    if cfg.use_opencl or cfg.use_ref or cfg.use_local_mp:
         print "START SIM - est_runtime: %f" % runtime
-        sim.run(runtime)
+        if args.live_stream is not None:
+            from _spaun.live_stream import (ProbeRingBuffer, LiveStreamServer,
+                                            run_sim_streaming)
+
+            ring_buffer = ProbeRingBuffer(args.live_stream_buffer)
+            ring_buffer.meta = stream_meta
+            stream_server = LiveStreamServer(ring_buffer, args.live_stream)
+            stream_server.start()
+            print "STREAMING PROBE DATA ON: http://localhost:%i/data" % \
+                args.live_stream
+
+            run_sim_streaming(sim, runtime, stream_probes, ring_buffer)
+            stream_server.stop()
+        else:
+            sim.run(runtime)
 
         # Close output logging file
         logger.close()
 
+        # Write task result records
+        experiment.write_task_records(
+            os.path.join(cfg.data_dir,
+                         os.path.splitext(cfg.probe_data_filename)[0] +
+                         '_tasks.npz'))
+
         if args.ocl_profile:
             sim.print_plans()
             sim.print_profiling()
@@ -435,6 +599,9 @@ for n in range(args.n):
     n_bytes_bias = 0
     n_ens = 0
     for ens in sim.model.toplevel.all_ensembles:
+        if ens not in sim.model.params:
+            # Ensembles built in other processes (local_mp backend)
+            continue
         n_bytes_ev += sim.model.params[ens].eval_points.nbytes
         n_bytes_gain += sim.model.params[ens].gain.nbytes
         n_bytes_bias += sim.model.params[ens].bias.nbytes
@@ -458,13 +625,15 @@ for n in range(args.n):
         print "WRITING PROBE DATA TO FILE"
         probe_cfg.write_simdata_to_file(sim, experiment)
 
-        if args.showgrph:
+        if args.showgrph or args.savegrph:
             subprocess_call_list = ["python",
                                     os.path.join(cur_dir,
                                                  'disp_probe_data.py'),
                                     '"' + cfg.probe_data_filename + '"',
                                     '--data_dir', '"' + cfg.data_dir + '"',
                                     '--showgrph']
+            if not args.showgrph:
+                subprocess_call_list += ['--batch']
 
             # Log subprocess call
             logger.write("\n# " + " ".join(subprocess_call_list))